@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Benchmark embedding backends and check recall parity
+
+Encodes the same corpus with the PyTorch (sentence-transformers) backend
+and an ONNX backend, then reports throughput, resident memory and how well
+nearest-neighbour results agree. The ONNX export and each backend run in
+their own subprocess, so the resident-memory figures only contain the
+runtime being measured. Exits with status 1 when recall@k falls below
+--min-recall; tests/test_onnx_embedding_backend.py runs the same check
+under pytest.
+
+Usage:
+    python benchmark_embeddings.py --backend onnx-int8
+    python benchmark_embeddings.py --corpus slides.txt --top-k 10
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+SUBJECTS = [
+    "Database normalization", "Binary search trees", "TCP congestion control", "Gradient descent",
+    "Object-oriented design", "Hash tables", "Operating system scheduling", "Linear regression",
+    "Cơ sở dữ liệu quan hệ", "Lập trình hướng đối tượng", "Mạng máy tính", "Cấu trúc dữ liệu"
+]
+ASPECTS = [
+    "definition and key properties", "worked example with step-by-step solution",
+    "common exam questions", "time complexity analysis", "summary slide for lecture 3",
+    "comparison with alternative approaches", "ví dụ minh họa và bài tập", "tóm tắt chương"
+]
+
+
+def build_default_corpus():
+    """Synthetic lecture-slide style corpus"""
+    return [f"{subject}: {aspect}" for subject in SUBJECTS for aspect in ASPECTS]
+
+
+def load_corpus(path):
+    """Load one text per line"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def load_backend(backend, model_name, onnx_cache_dir):
+    """Load a backend; imports stay here so only that runtime is resident"""
+    if backend == "pytorch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name, device="cpu")
+
+    from services.onnx_embedding_backend import OnnxEmbeddingBackend
+    return OnnxEmbeddingBackend(model_name, cache_dir=onnx_cache_dir, quantize=backend == "onnx-int8")
+
+
+def run_worker(args):
+    """Measure one backend in this (fresh) process and write its embeddings"""
+    import psutil
+
+    process = psutil.Process()
+    rss_start = process.memory_info().rss
+    start = time.time()
+    model = load_backend(args.worker, args.model, args.onnx_cache_dir)
+    load_time = time.time() - start
+    if args.worker == "export":
+        return
+
+    texts = load_corpus(args.corpus) if args.corpus else build_default_corpus()
+
+    # Warm-up
+    model.encode(texts[:args.batch_size], batch_size=args.batch_size, normalize_embeddings=True)
+
+    start = time.time()
+    for _ in range(args.repeats):
+        embeddings = model.encode(texts, batch_size=args.batch_size, normalize_embeddings=True, show_progress_bar=False)
+    elapsed = (time.time() - start) / args.repeats
+
+    np.save(args.output, np.asarray(embeddings, dtype=np.float32))
+    with open(args.output + ".json", "w") as f:
+        json.dump({
+            "load_time": load_time,
+            "rss_start": rss_start,
+            "rss": process.memory_info().rss,
+            "throughput": len(texts) / elapsed
+        }, f)
+
+
+def spawn(worker, args, output=None):
+    """Run this script as a worker subprocess"""
+    command = [
+        sys.executable, os.path.abspath(__file__), "--worker", worker,
+        "--model", args.model, "--onnx-cache-dir", args.onnx_cache_dir,
+        "--batch-size", str(args.batch_size), "--repeats", str(args.repeats)
+    ]
+    if args.corpus:
+        command += ["--corpus", args.corpus]
+    if output:
+        command += ["--output", output]
+    subprocess.run(command, check=True)
+
+
+def measure(name, args, workdir):
+    """Measure a backend in a subprocess and print its figures"""
+    output = os.path.join(workdir, f"{name}.npy")
+    spawn(name, args, output)
+    with open(output + ".json", "r") as f:
+        stats = json.load(f)
+
+    print(f"{name:>10}: load {stats['load_time']:6.2f}s  "
+          f"rss {stats['rss'] / 2**20:7.1f} MiB "
+          f"(interpreter {stats['rss_start'] / 2**20:5.1f} MiB)  "
+          f"{stats['throughput']:8.1f} texts/s")
+    return np.load(output)
+
+
+def recall_at_k(reference, candidate, queries, k):
+    """Overlap of top-k neighbour sets, averaged over queries"""
+    reference_top = np.argsort(-(reference[queries] @ reference.T), axis=1)[:, :k]
+    candidate_top = np.argsort(-(candidate[queries] @ candidate.T), axis=1)[:, :k]
+    overlaps = [len(set(r) & set(c)) / k for r, c in zip(reference_top, candidate_top)]
+    return float(np.mean(overlaps))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends")
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--backend", default="onnx-int8", choices=["onnx", "onnx-int8"])
+    parser.add_argument("--onnx-cache-dir", default="cache/onnx")
+    parser.add_argument("--corpus", help="Text file with one document per line")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    parser.add_argument("--worker", choices=["export", "onnx", "onnx-int8", "pytorch"], help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    texts = load_corpus(args.corpus) if args.corpus else build_default_corpus()
+    print(f"Corpus: {len(texts)} texts, batch size {args.batch_size}")
+
+    # Export (if needed) before measuring, so load time reflects a warm start
+    spawn("export", args)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        candidate = measure(args.backend, args, workdir)
+        reference = measure("pytorch", args, workdir)
+
+    cosine = float(np.mean(np.sum(reference * candidate, axis=1)))
+    k = min(args.top_k, len(texts))
+    recall = recall_at_k(reference, candidate, np.arange(len(texts)), k)
+    print(f"Mean cosine(pytorch, {args.backend}): {cosine:.4f}")
+    print(f"Recall@{k} vs pytorch: {recall:.4f} (minimum {args.min_recall})")
+
+    if recall < args.min_recall:
+        print("❌ Recall parity check failed")
+        sys.exit(1)
+    print("✅ Recall parity check passed")
+
+
+if __name__ == "__main__":
+    main()
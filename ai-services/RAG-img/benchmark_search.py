@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Compare vector-only and hybrid search on labeled queries
+
+Sends every labeled query to a running API twice, once with hybrid
+search disabled and once enabled, and reports hit@k, mean reciprocal
+rank and p50/p95 latency for each mode.
+
+The labels file holds one JSON object per line:
+    {"query": "CS101 midterm", "image_id": "<expected image id>"}
+
+Usage:
+    python benchmark_search.py --labels queries.jsonl
+    python benchmark_search.py --labels queries.jsonl --url http://localhost:8000 --top-k 5
+"""
+
+import argparse
+import json
+import sys
+import time
+import numpy as np
+import httpx
+
+
+def load_labels(path):
+    """Load labeled queries"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_mode(client, url, labels, top_k, threshold, hybrid):
+    """Run every query in one search mode"""
+    latencies = []
+    reciprocal_ranks = []
+    for label in labels:
+        start = time.time()
+        response = client.post(f"{url}/search", json={
+            "query": label["query"],
+            "top_k": top_k,
+            "threshold": threshold,
+            "hybrid": hybrid
+        })
+        latencies.append((time.time() - start) * 1000)
+        response.raise_for_status()
+
+        ranked = [result["image_id"] for result in response.json().get("results", [])]
+        reciprocal_ranks.append(
+            1.0 / (ranked.index(label["image_id"]) + 1) if label["image_id"] in ranked else 0.0
+        )
+
+    reciprocal_ranks = np.asarray(reciprocal_ranks)
+    return {
+        "hit_at_k": float(np.mean(reciprocal_ranks > 0)),
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hybrid search against vector-only search")
+    parser.add_argument("--labels", required=True, help="JSONL file of {query, image_id}")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    args = parser.parse_args()
+
+    labels = load_labels(args.labels)
+    if not labels:
+        print("❌ No labeled queries found")
+        sys.exit(1)
+    print(f"Queries: {len(labels)}, top_k {args.top_k}, threshold {args.threshold}")
+
+    with httpx.Client(timeout=60.0) as client:
+        # Warm-up so model loading and caches do not skew the first mode
+        client.post(f"{args.url}/search", json={"query": labels[0]["query"], "top_k": args.top_k})
+
+        for name, hybrid in (("vector", False), ("hybrid", True)):
+            stats = run_mode(client, args.url, labels, args.top_k, args.threshold, hybrid)
+            print(f"{name:>8}: hit@{args.top_k} {stats['hit_at_k']:.3f}  "
+                  f"MRR {stats['mrr']:.3f}  "
+                  f"p50 {stats['p50_ms']:7.1f} ms  p95 {stats['p95_ms']:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark exact snapshot search against the ChromaDB HNSW path
+
+Fills a scratch collection with random unit vectors, then runs the same
+queries through Chroma and through the memory-mapped snapshot, and
+reports snapshot cold-start time, per-query latency and how many of
+Chroma's results match the exact top-k.
+
+Usage:
+    python benchmark_vector_search.py
+    python benchmark_vector_search.py --vectors 5000 --queries 500 --top-k 10
+"""
+
+import argparse
+import os
+import sys
+import shutil
+import tempfile
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.vector_db_service import VectorDBService
+
+
+def latency_stats(latencies):
+    """p50/p95 in milliseconds"""
+    latencies = np.asarray(latencies) * 1000
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 95))
+
+
+def run_queries(service, queries, top_k):
+    """Search one query at a time, as the API does"""
+    latencies, ids = [], []
+    for query in queries:
+        start = time.time()
+        result = service._search_vectors_sync(query, top_k)
+        latencies.append(time.time() - start)
+        ids.append([hit["id"] for hit in result["results"]])
+    return latencies, ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark snapshot vs ChromaDB vector search")
+    parser.add_argument("--vectors", type=int, default=3000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = rng.standard_normal((args.vectors, args.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    db_path = tempfile.mkdtemp(prefix="rag_img_bench_")
+    try:
+        chroma = VectorDBService(db_path=db_path, collection_name="benchmark")
+        ids = [f"img_{i}" for i in range(args.vectors)]
+        chroma._upsert_vectors_sync(ids, [f"document {i}" for i in range(args.vectors)], vectors,
+                                    {"image_id": [str(i) for i in range(args.vectors)]})
+        print(f"Collection: {args.vectors} vectors x {args.dim}, {args.queries} queries, top_k {args.top_k}")
+
+        # First start exports the snapshot; the second measures a cold start from disk
+        VectorDBService(db_path=db_path, collection_name="benchmark", snapshot_max_vectors=args.vectors)
+        start = time.time()
+        snapshot = VectorDBService(db_path=db_path, collection_name="benchmark", snapshot_max_vectors=args.vectors)
+        print(f"Snapshot cold start: {(time.time() - start) * 1000:.1f} ms (including Chroma client)")
+
+        chroma_latencies, chroma_ids = run_queries(chroma, queries, args.top_k)
+        snapshot_latencies, snapshot_ids = run_queries(snapshot, queries, args.top_k)
+
+        for name, latencies in (("chroma", chroma_latencies), ("snapshot", snapshot_latencies)):
+            p50, p95 = latency_stats(latencies)
+            print(f"{name:>9}: p50 {p50:7.3f} ms  p95 {p95:7.3f} ms")
+
+        exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.top_k]
+        exact_ids = [[ids[i] for i in row] for row in exact]
+        for name, found in (("chroma", chroma_ids), ("snapshot", snapshot_ids)):
+            recall = np.mean([len(set(f) & set(e)) / args.top_k for f, e in zip(found, exact_ids)])
+            print(f"{name:>9}: recall@{args.top_k} vs exact {recall:.4f}")
+    finally:
+        shutil.rmtree(db_path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
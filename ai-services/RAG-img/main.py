@@ -1,19 +1,23 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, status, Form
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, status, Form, Query
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 import os
 import sys
-from typing import Optional
+from typing import Optional, List
 import logging
+import time
 
 # Add current directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from models.schemas import (
-    ImageUploadResponse, QuestionRequest, QuestionResponse, 
-    SearchRequest, SearchResponse, SearchResult, HealthCheckResponse, ErrorResponse
+    ImageUploadResponse, BatchUploadResponse, BatchUploadItem, DocumentUploadResponse, DocumentPageResult,
+    JobSubmitResponse, JobStatusResponse, BulkDeleteRequest, BulkDeleteResponse,
+    QuestionRequest, QuestionResponse, 
+    SearchRequest, SearchResponse, SearchResult, BatchSearchRequest, BatchSearchResponse,
+    HealthCheckResponse, ErrorResponse
 )
 from services.rag_service import RAGService
 from utils.utils import ConfigUtils
@@ -46,7 +50,51 @@ app.add_middleware(
 # Initialize RAG service
 rag_service = RAGService(
     upload_dir=config.get("upload_dir", "uploads"),
-    db_path=config.get("vector_db_path", "chroma_db")
+    db_path=config.get("vector_db_path", "chroma_db"),
+    hash_cache_path=config.get("hash_cache_path", "cache/content_hashes.db"),
+    ocr_worker_processes=config.get("ocr_worker_processes", 0),
+    ocr_max_queue_depth=config.get("ocr_max_queue_depth", 32),
+    ocr_tile_size=config.get("ocr_tile_size", 1600),
+    ocr_tile_overlap=config.get("ocr_tile_overlap", 200),
+    ocr_tile_threshold=config.get("ocr_tile_threshold", 2400),
+    ocr_cascade=config.get("ocr_cascade", True),
+    ocr_cascade_fast_size=config.get("ocr_cascade_fast_size", 1280),
+    ocr_cascade_min_confidence=config.get("ocr_cascade_min_confidence", 0.6),
+    ocr_cascade_min_density=config.get("ocr_cascade_min_density", 20.0),
+    embedding_batch_wait_ms=config.get("embedding_batch_wait_ms", 5.0),
+    embedding_max_batch_size=config.get("embedding_max_batch_size", 32),
+    embedding_cache_size=config.get("embedding_cache_size", 2048),
+    embedding_cache_ttl=config.get("embedding_cache_ttl", 0),
+    embedding_backend=config.get("embedding_backend", "pytorch"),
+    onnx_cache_dir=config.get("onnx_cache_dir", "cache/onnx"),
+    chunk_size=config.get("chunk_size", 150),
+    chunk_overlap=config.get("chunk_overlap", 30),
+    metadata_db_path=config.get("metadata_db_path", "cache/image_metadata.db"),
+    lexical_index_path=config.get("lexical_index_path", "cache/lexical_index.db"),
+    hybrid_search=config.get("hybrid_search", True),
+    job_db_path=config.get("job_db_path", "cache/jobs.db"),
+    job_spool_dir=config.get("job_spool_dir", "cache/job_spool"),
+    job_concurrency=config.get("job_concurrency", 2),
+    job_max_attempts=config.get("job_max_attempts", 3),
+    job_retention=config.get("job_retention", 604800),
+    job_lease_timeout=config.get("job_lease_timeout", 120),
+    vector_snapshot_max_vectors=config.get("vector_snapshot_max_vectors", 5000),
+    near_duplicate_max_distance=config.get("near_duplicate_max_distance", 4),
+    document_page_concurrency=config.get("document_page_concurrency", 2),
+    document_dpi=config.get("document_dpi", 200),
+    document_max_pages=config.get("document_max_pages", 500),
+    result_cache_size=config.get("result_cache_size", 1024),
+    result_cache_ttl=config.get("result_cache_ttl", 0),
+    region_index=config.get("region_index", True),
+    region_db_path=config.get("region_db_path", "cache/regions.db"),
+    reconcile_interval=config.get("reconcile_interval", 3600),
+    reconcile_min_age=config.get("reconcile_min_age", 3600),
+    reconcile_page_size=config.get("reconcile_page_size", 1000),
+    vector_max_open_collections=config.get("vector_max_open_collections", 64),
+    health_check_interval=config.get("health_check_interval", 30),
+    health_check_timeout=config.get("health_check_timeout", 10),
+    # uvicorn and gunicorn read their default worker count from WEB_CONCURRENCY
+    workers=int(os.environ.get("WEB_CONCURRENCY", config.get("workers", 1)))
 )
 
 # Mount static files
@@ -54,15 +102,30 @@ if os.path.exists(config.get("upload_dir", "uploads")):
     app.mount("/uploads", StaticFiles(directory=config.get("upload_dir", "uploads")), name="uploads")
 
 
+@app.on_event("startup")
+async def start_background_work():
+    # Models load concurrently in the background; metadata endpoints are served meanwhile
+    rag_service.start_initialization()
+    await rag_service.start_job_workers()
+    rag_service.start_maintenance()
+
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await rag_service.stop_maintenance()
+    await rag_service.stop_job_workers()
+
+
 @app.get("/")
 async def root():
     return {"message": "RAG-img API", "version": "1.0.0", "docs": "/docs"}
 
 
 @app.post("/upload", response_model=ImageUploadResponse)
-async def upload_image(file: UploadFile = File(...), description: Optional[str] = Form(None)):
+async def upload_image(file: UploadFile = File(...), description: Optional[str] = Form(None),
+                       tenant: Optional[str] = Form(None)):
     try:
-        result = await rag_service.process_image(file, description)
+        result = await rag_service.process_image(file, description, tenant)
         
         if not result.success:
             raise HTTPException(
@@ -75,20 +138,110 @@ async def upload_image(file: UploadFile = File(...), description: Optional[str]
             image_id=result.image_id,
             filename=result.filename,
             extracted_text=result.extracted_text,
-            message="Image uploaded successfully"
+            message="Image uploaded successfully",
+            deduplicated=result.deduplicated
         )
     except Exception as e:
         logger.error(f"Upload error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/upload/batch", response_model=BatchUploadResponse)
+async def upload_images_batch(files: List[UploadFile] = File(...),
+                              descriptions: Optional[List[str]] = Form(None),
+                              tenant: Optional[str] = Form(None)):
+    try:
+        result = await rag_service.process_images_batch(
+            files,
+            descriptions,
+            batch_size=config.get("ingest_batch_size", 16),
+            queue_size=config.get("ingest_queue_size", 32),
+            ocr_concurrency=config.get("ingest_ocr_concurrency", 2),
+            tenant=tenant
+        )
+        
+        return BatchUploadResponse(
+            success=result["success"],
+            total_files=result["total_files"],
+            succeeded=result["succeeded"],
+            failed=result["failed"],
+            deduplicated=result["deduplicated"],
+            results=[
+                BatchUploadItem(
+                    success=item.success,
+                    image_id=item.image_id,
+                    filename=item.filename or "",
+                    extracted_text=item.extracted_text,
+                    deduplicated=item.deduplicated,
+                    error_message=item.error_message
+                )
+                for item in result["results"]
+            ],
+            processing_time=result["processing_time"],
+            throughput=result["throughput"],
+            stage_stats=result["stage_stats"]
+        )
+    except Exception as e:
+        logger.error(f"Batch upload error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/upload/document", response_model=DocumentUploadResponse)
+async def upload_document(file: UploadFile = File(...), description: Optional[str] = Form(None),
+                          tenant: Optional[str] = Form(None)):
+    result = await rag_service.process_document(file, description, tenant)
+    if not result["success"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=result.get("error") or "Failed to process document"
+        )
+    
+    return DocumentUploadResponse(
+        success=True,
+        document_id=result["document_id"],
+        filename=result["filename"],
+        page_count=result["page_count"],
+        pages_indexed=result["pages_indexed"],
+        pages=[DocumentPageResult(**page) for page in result["pages"]],
+        processing_time=result["processing_time"]
+    )
+
+
+@app.post("/upload/async", response_model=JobSubmitResponse, status_code=status.HTTP_202_ACCEPTED)
+async def upload_image_async(file: UploadFile = File(...), description: Optional[str] = Form(None),
+                             priority: str = Form("interactive"), tenant: Optional[str] = Form(None)):
+    if priority not in ("interactive", "bulk"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="priority must be 'interactive' or 'bulk'"
+        )
+    
+    result = await rag_service.submit_image_job(file, description, lane=priority, tenant=tenant)
+    if not result["success"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=result.get("error", "Failed to queue image")
+        )
+    
+    return JobSubmitResponse(job_id=result["job_id"], status=result["status"], lane=result["lane"])
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: str):
+    job = await rag_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobStatusResponse(**job)
+
+
 @app.post("/question", response_model=QuestionResponse)
 async def ask_question(request: QuestionRequest):
     try:
         result = await rag_service.answer_question(
             question=request.question,
             image_id=request.image_id,
-            top_k=request.top_k
+            top_k=request.top_k,
+            tenant=request.tenant
         )
         
         if not result.success:
@@ -101,7 +254,8 @@ async def ask_question(request: QuestionRequest):
             answer=result.answer,
             confidence=result.confidence,
             relevant_images=result.relevant_images,
-            sources=result.sources
+            sources=result.sources,
+            regions=result.regions
         )
     except Exception as e:
         logger.error(f"Question error: {e}")
@@ -114,7 +268,9 @@ async def search_images(request: SearchRequest):
         result = await rag_service.search_images(
             query=request.query,
             top_k=request.top_k,
-            similarity_threshold=request.threshold
+            similarity_threshold=request.threshold,
+            hybrid=request.hybrid,
+            tenant=request.tenant
         )
         
         if not result["success"]:
@@ -133,7 +289,11 @@ async def search_images(request: SearchRequest):
                 matched_text=res["matched_text"],
                 ocr_confidence=res.get("ocr_confidence", 0.0),
                 detected_language=res.get("detected_language", ""),
-                upload_timestamp=res.get("upload_timestamp", "")
+                upload_timestamp=res.get("upload_timestamp", ""),
+                fusion_score=res.get("fusion_score"),
+                retrievers=res.get("retrievers", []),
+                document_id=res.get("document_id"),
+                page_number=res.get("page_number")
             ))
         
         return SearchResponse(
@@ -146,11 +306,55 @@ async def search_images(request: SearchRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/search/batch", response_model=BatchSearchResponse)
+async def search_images_batch(request: BatchSearchRequest):
+    try:
+        query_ids = [item.id for item in request.queries]
+        if len(set(query_ids)) != len(query_ids):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Query ids must be unique"
+            )
+        
+        start_time = time.time()
+        result = await rag_service.search_images_batch(
+            queries=[item.model_dump() for item in request.queries],
+            hybrid=request.hybrid,
+            tenant=request.tenant
+        )
+        
+        if not result["success"]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=result.get("error", "Batch search failed")
+            )
+        
+        return BatchSearchResponse(
+            results={
+                query_id: [SearchResult(**res) for res in results]
+                for query_id, results in result["results"].items()
+            },
+            total_queries=result["total_queries"],
+            processing_time=time.time() - start_time
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Batch search error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/images")
-async def list_images():
+async def list_images(limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None):
     try:
-        images = await rag_service.list_images()
-        return {"images": images, "total_count": len(images)}
+        page = await rag_service.list_images(limit=limit, cursor=cursor)
+        return {
+            "images": page["images"],
+            "total_count": page["total_count"],
+            "next_cursor": page["next_cursor"]
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"List images error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -183,10 +387,44 @@ async def delete_image(image_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/images/delete", response_model=BulkDeleteResponse)
+async def delete_images(request: BulkDeleteRequest):
+    result = await rag_service.delete_images(request.image_ids)
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=result.get("error", "Failed to delete images"))
+    return BulkDeleteResponse(**result)
+
+
+@app.post("/maintenance/reconcile")
+async def reconcile_orphans(dry_run: bool = Query(False)):
+    result = await rag_service.reconcile_orphans(dry_run=dry_run)
+    if not result["success"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT if result.get("busy") else 500,
+            detail=result.get("error", "Reconciliation failed")
+        )
+    return result
+
+
+@app.get("/health/live")
+async def liveness():
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def readiness():
+    readiness_result = rag_service.get_readiness()
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if readiness_result["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "ready" if readiness_result["ready"] else "starting", **readiness_result}
+    )
+
+
 @app.get("/health", response_model=HealthCheckResponse)
-async def health_check():
+async def health_check(refresh: bool = Query(False)):
     try:
-        health_result = await rag_service.health_check()
+        # Served from the scheduled deep check; refresh=true runs one now
+        health_result = await rag_service.get_health(refresh=refresh)
         return HealthCheckResponse(
             status=health_result["status"],
             services={
@@ -194,13 +432,22 @@ async def health_check():
                 "embedding": health_result["services"]["embedding"]["status"],
                 "vector_db": health_result["services"]["vector_db"]["status"]
             },
-            version="1.0.0"
+            version="1.0.0",
+            checked_at=health_result["checked_at"],
+            check_age=health_result["check_age"],
+            latency=health_result["latency"]
         )
     except Exception as e:
         logger.error(f"Health check error: {e}")
         return HealthCheckResponse(status="unhealthy", services={"error": str(e)}, version="1.0.0")
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus text exposition format 0.0.4
+    return PlainTextResponse(rag_service.get_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     return JSONResponse(
@@ -10,14 +10,99 @@ class ImageUploadResponse(BaseModel):
     filename: str = Field(..., description="Name of the uploaded file")
     extracted_text: str = Field(..., description="Text extracted from the image using OCR")
     message: str = Field(..., description="Status message")
+    deduplicated: bool = Field(default=False, description="Whether OCR and embedding were reused from an identical earlier upload")
     timestamp: datetime = Field(default_factory=datetime.now, description="Upload timestamp")
 
 
+class BatchUploadItem(BaseModel):
+    """Per-file result of a batch upload"""
+    success: bool = Field(..., description="Whether this file was processed successfully")
+    image_id: str = Field(..., description="Unique identifier for the uploaded image")
+    filename: str = Field(..., description="Name of the uploaded file")
+    extracted_text: str = Field(..., description="Text extracted from the image using OCR")
+    deduplicated: bool = Field(default=False, description="Whether OCR and embedding were reused from an identical earlier upload")
+    error_message: Optional[str] = Field(None, description="Error message if processing failed")
+
+
+class BatchUploadResponse(BaseModel):
+    """Response model for batch image upload"""
+    success: bool = Field(..., description="Whether at least one file was processed successfully")
+    total_files: int = Field(..., description="Number of files received")
+    succeeded: int = Field(..., description="Number of files processed successfully")
+    failed: int = Field(..., description="Number of files that failed")
+    deduplicated: int = Field(default=0, description="Number of files served from the content-hash cache")
+    results: List[BatchUploadItem] = Field(..., description="Per-file results in upload order")
+    processing_time: float = Field(..., description="Wall-clock processing time in seconds")
+    throughput: float = Field(..., description="Files processed per second")
+    stage_stats: Dict[str, Dict[str, float]] = Field(..., description="Per-stage item counts, busy time and throughput")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Upload timestamp")
+
+
+class DocumentPageResult(BaseModel):
+    """Per-page result of a document upload"""
+    page_number: int = Field(..., description="1-based page number")
+    image_id: str = Field(..., description="ID under which the page is indexed")
+    success: bool = Field(..., description="Whether this page was processed successfully")
+    ocr_confidence: float = Field(..., description="OCR confidence score")
+    error_message: Optional[str] = Field(None, description="Error message if processing failed")
+
+
+class DocumentUploadResponse(BaseModel):
+    """Response model for a multi-page PDF/TIFF upload"""
+    success: bool = Field(..., description="Whether at least one page was indexed")
+    document_id: str = Field(..., description="Document ID; deleting it deletes every page")
+    filename: str = Field(..., description="Name of the uploaded file")
+    page_count: int = Field(..., description="Number of pages in the document")
+    pages_indexed: int = Field(..., description="Number of pages processed successfully")
+    pages: List[DocumentPageResult] = Field(..., description="Per-page results in page order")
+    processing_time: float = Field(..., description="Wall-clock processing time in seconds")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Upload timestamp")
+
+
+class BulkDeleteRequest(BaseModel):
+    """Request model for deleting many images"""
+    image_ids: List[str] = Field(..., min_length=1, max_length=1000, description="Image or document IDs to delete")
+
+
+class BulkDeleteResponse(BaseModel):
+    """Response model for deleting many images"""
+    success: bool = Field(..., description="Whether the deletion ran")
+    deleted_count: int = Field(..., description="Number of image records removed, including document pages")
+    deleted_ids: List[str] = Field(..., description="IDs removed")
+    not_found: List[str] = Field(default_factory=list, description="Requested IDs that did not exist")
+    bytes_reclaimed: int = Field(..., description="Bytes of upload files removed")
+
+
+class JobSubmitResponse(BaseModel):
+    """Response model for a queued upload"""
+    job_id: str = Field(..., description="ID to poll at /jobs/{job_id}")
+    status: str = Field(..., description="Job status")
+    lane: str = Field(..., description="Priority lane (interactive or bulk)")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Submission timestamp")
+
+
+class JobStatusResponse(BaseModel):
+    """Response model for the status of a queued upload"""
+    job_id: str = Field(..., description="Job ID")
+    status: str = Field(..., description="queued, running, completed or failed")
+    lane: str = Field(..., description="Priority lane (interactive or bulk)")
+    tenant: Optional[str] = Field(None, description="Course (tenant) the upload is indexed into")
+    filename: str = Field(..., description="Name of the uploaded file")
+    created_at: float = Field(..., description="Submission time (Unix seconds)")
+    started_at: Optional[float] = Field(None, description="Start of the latest attempt (Unix seconds)")
+    finished_at: Optional[float] = Field(None, description="Completion time (Unix seconds)")
+    attempts: int = Field(..., description="Number of times the job was started")
+    stage_timings: Optional[Dict[str, float]] = Field(None, description="Seconds spent in each stage (queue_wait, ocr, embedding, indexing, total)")
+    result: Optional[Dict[str, Any]] = Field(None, description="Image ID and extracted text once completed")
+    error: Optional[str] = Field(None, description="Error message if the job failed")
+
+
 class QuestionRequest(BaseModel):
     """Request model for asking questions about images"""
     question: str = Field(..., description="Question to ask about the image(s)")
     image_id: Optional[str] = Field(None, description="Specific image ID to query (optional)")
     top_k: int = Field(default=5, description="Number of top results to retrieve")
+    tenant: Optional[str] = Field(None, description="Course (tenant) whose images are searched; omit for the shared collection")
 
 
 class QuestionResponse(BaseModel):
@@ -26,6 +111,7 @@ class QuestionResponse(BaseModel):
     confidence: float = Field(..., description="Confidence score of the answer")
     relevant_images: List[str] = Field(..., description="List of relevant image IDs")
     sources: List[Dict[str, Any]] = Field(..., description="Source information for the answer")
+    regions: List[Dict[str, Any]] = Field(default_factory=list, description="Best-matching OCR lines with image ID, text, bbox (x0, y0, x1, y1), confidence and similarity")
     timestamp: datetime = Field(default_factory=datetime.now, description="Response timestamp")
 
 
@@ -34,6 +120,8 @@ class SearchRequest(BaseModel):
     query: str = Field(..., description="Search query")
     top_k: int = Field(default=10, description="Number of top results to return")
     threshold: float = Field(default=0.5, description="Minimum similarity threshold")
+    hybrid: Optional[bool] = Field(None, description="Fuse keyword (BM25) and vector results; defaults to the server setting")
+    tenant: Optional[str] = Field(None, description="Course (tenant) whose images are searched; omit for the shared collection")
 
 
 class SearchResult(BaseModel):
@@ -45,6 +133,10 @@ class SearchResult(BaseModel):
     ocr_confidence: float = Field(..., description="OCR confidence score")
     detected_language: str = Field(..., description="Detected language")
     upload_timestamp: str = Field(..., description="Upload timestamp")
+    fusion_score: Optional[float] = Field(None, description="Reciprocal-rank fusion score (hybrid search only)")
+    retrievers: List[str] = Field(default_factory=list, description="Retrievers that returned this image")
+    document_id: Optional[str] = Field(None, description="Source document ID when the match is a PDF/TIFF page")
+    page_number: Optional[int] = Field(None, description="1-based page number when the match is a PDF/TIFF page")
 
 
 class SearchResponse(BaseModel):
@@ -55,6 +147,29 @@ class SearchResponse(BaseModel):
     timestamp: datetime = Field(default_factory=datetime.now, description="Search timestamp")
 
 
+class BatchSearchQuery(BaseModel):
+    """One query of a batch search"""
+    id: str = Field(..., description="Caller-chosen query id used to key the results")
+    query: str = Field(..., description="Search query")
+    top_k: int = Field(default=10, ge=1, description="Number of top results to return")
+    threshold: float = Field(default=0.5, description="Minimum similarity threshold")
+
+
+class BatchSearchRequest(BaseModel):
+    """Request model for several searches in one call"""
+    queries: List[BatchSearchQuery] = Field(..., min_length=1, max_length=100, description="Queries to run")
+    hybrid: Optional[bool] = Field(None, description="Fuse keyword (BM25) and vector results; defaults to the server setting")
+    tenant: Optional[str] = Field(None, description="Course (tenant) every query searches; omit for the shared collection")
+
+
+class BatchSearchResponse(BaseModel):
+    """Response model for batch search"""
+    results: Dict[str, List[SearchResult]] = Field(..., description="Search results keyed by query id")
+    total_queries: int = Field(..., description="Number of queries run")
+    processing_time: float = Field(..., description="Processing time in seconds")
+    timestamp: datetime = Field(default_factory=datetime.now, description="Search timestamp")
+
+
 class ImageInfo(BaseModel):
     """Model for image information"""
     image_id: str = Field(..., description="Unique identifier for the image")
@@ -85,6 +200,9 @@ class HealthCheckResponse(BaseModel):
     timestamp: datetime = Field(default_factory=datetime.now, description="Health check timestamp")
     services: Dict[str, str] = Field(..., description="Status of individual services")
     version: str = Field(..., description="API version")
+    checked_at: Optional[float] = Field(None, description="When the reported deep check ran (Unix seconds)")
+    check_age: Optional[float] = Field(None, description="Seconds since the reported deep check ran")
+    latency: Dict[str, Dict[str, float]] = Field(default_factory=dict, description="Per-component deep check latency in seconds (samples, last, mean, p50, p95, max)")
 
 
 class ErrorResponse(BaseModel):
@@ -0,0 +1,113 @@
+import cv2
+import numpy as np
+from PIL import Image
+from typing import Dict, Optional
+from pathlib import Path
+import logging
+import threading
+import time
+import io
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class DocumentReader:
+    """
+    Page-at-a-time rasterizer for multi-page PDF and TIFF uploads
+
+    Only the encoded document is kept in memory; each page is decoded or
+    rendered on request and handed back as a BGR array, so callers that
+    bound how many pages they hold at once bound the rasterized memory.
+    PDF rendering needs PyMuPDF, which is imported lazily. Both backends
+    keep per-document state (the current TIFF frame, the PDF handle), so
+    rendering is serialized by a lock; OCR of the returned arrays is not.
+    """
+
+    PDF_FORMATS = {'.pdf'}
+    TIFF_FORMATS = {'.tif', '.tiff'}
+
+    def __init__(self, content: bytes, filename: str, dpi: int = 200, max_size: int = 2048):
+        """
+        Open a document
+
+        Args:
+            content: Encoded document bytes
+            filename: Original filename, used to pick the backend
+            dpi: Resolution PDF pages are rendered at
+            max_size: Longer side rendered pages are limited to
+        """
+        self.filename = filename
+        self.dpi = dpi
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.load_timings: Dict[str, float] = {}
+        self.fitz = None
+        self.pdf = None
+        self.tiff: Optional[Image.Image] = None
+
+        file_ext = Path(filename).suffix.lower()
+        if file_ext in self.PDF_FORMATS:
+            start_time = time.time()
+            try:
+                import fitz
+            except ImportError as e:
+                raise RuntimeError("PDF ingestion requires PyMuPDF (pip install pymupdf)") from e
+            self.load_timings["import"] = time.time() - start_time
+            self.fitz = fitz
+            self.pdf = fitz.open(stream=content, filetype="pdf")
+            self.page_count = self.pdf.page_count
+        elif file_ext in self.TIFF_FORMATS:
+            self.tiff = Image.open(io.BytesIO(content))
+            self.page_count = getattr(self.tiff, "n_frames", 1)
+        else:
+            raise ValueError(f"Unsupported document format: {file_ext}")
+
+    @classmethod
+    def is_document(cls, filename: str) -> bool:
+        """Whether a filename has a format this reader splits into pages"""
+        return Path(filename or "").suffix.lower() in cls.PDF_FORMATS | cls.TIFF_FORMATS
+
+    def render_page(self, page_index: int) -> np.ndarray:
+        """
+        Rasterize one page
+
+        Args:
+            page_index: Zero-based page index
+
+        Returns:
+            BGR array whose longer side is at most max_size
+        """
+        with self.lock:
+            if self.pdf is not None:
+                page = self.pdf.load_page(page_index)
+                # Render straight at the capped size instead of downscaling a full-DPI bitmap
+                zoom = self.dpi / 72.0
+                longer_side = max(page.rect.width, page.rect.height) * zoom
+                if longer_side > self.max_size:
+                    zoom *= self.max_size / longer_side
+                pixmap = page.get_pixmap(matrix=self.fitz.Matrix(zoom, zoom), alpha=False)
+                image = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.width, pixmap.n)
+                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR if pixmap.n == 3 else cv2.COLOR_GRAY2BGR)
+            else:
+                self.tiff.seek(page_index)
+                frame = self.tiff.convert("RGB")
+                frame.thumbnail((self.max_size, self.max_size), Image.LANCZOS)
+                image = cv2.cvtColor(np.asarray(frame), cv2.COLOR_RGB2BGR)
+        return image
+
+    def close(self):
+        """Release the document handle"""
+        with self.lock:
+            if self.pdf is not None:
+                self.pdf.close()
+                self.pdf = None
+            if self.tiff is not None:
+                self.tiff.close()
+                self.tiff = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,5 +1,4 @@
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from typing import List, Dict, Any, Optional, Union
 import logging
 import asyncio
@@ -9,7 +8,9 @@ import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.utils import TextUtils
+from utils.utils import TextUtils, LRUCache
+from services.micro_batcher import MicroBatcher
+from services.onnx_embedding_backend import OnnxEmbeddingBackend
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,17 +19,41 @@ logger = logging.getLogger(__name__)
 class EmbeddingService:
     """Service for generating text embeddings using sentence-transformers"""
     
-    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
+    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+                 batch_wait_ms: float = 5.0, max_batch_size: int = 32,
+                 cache_size: int = 2048, cache_ttl: float = 0, max_cached_chars: int = 1000,
+                 backend: str = "pytorch", onnx_cache_dir: str = "cache/onnx"):
         """
         Initialize embedding service
         
         Args:
             model_name: Name of the sentence-transformers model to use
+            batch_wait_ms: How long concurrent requests are collected into one batch; 0 disables micro-batching
+            max_batch_size: Maximum number of texts per micro-batch
+            cache_size: Maximum number of cached embeddings; 0 disables the cache
+            cache_ttl: Cached embedding lifetime in seconds; 0 keeps them until evicted
+            max_cached_chars: Only texts up to this length are cached; ingestion bypasses the cache via use_cache=False
+            backend: "pytorch", "onnx" (fp32) or "onnx-int8" (dynamically quantized)
+            onnx_cache_dir: Directory where exported ONNX models are cached
         """
         self.model_name = model_name
+        self.backend = backend
+        self.onnx_cache_dir = onnx_cache_dir
         self.model = None
         self.executor = ThreadPoolExecutor(max_workers=2)
         self.embedding_dim = None
+        self.lowercase_keys = False
+        self.load_timings: Dict[str, float] = {}
+        self.cache = LRUCache(max_size=cache_size, ttl=cache_ttl) if cache_size > 0 else None
+        self.max_cached_chars = max_cached_chars
+        self.batcher = None
+        if batch_wait_ms > 0:
+            self.batcher = MicroBatcher(
+                self._encode_text_sync,
+                self.executor,
+                max_wait_ms=batch_wait_ms,
+                max_batch_size=max_batch_size
+            )
         
         # Initialize model
         self._initialize_model()
@@ -36,14 +61,35 @@ class EmbeddingService:
     def _initialize_model(self):
         """Initialize sentence-transformers model"""
         try:
-            logger.info(f"Initializing sentence-transformers model: {self.model_name}")
-            self.model = SentenceTransformer(self.model_name)
+            logger.info(f"Initializing {self.backend} embedding model: {self.model_name}")
+            start_time = time.time()
+            if self.backend in ("onnx", "onnx-int8"):
+                import onnxruntime  # noqa: F401  (imported here so its cost is measured)
+                self.load_timings["import"] = time.time() - start_time
+                self.model = OnnxEmbeddingBackend(
+                    self.model_name,
+                    cache_dir=self.onnx_cache_dir,
+                    quantize=self.backend == "onnx-int8"
+                )
+            else:
+                # Imported lazily: torch and transformers dominate cold start
+                from sentence_transformers import SentenceTransformer
+                self.load_timings["import"] = time.time() - start_time
+                self.model = SentenceTransformer(self.model_name)
             
             # Get embedding dimension
             test_embedding = self.model.encode(["test"])
             self.embedding_dim = test_embedding.shape[1]
             
-            logger.info(f"Model initialized successfully. Embedding dimension: {self.embedding_dim}")
+            # Uncased tokenizers map case variants to the same embedding, so cache keys can ignore case
+            tokenizer = getattr(self.model, 'tokenizer', None)
+            self.lowercase_keys = bool(getattr(tokenizer, 'do_lower_case', False))
+            
+            self.load_timings["load"] = time.time() - start_time - self.load_timings["import"]
+            logger.info(
+                f"Model initialized successfully. Embedding dimension: {self.embedding_dim} "
+                f"(import {self.load_timings['import']:.2f}s, load {self.load_timings['load']:.2f}s)"
+            )
         except Exception as e:
             logger.error(f"Failed to initialize embedding model: {str(e)}")
             raise
@@ -99,31 +145,76 @@ class EmbeddingService:
             # Return zero embeddings as fallback
             return np.zeros((len(texts) if isinstance(texts, list) else 1, self.embedding_dim))
     
-    async def encode_text(self, texts: Union[str, List[str]], normalize: bool = True) -> np.ndarray:
+    async def encode_text(self, texts: Union[str, List[str]], normalize: bool = True,
+                          use_cache: bool = True) -> np.ndarray:
         """
         Asynchronous text encoding
         
         Args:
             texts: Single text or list of texts to encode
             normalize: Whether to normalize embeddings
-            
+            use_cache: Read and fill the query-embedding cache; pass False for ingested
+                chunks and OCR lines, which would otherwise evict the queries it is for
+
         Returns:
             Numpy array of embeddings
         """
         try:
-            loop = asyncio.get_event_loop()
-            embeddings = await loop.run_in_executor(
-                self.executor,
-                self._encode_text_sync,
-                texts,
-                normalize
-            )
-            return embeddings
+            text_list = [texts] if isinstance(texts, str) else texts
+            
+            if use_cache and self.cache is not None and text_list:
+                return await self._encode_with_cache(text_list, normalize)
+            
+            return await self._encode_uncached(text_list, normalize)
         except Exception as e:
             logger.error(f"Error in async text encoding: {str(e)}")
             text_count = len(texts) if isinstance(texts, list) else 1
             return np.zeros((text_count, self.embedding_dim))
     
+    def _cache_key(self, text: str, normalize: bool) -> Optional[tuple]:
+        """Build the cache key for a text, or None if it should not be cached"""
+        cleaned = TextUtils.clean_ocr_text(text)
+        if not cleaned or len(cleaned) > self.max_cached_chars:
+            return None
+        if self.lowercase_keys:
+            cleaned = cleaned.lower()
+        return (self.model_name, cleaned, normalize)
+    
+    async def _encode_with_cache(self, texts: List[str], normalize: bool) -> np.ndarray:
+        """Encode texts, serving repeated ones from the LRU cache"""
+        keys = [self._cache_key(text, normalize) for text in texts]
+        cached = [self.cache.get(key) if key is not None else None for key in keys]
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        
+        if not missing:
+            return np.stack(cached)
+        
+        encoded = await self._encode_uncached([texts[i] for i in missing], normalize)
+        for i, vector in zip(missing, encoded):
+            vector = np.asarray(vector, dtype=np.float32).copy()
+            cached[i] = vector
+            # Zero rows are the fallback for a failed encode (cached texts are never empty);
+            # caching one would pin that query to no hits
+            if keys[i] is not None and vector.any():
+                self.cache.put(keys[i], vector)
+        
+        return np.stack(cached)
+    
+    async def _encode_uncached(self, texts: List[str], normalize: bool) -> np.ndarray:
+        """Encode texts with the model, micro-batching small requests"""
+        # Small requests share a forward pass with concurrent ones; large ones are already batches
+        if self.batcher is not None and 0 < len(texts) < self.batcher.max_batch_size:
+            return await self.batcher.submit(texts, normalize)
+        
+        loop = asyncio.get_event_loop()
+        embeddings = await loop.run_in_executor(
+            self.executor,
+            self._encode_text_sync,
+            texts,
+            normalize
+        )
+        return embeddings
+    
     def _chunk_and_encode_sync(self, text: str, chunk_size: int = 500, overlap: int = 50) -> List[Dict[str, Any]]:
         """
         Synchronous text chunking and encoding
@@ -291,9 +382,12 @@ class EmbeddingService:
         """Get information about the embedding model"""
         return {
             "model_name": self.model_name,
+            "backend": self.backend,
             "embedding_dim": self.embedding_dim,
             "max_seq_length": getattr(self.model, 'max_seq_length', 512),
-            "model_initialized": self.model is not None
+            "model_initialized": self.model is not None,
+            "micro_batching": self.batcher.get_stats() if self.batcher else None,
+            "query_cache": self.cache.get_stats() if self.cache else None
         }
     
     async def health_check(self) -> Dict[str, Any]:
@@ -301,9 +395,9 @@ class EmbeddingService:
         try:
             start_time = time.time()
             
-            # Test encoding
+            # Test encoding, bypassing the query cache so the model itself is exercised
             test_texts = ["This is a test sentence.", "Đây là câu thử nghiệm."]
-            embeddings = await self.encode_text(test_texts)
+            embeddings = await self._encode_uncached(test_texts, normalize=True)
             
             # Test similarity
             similarity = self.calculate_similarity(embeddings[0], embeddings[1])
@@ -314,9 +408,12 @@ class EmbeddingService:
                 "status": "healthy",
                 "test_time": test_time,
                 "model_name": self.model_name,
+                "backend": self.backend,
                 "embedding_dim": self.embedding_dim,
                 "test_similarity": similarity,
-                "test_passed": embeddings is not None and len(embeddings) == 2
+                "test_passed": embeddings is not None and len(embeddings) == 2,
+                "micro_batching": self.batcher.get_stats() if self.batcher else None,
+                "query_cache": self.cache.get_stats() if self.cache else None
             }
             
         except Exception as e:
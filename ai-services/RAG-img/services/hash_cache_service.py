@@ -0,0 +1,337 @@
+import sqlite3
+import numpy as np
+from typing import Dict, Any, Optional
+import logging
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.perceptual_index import MultiIndexHashTable
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class HashCacheService:
+    """
+    Persistent content-hash cache of OCR results and chunk embeddings
+
+    Entries are keyed by exact content hash and, optionally, indexed by
+    perceptual hash so re-encoded or resized copies of an image are found
+    as near-duplicates.
+
+    The perceptual index is held in memory by each process. Hashes that
+    other workers write to the shared SQLite file are pulled into it when a
+    near-duplicate lookup misses, so their images are found without a
+    restart.
+    """
+
+    # Added after the first release; migrated in place
+    OPTIONAL_COLUMNS = {
+        "chunk_count": "INTEGER NOT NULL DEFAULT 1",
+        "phash": "INTEGER",
+        "phash_fine": "BLOB",
+        "aspect": "REAL"
+    }
+
+    def __init__(self, cache_path: str = "cache/content_hashes.db", near_duplicate_max_distance: int = 4):
+        """
+        Initialize hash cache service
+
+        Args:
+            cache_path: Path to the SQLite cache file
+            near_duplicate_max_distance: Largest 64-bit dHash Hamming distance treated as a
+                near-duplicate; negative disables near-duplicate lookup
+        """
+        self.cache_path = cache_path
+        self.near_duplicate_max_distance = near_duplicate_max_distance
+        self.connection = None
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.hits = 0
+        self.misses = 0
+        self.near_hits = 0
+        self.phash_index = (
+            MultiIndexHashTable(bits=64, radius=near_duplicate_max_distance)
+            if near_duplicate_max_distance >= 0 else None
+        )
+        # Highest content_hashes rowid already loaded into phash_index
+        self.indexed_rowid = 0
+        self.indexed_hashes = set()
+
+        self._initialize_db()
+
+    def _initialize_db(self):
+        """Create the cache table if needed"""
+        try:
+            cache_dir = os.path.dirname(self.cache_path)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+
+            self.connection = sqlite3.connect(self.cache_path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS content_hashes (
+                    file_hash TEXT PRIMARY KEY,
+                    extracted_text TEXT NOT NULL,
+                    ocr_confidence REAL NOT NULL,
+                    detected_language TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    vector_id TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    chunk_count INTEGER NOT NULL DEFAULT 1
+                )
+                """
+            )
+            # Older caches lack chunk counts (single vector) and perceptual hashes
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(content_hashes)")]
+            for column, definition in self.OPTIONAL_COLUMNS.items():
+                if column not in columns:
+                    self.connection.execute(f"ALTER TABLE content_hashes ADD COLUMN {column} {definition}")
+            self.connection.commit()
+
+            if self.phash_index is not None:
+                self._sync_index()
+            logger.info(f"Hash cache initialized at: {self.cache_path}")
+        except Exception as e:
+            logger.error(f"Failed to initialize hash cache: {str(e)}")
+            raise
+
+    def _get_sync(self, file_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Synchronous cache lookup
+
+        Args:
+            file_hash: Content hash of the uploaded file
+
+        Returns:
+            Cached entry or None on miss
+        """
+        entry = self._read_entry(file_hash)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def _read_entry(self, file_hash: str) -> Optional[Dict[str, Any]]:
+        """Read one cache entry"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT extracted_text, ocr_confidence, detected_language, embedding, vector_id, chunk_count "
+                "FROM content_hashes WHERE file_hash = ?",
+                (file_hash,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        extracted_text, ocr_confidence, detected_language, embedding, vector_id, chunk_count = row
+        return {
+            "extracted_text": extracted_text,
+            "ocr_confidence": ocr_confidence,
+            "detected_language": detected_language,
+            "embeddings": np.frombuffer(embedding, dtype=np.float32).reshape(chunk_count, -1),
+            "vector_id": vector_id
+        }
+
+    async def get(self, file_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Asynchronous cache lookup
+
+        Args:
+            file_hash: Content hash of the uploaded file
+
+        Returns:
+            Cached entry or None on miss or error
+        """
+        if not file_hash:
+            return None
+        try:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(self.executor, self._get_sync, file_hash)
+        except Exception as e:
+            logger.error(f"Error reading hash cache: {str(e)}")
+            return None
+
+    def _sync_index(self) -> int:
+        """
+        Load perceptual hashes written since the last sync into phash_index
+
+        Returns:
+            Number of hashes added
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT rowid, file_hash, phash FROM content_hashes WHERE rowid > ? AND phash IS NOT NULL "
+                "ORDER BY rowid",
+                (self.indexed_rowid,)
+            ).fetchall()
+            added = 0
+            for rowid, file_hash, phash in rows:
+                self.indexed_rowid = max(self.indexed_rowid, rowid)
+                # INSERT OR REPLACE gives a replaced entry a new rowid
+                if file_hash in self.indexed_hashes:
+                    continue
+                self.indexed_hashes.add(file_hash)
+                self.phash_index.add(phash & (2**64 - 1), file_hash)
+                added += 1
+        return added
+
+    def _find_similar_sync(self, perceptual: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Synchronous near-duplicate lookup
+
+        A miss first pulls in hashes other workers have stored since the
+        last sync and searches again.
+        """
+        entry = self._match_similar(perceptual)
+        if entry is None and self._sync_index():
+            entry = self._match_similar(perceptual)
+        return entry
+
+    def _match_similar(self, perceptual: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Search phash_index for a confirmed near-duplicate
+
+        Candidates within the 64-bit radius are confirmed against the
+        256-bit hash (same relative radius) and the aspect ratio, so slides
+        that share a template but differ in text are not merged.
+        """
+        max_fine_distance = self.near_duplicate_max_distance * 4
+        query_fine = int.from_bytes(perceptual["phash_fine"], "big")
+        for distance, file_hash in self.phash_index.search(perceptual["phash"]):
+            with self.lock:
+                row = self.connection.execute(
+                    "SELECT phash_fine, aspect FROM content_hashes WHERE file_hash = ?", (file_hash,)
+                ).fetchone()
+            if row is None or row[0] is None or not row[1]:
+                continue
+
+            phash_fine, aspect = row
+            fine_distance = bin(int.from_bytes(phash_fine, "big") ^ query_fine).count("1")
+            if fine_distance > max_fine_distance or abs(aspect - perceptual["aspect"]) > 0.02 * aspect:
+                continue
+
+            entry = self._read_entry(file_hash)
+            if entry is not None:
+                self.near_hits += 1
+                entry.update(source_hash=file_hash, phash_distance=distance)
+                return entry
+        return None
+
+    async def find_similar(self, perceptual: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Find a cached entry for a perceptually identical image
+
+        Args:
+            perceptual: Result of ImageUtils.compute_perceptual_hashes
+
+        Returns:
+            Cached entry with "source_hash" and "phash_distance", or None
+        """
+        if self.phash_index is None or not perceptual:
+            return None
+        try:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(self.executor, self._find_similar_sync, perceptual)
+        except Exception as e:
+            logger.error(f"Error searching perceptual hashes: {str(e)}")
+            return None
+
+    def _put_sync(self, file_hash: str, extracted_text: str, ocr_confidence: float,
+                  detected_language: str, embeddings: np.ndarray, vector_id: str,
+                  perceptual: Optional[Dict[str, Any]] = None) -> bool:
+        """Synchronous cache insert"""
+        matrix = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        perceptual = perceptual or {}
+        phash = perceptual.get("phash")
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO content_hashes "
+                "(file_hash, extracted_text, ocr_confidence, detected_language, embedding, vector_id, created_at, "
+                "chunk_count, phash, phash_fine, aspect) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    file_hash,
+                    extracted_text,
+                    float(ocr_confidence),
+                    detected_language,
+                    matrix.tobytes(),
+                    vector_id,
+                    time.time(),
+                    matrix.shape[0],
+                    # SQLite integers are signed 64-bit
+                    phash - 2**64 if phash is not None and phash >= 2**63 else phash,
+                    perceptual.get("phash_fine"),
+                    perceptual.get("aspect")
+                )
+            )
+            self.connection.commit()
+        if self.phash_index is not None and phash is not None:
+            self._sync_index()
+        return True
+
+    async def put(self, file_hash: str, extracted_text: str, ocr_confidence: float,
+                  detected_language: str, embeddings: np.ndarray, vector_id: str,
+                  perceptual: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Asynchronous cache insert
+
+        Args:
+            file_hash: Content hash of the uploaded file
+            extracted_text: OCR text for the file
+            ocr_confidence: Mean OCR confidence
+            detected_language: Detected language code
+            embeddings: Chunk embedding matrix (stored as float32)
+            vector_id: ID of the first vector created for the file
+            perceptual: Perceptual hashes for near-duplicate lookup
+
+        Returns:
+            True if the entry was stored
+        """
+        if not file_hash:
+            return False
+        try:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(
+                self.executor,
+                self._put_sync,
+                file_hash,
+                extracted_text,
+                ocr_confidence,
+                detected_language,
+                embeddings,
+                vector_id,
+                perceptual
+            )
+        except Exception as e:
+            logger.error(f"Error writing hash cache: {str(e)}")
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache hit/miss statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "cache_path": self.cache_path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "near_duplicate_hits": self.near_hits,
+            "perceptual_hashes": len(self.phash_index) if self.phash_index is not None else 0,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def __del__(self):
+        """Cleanup when service is destroyed"""
+        try:
+            if hasattr(self, 'executor'):
+                self.executor.shutdown(wait=True)
+            if getattr(self, 'connection', None) is not None:
+                self.connection.close()
+        except:
+            pass
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Any, Optional
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """
+    Scheduled deep health check whose last report is served from memory
+
+    The deep check runs real OCR and embedding inference and a vector
+    search, which is too expensive to repeat on every orchestrator probe.
+    The monitor runs it every interval seconds, keeps the last report and
+    records each component's check latency in a rolling window. Callers
+    that ask for a fresh report while a check is running share that check.
+    """
+
+    # Check latencies kept per component
+    WINDOW = 120
+
+    def __init__(self, rag_service, interval: float = 30):
+        """
+        Initialize monitor
+
+        Args:
+            rag_service: RAGService whose health_check is run
+            interval: Seconds between scheduled checks (0 checks on every request instead)
+        """
+        self.rag_service = rag_service
+        self.interval = interval
+        self.task: Optional[asyncio.Task] = None
+        self.pending: Optional[asyncio.Task] = None
+        self.last_report: Optional[Dict[str, Any]] = None
+        self.latencies: Dict[str, Deque[float]] = {}
+
+    async def _check(self) -> Dict[str, Any]:
+        report = await self.rag_service.health_check()
+        report["checked_at"] = time.time()
+        for name, service in report.get("services", {}).items():
+            if "check_time" in service:
+                self.latencies.setdefault(name, deque(maxlen=self.WINDOW)).append(service["check_time"])
+        self.last_report = report
+        return report
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Run a deep check now, or join the one already running
+
+        Returns:
+            The health report
+        """
+        if self.pending is None or self.pending.done():
+            self.pending = asyncio.create_task(self._check())
+        # Shielded so a caller that disconnects does not cancel the check for everyone else
+        return await asyncio.shield(self.pending)
+
+    async def get(self, refresh: bool = False) -> Dict[str, Any]:
+        """
+        Last health report, with its age and per-component latency stats
+
+        A check is run first if none has finished yet, if scheduling is
+        disabled, or if refresh is set.
+
+        Args:
+            refresh: Run a deep check instead of serving the cached report
+
+        Returns:
+            Health report with "checked_at", "check_age" and "latency"
+        """
+        report = self.last_report
+        if report is None or refresh or self.interval <= 0:
+            report = await self.run()
+        return {
+            **report,
+            "check_age": time.time() - report["checked_at"],
+            "check_interval": self.interval,
+            "latency": self.latency_stats()
+        }
+
+    def latency_stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-component check latency over the rolling window, in seconds"""
+        stats = {}
+        for name, samples in self.latencies.items():
+            values = np.fromiter(samples, dtype=np.float64)
+            if not len(values):
+                continue
+            p50, p95 = np.percentile(values, [50, 95])
+            stats[name] = {
+                "samples": len(values),
+                "last": float(values[-1]),
+                "mean": float(values.mean()),
+                "p50": float(p50),
+                "p95": float(p95),
+                "max": float(values.max())
+            }
+        return stats
+
+    def start(self):
+        """Schedule checks every interval seconds"""
+        if self.task is None and self.interval > 0:
+            self.task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Cancel scheduled checks"""
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _loop(self):
+        # The first report is taken once the models have loaded, not while they are still loading
+        await asyncio.gather(*self.rag_service.component_tasks.values(), return_exceptions=True)
+        while True:
+            try:
+                await self.run()
+            except Exception as e:
+                logger.error(f"Scheduled health check failed: {str(e)}")
+            await asyncio.sleep(self.interval)
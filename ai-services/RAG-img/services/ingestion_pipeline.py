@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import time
+from typing import List, Dict, Any, Optional, Tuple
+from fastapi import UploadFile
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class StageStats:
+    """Throughput counters for a single pipeline stage"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.batches = 0
+        self.busy_time = 0.0
+
+    def record(self, items: int, elapsed: float):
+        """Record one unit of work done by the stage"""
+        self.items += items
+        self.batches += 1
+        self.busy_time += elapsed
+
+    def to_dict(self, wall_time: float) -> Dict[str, Any]:
+        """Export counters, with throughput measured against busy and wall time"""
+        return {
+            "items": self.items,
+            "batches": self.batches,
+            "busy_time": self.busy_time,
+            "items_per_second": self.items / self.busy_time if self.busy_time > 0 else 0.0,
+            "wall_items_per_second": self.items / wall_time if wall_time > 0 else 0.0,
+            "utilization": self.busy_time / wall_time if wall_time > 0 else 0.0
+        }
+
+
+class IngestionPipeline:
+    """
+    Staged ingestion pipeline for bulk image uploads
+
+    Images flow through three stages connected by bounded queues:
+    save + OCR (per image, ocr_concurrency at a time), embedding (batched)
+    and vector DB insert (batched). While batch N is being inserted, batch
+    N+1 is being embedded and the images of batch N+2 are being OCR'd.
+    """
+
+    def __init__(self, rag_service, batch_size: int = 16, queue_size: int = 32, ocr_concurrency: int = 2):
+        """
+        Initialize ingestion pipeline
+
+        Args:
+            rag_service: RAGService providing the prepare/store steps and services
+            batch_size: Maximum number of images per embedding/insert batch
+            queue_size: Capacity of each inter-stage queue
+            ocr_concurrency: Number of images saved and OCR'd concurrently
+        """
+        self.rag_service = rag_service
+        self.batch_size = max(1, batch_size)
+        self.queue_size = max(1, queue_size)
+        self.ocr_concurrency = max(1, ocr_concurrency)
+        self.stats = {
+            "ocr": StageStats("ocr"),
+            "embedding": StageStats("embedding"),
+            "vector_insert": StageStats("vector_insert")
+        }
+
+    async def run(self, files: List[UploadFile],
+                  descriptions: Optional[List[Optional[str]]] = None,
+                  tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run all files through the pipeline
+
+        Args:
+            files: Uploaded image files
+            descriptions: Optional descriptions aligned with files
+            tenant: Tenant partition every file is indexed into
+
+        Returns:
+            Dictionary with per-file results (in input order) and per-stage stats
+        """
+        start_time = time.time()
+        descriptions = descriptions or []
+        results: List[Any] = [None] * len(files)
+
+        pending = asyncio.Queue()
+        for index, file in enumerate(files):
+            description = descriptions[index] if index < len(descriptions) else None
+            pending.put_nowait((index, file, description, tenant))
+
+        ocr_queue = asyncio.Queue(maxsize=self.queue_size)
+        insert_queue = asyncio.Queue(maxsize=max(1, self.queue_size // self.batch_size))
+
+        ocr_workers = [
+            asyncio.create_task(self._ocr_stage(pending, ocr_queue, results))
+            for _ in range(min(self.ocr_concurrency, max(1, len(files))))
+        ]
+        embed_task = asyncio.create_task(self._embedding_stage(ocr_queue, insert_queue, results))
+        insert_task = asyncio.create_task(self._insert_stage(insert_queue, results))
+
+        await asyncio.gather(*ocr_workers)
+        await ocr_queue.put(None)
+        await asyncio.gather(embed_task, insert_task)
+
+        wall_time = time.time() - start_time
+        succeeded = sum(1 for result in results if result is not None and result.success)
+        deduplicated = sum(1 for result in results if result is not None and result.deduplicated)
+
+        return {
+            "success": succeeded > 0 or not files,
+            "results": results,
+            "total_files": len(files),
+            "succeeded": succeeded,
+            "failed": len(files) - succeeded,
+            "deduplicated": deduplicated,
+            "processing_time": wall_time,
+            "throughput": len(files) / wall_time if wall_time > 0 else 0.0,
+            "stage_stats": {name: stats.to_dict(wall_time) for name, stats in self.stats.items()}
+        }
+
+    async def _ocr_stage(self, pending: asyncio.Queue, ocr_queue: asyncio.Queue, results: List[Any]):
+        """Save and OCR images, forwarding successful ones to the embedding stage"""
+        while True:
+            try:
+                index, file, description, tenant = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            stage_start = time.time()
+            prepared = await self.rag_service._prepare_image(file, description, tenant)
+            self.stats["ocr"].record(1, time.time() - stage_start)
+
+            if prepared.result.success:
+                # Blocks when embedding falls behind, bounding memory
+                await ocr_queue.put((index, prepared))
+            else:
+                results[index] = prepared.result
+
+    async def _embedding_stage(self, ocr_queue: asyncio.Queue, insert_queue: asyncio.Queue, results: List[Any]):
+        """Embed whatever is queued (up to batch_size) in one forward pass; cached embeddings are reused"""
+        done = False
+        while not done:
+            item = await ocr_queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = ocr_queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if item is None:
+                    done = True
+                    break
+                batch.append(item)
+
+            stage_start = time.time()
+            try:
+                await self.rag_service._embed_prepared([prepared for _, prepared in batch])
+                self.stats["embedding"].record(len(batch), time.time() - stage_start)
+                await insert_queue.put(batch)
+            except Exception as e:
+                logger.error(f"Embedding stage failed for batch of {len(batch)}: {str(e)}")
+                self._fail_batch(batch, results, str(e))
+
+        await insert_queue.put(None)
+
+    async def _insert_stage(self, insert_queue: asyncio.Queue, results: List[Any]):
+        """Insert embedded batches into the vector DB and metadata store"""
+        while True:
+            batch = await insert_queue.get()
+            if batch is None:
+                return
+
+            stage_start = time.time()
+            try:
+                store_result = await self.rag_service._store_images([prepared for _, prepared in batch])
+                self.stats["vector_insert"].record(len(batch), time.time() - stage_start)
+                failed = store_result.get("failed", {})
+                for index, prepared in batch:
+                    if prepared.result.image_id in failed:
+                        self._fail_batch([(index, prepared)], results, failed[prepared.result.image_id])
+                    else:
+                        results[index] = prepared.result
+            except Exception as e:
+                logger.error(f"Insert stage failed for batch of {len(batch)}: {str(e)}")
+                self._fail_batch(batch, results, str(e))
+
+    @staticmethod
+    def _fail_batch(batch: List[Tuple[int, Any]], results: List[Any], error_message: str):
+        """Mark every image of a batch as failed"""
+        for index, prepared in batch:
+            prepared.result.success = False
+            prepared.result.error_message = error_message
+            results[index] = prepared.result
@@ -0,0 +1,432 @@
+import sqlite3
+from typing import Dict, Any, Optional, Callable, Awaitable, List
+import logging
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import json
+import uuid
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.utils import FileUtils
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class JobQueueService:
+    """
+    Durable local job queue backed by SQLite in WAL mode
+
+    Uploaded bytes are spooled to disk and each job is a row, so queued
+    jobs survive a restart. Jobs are claimed in lane priority order
+    (interactive before bulk), oldest first, by a fixed number of asyncio
+    workers; claiming is a single write transaction, so several uvicorn
+    workers can share one queue file.
+
+    A claimed job holds a lease that its worker renews while the job runs.
+    When a worker dies, its lease expires and any live worker requeues the
+    job, up to max_attempts claims; after that it is marked failed, so an
+    input that crashes the process cannot crash it on every retry. Finished
+    jobs are purged after retention seconds.
+    """
+
+    # Lower runs first
+    LANES = {"interactive": 0, "bulk": 1}
+    STATUSES = ("queued", "running", "completed", "failed")
+
+    # Seconds between purges of finished jobs
+    PURGE_INTERVAL = 3600
+
+    def __init__(self, db_path: str = "cache/jobs.db", spool_dir: str = "cache/job_spool",
+                 concurrency: int = 2, poll_interval: float = 1.0, max_attempts: int = 3,
+                 retention: float = 7 * 86400, lease_timeout: float = 120.0):
+        """
+        Initialize job queue
+
+        Args:
+            db_path: Path to the SQLite database file
+            spool_dir: Directory holding uploaded bytes of pending jobs
+            concurrency: Number of jobs processed at the same time by this process
+            poll_interval: Seconds between queue polls when idle
+            max_attempts: Claims after which a job interrupted by a dying worker is failed instead of requeued
+            retention: Seconds completed and failed jobs are kept (0 keeps them forever)
+            lease_timeout: Seconds without a lease renewal after which a running job is
+                considered abandoned and requeued
+        """
+        self.db_path = db_path
+        self.spool_dir = spool_dir
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.max_attempts = max(1, max_attempts)
+        self.retention = retention
+        self.lease_timeout = max(1.0, lease_timeout)
+        self.last_purge = 0.0
+        self.last_lease_check = 0.0
+        self.connection = None
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.workers: List[asyncio.Task] = []
+        self.wakeup: Optional[asyncio.Event] = None
+
+        self._initialize_db()
+
+    def _initialize_db(self):
+        """Create the jobs table if needed"""
+        try:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            os.makedirs(self.spool_dir, exist_ok=True)
+
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    lane TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    description TEXT,
+                    spool_path TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    worker_pid INTEGER,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    stage_timings TEXT,
+                    result TEXT,
+                    error TEXT,
+                    tenant TEXT,
+                    lease_expires_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_pending ON jobs (status, priority, created_at);
+                CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at);
+                """
+            )
+            # Queues created before tenant partitioning only hold default-partition jobs
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(jobs)")]
+            if "tenant" not in columns:
+                self.connection.execute("ALTER TABLE jobs ADD COLUMN tenant TEXT")
+            # Jobs claimed before leases existed have none and count as expired
+            if "lease_expires_at" not in columns:
+                self.connection.execute("ALTER TABLE jobs ADD COLUMN lease_expires_at REAL")
+            self.connection.commit()
+            logger.info(f"Job queue initialized at: {self.db_path}")
+        except Exception as e:
+            logger.error(f"Failed to initialize job queue: {str(e)}")
+            raise
+
+    async def _run(self, func, *args):
+        """Run a synchronous queue operation on the executor"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        for key in ("stage_timings", "result"):
+            job[key] = json.loads(job[key]) if job[key] else None
+        return job
+
+    def _insert_sync(self, job: Dict[str, Any]):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO jobs (job_id, lane, priority, status, filename, description, spool_path, created_at, tenant) "
+                "VALUES (:job_id, :lane, :priority, 'queued', :filename, :description, :spool_path, :created_at, :tenant)",
+                job
+            )
+
+    async def enqueue(self, filename: str, content: bytes, description: Optional[str] = None,
+                      lane: str = "interactive", tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Spool an upload and queue it for processing
+
+        Args:
+            filename: Original filename
+            content: Uploaded bytes
+            description: Optional description of the image
+            lane: "interactive" or "bulk"
+            tenant: Tenant partition the upload is indexed into
+
+        Returns:
+            Dictionary with the job ID, or an error
+        """
+        if lane not in self.LANES:
+            return {"success": False, "error": f"Unknown lane: {lane}"}
+        try:
+            job_id = str(uuid.uuid4())
+            spool_path = os.path.join(self.spool_dir, job_id)
+
+            # Bytes are on disk before the job row exists, so a queued job always has its input
+            write_result = await FileUtils.write_file(spool_path, content)
+            if not write_result["success"]:
+                return {"success": False, "error": write_result["error"]}
+
+            await self._run(self._insert_sync, {
+                "job_id": job_id,
+                "lane": lane,
+                "priority": self.LANES[lane],
+                "filename": filename,
+                "description": description,
+                "spool_path": spool_path,
+                "created_at": time.time(),
+                "tenant": tenant
+            })
+            if self.wakeup is not None:
+                self.wakeup.set()
+
+            return {"success": True, "job_id": job_id, "status": "queued", "lane": lane}
+        except Exception as e:
+            logger.error(f"Error enqueuing job: {str(e)}")
+            return {"success": False, "error": str(e)}
+
+    def _claim_sync(self) -> Optional[Dict[str, Any]]:
+        """Atomically mark the next queued job as running"""
+        with self.lock:
+            self.connection.row_factory = sqlite3.Row
+            try:
+                # IMMEDIATE takes the write lock up front so two processes cannot claim the same job
+                self.connection.execute("BEGIN IMMEDIATE")
+                row = self.connection.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' ORDER BY priority, created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self.connection.commit()
+                    return None
+
+                started_at = time.time()
+                self.connection.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, worker_pid = ?, attempts = attempts + 1, "
+                    "lease_expires_at = ? WHERE job_id = ?",
+                    (started_at, os.getpid(), started_at + self.lease_timeout, row["job_id"])
+                )
+                self.connection.commit()
+            except Exception:
+                self.connection.rollback()
+                raise
+            finally:
+                self.connection.row_factory = None
+
+        job = self._to_job(row)
+        job.update(status="running", started_at=started_at, attempts=job["attempts"] + 1)
+        return job
+
+    def _renew_lease_sync(self, job_id: str, attempt: int) -> bool:
+        """Extend the lease of a running job; False if the claim was lost to a requeue"""
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE job_id = ? AND status = 'running' AND attempts = ?",
+                (time.time() + self.lease_timeout, job_id, attempt)
+            )
+        return cursor.rowcount > 0
+
+    def _finish_sync(self, job_id: str, attempt: int, status: str, stage_timings: Dict[str, float],
+                     result: Optional[Dict[str, Any]], error: Optional[str]) -> bool:
+        """Record a job's outcome; False if its lease expired and the job was requeued meanwhile"""
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, stage_timings = ?, result = ?, error = ?, "
+                "lease_expires_at = NULL WHERE job_id = ? AND status = 'running' AND attempts = ?",
+                (
+                    status,
+                    time.time(),
+                    json.dumps(stage_timings),
+                    json.dumps(result, default=str) if result is not None else None,
+                    error,
+                    job_id,
+                    attempt
+                )
+            )
+        return cursor.rowcount > 0
+
+    def _get_sync(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            self.connection.row_factory = sqlite3.Row
+            try:
+                row = self.connection.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            finally:
+                self.connection.row_factory = None
+        return self._to_job(row) if row else None
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get one job, or None"""
+        return await self._run(self._get_sync, job_id)
+
+    def _recover_sync(self) -> Dict[str, int]:
+        """Requeue running jobs whose lease expired, or fail them once out of attempts"""
+        with self.lock, self.connection:
+            stale = self.connection.execute(
+                "SELECT job_id, attempts, spool_path FROM jobs "
+                "WHERE status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?)",
+                (time.time(),)
+            ).fetchall()
+            requeued = [(job_id,) for job_id, attempts, _ in stale if attempts < self.max_attempts]
+            exhausted = [(job_id, spool_path) for job_id, attempts, spool_path in stale if attempts >= self.max_attempts]
+            self.connection.executemany(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, worker_pid = NULL, lease_expires_at = NULL "
+                "WHERE job_id = ?",
+                requeued
+            )
+            self.connection.executemany(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, worker_pid = NULL, lease_expires_at = NULL, "
+                "error = ? WHERE job_id = ?",
+                [
+                    (time.time(), f"Worker stopped while processing the job {self.max_attempts} times; not retried", job_id)
+                    for job_id, _ in exhausted
+                ]
+            )
+        for _, spool_path in exhausted:
+            try:
+                os.remove(spool_path)
+            except OSError:
+                pass
+        return {"requeued": len(requeued), "failed": len(exhausted)}
+
+    def _purge_sync(self, cutoff: float) -> int:
+        """Delete completed and failed jobs that finished before cutoff"""
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "DELETE FROM jobs WHERE status IN ('completed', 'failed') AND finished_at < ?", (cutoff,)
+            )
+        return cursor.rowcount
+
+    async def _purge_finished(self):
+        """Purge expired finished jobs at most once per PURGE_INTERVAL"""
+        now = time.time()
+        if self.retention <= 0 or now - self.last_purge < self.PURGE_INTERVAL:
+            return
+        self.last_purge = now
+        try:
+            purged = await self._run(self._purge_sync, now - self.retention)
+            if purged:
+                logger.info(f"Purged {purged} finished jobs older than {self.retention}s")
+        except Exception as e:
+            logger.error(f"Error purging finished jobs: {str(e)}")
+
+    async def _recover_expired(self, force: bool = False):
+        """Requeue jobs with expired leases at most once per half lease timeout"""
+        now = time.time()
+        if not force and now - self.last_lease_check < self.lease_timeout / 2:
+            return
+        self.last_lease_check = now
+        try:
+            recovered = await self._run(self._recover_sync)
+            if recovered["requeued"]:
+                logger.info(f"Requeued {recovered['requeued']} jobs whose worker stopped renewing its lease")
+            if recovered["failed"]:
+                logger.warning(f"Failed {recovered['failed']} abandoned jobs that ran out of attempts")
+        except Exception as e:
+            logger.error(f"Error requeuing abandoned jobs: {str(e)}")
+
+    async def _keep_lease(self, job: Dict[str, Any]):
+        """Renew a running job's lease until cancelled"""
+        while True:
+            await asyncio.sleep(self.lease_timeout / 4)
+            try:
+                if not await self._run(self._renew_lease_sync, job["job_id"], job["attempts"]):
+                    logger.warning(f"Job {job['job_id']} lost its lease and was requeued")
+                    return
+            except Exception as e:
+                logger.error(f"Error renewing lease of job {job['job_id']}: {str(e)}")
+
+    async def start(self, handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]):
+        """
+        Recover abandoned jobs and start the workers
+
+        Args:
+            handler: Coroutine that processes a job and returns a dictionary
+                with "success", "stage_timings", "result" and "error"
+        """
+        if self.workers:
+            return
+        await self._recover_expired(force=True)
+        await self._purge_finished()
+
+        self.wakeup = asyncio.Event()
+        self.workers = [asyncio.create_task(self._worker_loop(handler)) for _ in range(self.concurrency)]
+        logger.info(f"Job queue started with {self.concurrency} workers")
+
+    async def stop(self):
+        """Cancel the workers; their running jobs are requeued once their leases expire"""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    async def _worker_loop(self, handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]):
+        """Claim and process jobs until cancelled"""
+        while True:
+            try:
+                job = await self._run(self._claim_sync)
+            except Exception as e:
+                logger.error(f"Error claiming job: {str(e)}")
+                job = None
+
+            if job is None:
+                await self._recover_expired()
+                await self._purge_finished()
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            stage_timings = {"queue_wait": job["started_at"] - job["created_at"]}
+            lease = asyncio.create_task(self._keep_lease(job))
+            try:
+                outcome = await handler(job)
+                stage_timings.update(outcome.get("stage_timings", {}))
+                status = "completed" if outcome.get("success") else "failed"
+                finished = await self._run(self._finish_sync, job["job_id"], job["attempts"], status,
+                                           stage_timings, outcome.get("result"), outcome.get("error"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job {job['job_id']} failed: {str(e)}")
+                finished = await self._run(self._finish_sync, job["job_id"], job["attempts"], "failed",
+                                           stage_timings, None, str(e))
+            finally:
+                lease.cancel()
+
+            # A requeued job's input is still needed by whichever worker claimed it next
+            if not finished:
+                logger.warning(f"Job {job['job_id']} was requeued while running; its outcome was discarded")
+                continue
+            try:
+                os.remove(job["spool_path"])
+            except OSError:
+                pass
+
+    def _stats_sync(self) -> Dict[str, Dict[str, int]]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT lane, status, COUNT(*) FROM jobs GROUP BY lane, status"
+            ).fetchall()
+        stats = {lane: {status: 0 for status in self.STATUSES} for lane in self.LANES}
+        for lane, status, count in rows:
+            stats.setdefault(lane, {})[status] = count
+        return stats
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Job counts per lane and status"""
+        return {
+            "workers": len(self.workers),
+            "lanes": await self._run(self._stats_sync)
+        }
+
+    def __del__(self):
+        """Cleanup when service is destroyed"""
+        try:
+            if hasattr(self, 'executor'):
+                self.executor.shutdown(wait=True)
+            if getattr(self, 'connection', None) is not None:
+                self.connection.close()
+        except:
+            pass
@@ -0,0 +1,289 @@
+import sqlite3
+from typing import List, Dict, Any, Optional
+import logging
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import re
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.utils import TextUtils, ValidationUtils
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class LexicalIndexService:
+    """
+    BM25 keyword index over cleaned OCR text chunks
+
+    Backed by SQLite FTS5 inverted indexes, which are updated per row on
+    add/delete, persisted, and shared by all workers using the same file.
+    Rows mirror vector DB chunks and are keyed by the same vector IDs.
+    Each tenant partition has its own FTS table, like its own Chroma
+    collection: bm25() takes document counts and lengths from the whole
+    table, so a shared table would rank one course's chunks by term
+    statistics of every other course. The default partition ('') uses
+    chunks_fts; chunk_rows maps every row to its vector, image and tenant.
+    """
+
+    FTS_TABLE = "chunks_fts"
+    TENANT_SEPARATOR = "__"
+    # PRAGMA user_version once tenant rows have been moved out of the shared FTS table
+    SCHEMA_VERSION = 1
+
+    def __init__(self, db_path: str = "cache/lexical_index.db"):
+        """
+        Initialize lexical index
+
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        self.db_path = db_path
+        self.connection = None
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        # FTS tables known to exist; other workers may create more
+        self.fts_tables = set()
+
+        self._initialize_db()
+
+    def _initialize_db(self):
+        """Create the FTS table and its row mapping if needed"""
+        try:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS chunk_rows (
+                    rowid INTEGER PRIMARY KEY,
+                    vector_id TEXT NOT NULL UNIQUE,
+                    image_id TEXT NOT NULL,
+                    tenant TEXT NOT NULL DEFAULT ''
+                );
+                CREATE INDEX IF NOT EXISTS idx_chunk_rows_image ON chunk_rows (image_id);
+                """
+            )
+            self._create_fts_table(self.FTS_TABLE)
+            # Indexes created before tenant partitioning hold default-partition rows only
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(chunk_rows)")]
+            if "tenant" not in columns:
+                self.connection.execute("ALTER TABLE chunk_rows ADD COLUMN tenant TEXT NOT NULL DEFAULT ''")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_chunk_rows_tenant ON chunk_rows (tenant)")
+            self.connection.commit()
+            with self.connection:
+                self._split_tenant_rows()
+            logger.info(f"Lexical index initialized at: {self.db_path}")
+        except Exception as e:
+            logger.error(f"Failed to initialize lexical index: {str(e)}")
+            raise
+
+    @classmethod
+    def fts_table(cls, tenant: str) -> str:
+        """
+        Quoted name of a tenant's FTS table
+
+        Raises:
+            ValueError: If the tenant name is not a valid partition name
+        """
+        if not tenant:
+            return cls.FTS_TABLE
+        validation_result = ValidationUtils.validate_tenant(tenant)
+        if not validation_result["is_valid"]:
+            raise ValueError("; ".join(validation_result["errors"]))
+        return f'"{cls.FTS_TABLE}{cls.TENANT_SEPARATOR}{tenant}"'
+
+    def _create_fts_table(self, table: str):
+        self.connection.execute(
+            f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+                text,
+                tokenize = "unicode61 remove_diacritics 0 tokenchars '-_'"
+            )
+            """
+        )
+        self.fts_tables.add(table)
+
+    def _has_fts_table(self, table: str) -> bool:
+        if table not in self.fts_tables:
+            name = table.strip('"')
+            if self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ? COLLATE NOCASE", (name,)
+            ).fetchone() is None:
+                return False
+            self.fts_tables.add(table)
+        return True
+
+    def _split_tenant_rows(self):
+        """Move tenant rows of an index that kept every tenant in chunks_fts into their own tables"""
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] >= self.SCHEMA_VERSION:
+            return
+        tenants = [row[0] for row in self.connection.execute("SELECT DISTINCT tenant FROM chunk_rows WHERE tenant != ''")]
+        for tenant in tenants:
+            table = self.fts_table(tenant)
+            self._create_fts_table(table)
+            self.connection.execute(
+                f"""
+                INSERT INTO {table} (rowid, text)
+                SELECT rowid, text FROM {self.FTS_TABLE}
+                WHERE rowid IN (SELECT rowid FROM chunk_rows WHERE tenant = ?)
+                """,
+                (tenant,)
+            )
+            self.connection.execute(
+                f"DELETE FROM {self.FTS_TABLE} WHERE rowid IN (SELECT rowid FROM chunk_rows WHERE tenant = ?)",
+                (tenant,)
+            )
+        if tenants:
+            logger.info(f"Moved keyword index rows of {len(tenants)} tenants into per-tenant tables")
+        self.connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    @staticmethod
+    def build_match_query(query: str) -> str:
+        """Turn free text into an FTS5 OR-query of quoted terms"""
+        # Clean like indexed OCR text so codes such as "CS101" match their stored form
+        terms = re.findall(r"[\w\-]+", TextUtils.clean_ocr_text(query).lower())
+        return " OR ".join('"' + term.replace('"', '') + '"' for term in dict.fromkeys(terms))
+
+    def _delete_images_locked(self, image_ids: List[str]):
+        placeholders = ",".join("?" * len(image_ids))
+        rows = self.connection.execute(
+            f"SELECT rowid, tenant FROM chunk_rows WHERE image_id IN ({placeholders})", image_ids
+        ).fetchall()
+        by_table: Dict[str, List[tuple]] = {}
+        for rowid, tenant in rows:
+            by_table.setdefault(self.fts_table(tenant), []).append((rowid,))
+        for table, rowids in by_table.items():
+            self.connection.executemany(f"DELETE FROM {table} WHERE rowid = ?", rowids)
+            self.connection.executemany("DELETE FROM chunk_rows WHERE rowid = ?", rowids)
+        return len(rows)
+
+    def _add_chunks_sync(self, vector_ids: List[str], image_ids: List[str], texts: List[str], tenant: str) -> int:
+        table = self.fts_table(tenant)
+        with self.lock, self.connection:
+            if not self._has_fts_table(table):
+                self._create_fts_table(table)
+            # Re-indexing an image replaces its previous chunks
+            self._delete_images_locked(list(dict.fromkeys(image_ids)))
+            for vector_id, image_id, text in zip(vector_ids, image_ids, texts):
+                cursor = self.connection.execute(
+                    "INSERT INTO chunk_rows (vector_id, image_id, tenant) VALUES (?, ?, ?)",
+                    (vector_id, image_id, tenant)
+                )
+                self.connection.execute(
+                    f"INSERT INTO {table} (rowid, text) VALUES (?, ?)", (cursor.lastrowid, text)
+                )
+        return len(vector_ids)
+
+    async def add_chunks(self, vector_ids: List[str], image_ids: List[str], texts: List[str],
+                         tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Index chunk texts
+
+        Args:
+            vector_ids: Vector DB IDs of the chunks
+            image_ids: Image ID of each chunk
+            texts: Cleaned OCR text of each chunk
+            tenant: Tenant partition of the chunks (default partition if None)
+
+        Returns:
+            Dictionary with operation results
+        """
+        try:
+            loop = asyncio.get_event_loop()
+            added = await loop.run_in_executor(
+                self.executor, self._add_chunks_sync, vector_ids, image_ids, texts, tenant or ""
+            )
+            return {"success": True, "added_count": added}
+        except Exception as e:
+            logger.error(f"Error adding to lexical index: {str(e)}")
+            return {"success": False, "error": str(e), "added_count": 0}
+
+    def _delete_images_sync(self, image_ids: List[str]) -> int:
+        with self.lock, self.connection:
+            deleted = self._delete_images_locked(image_ids)
+        return deleted
+
+    async def delete_images(self, image_ids: List[str]) -> Dict[str, Any]:
+        """
+        Remove every chunk of the given images
+
+        Args:
+            image_ids: Image IDs to remove
+
+        Returns:
+            Dictionary with operation results
+        """
+        if not image_ids:
+            return {"success": True, "deleted_count": 0}
+        try:
+            loop = asyncio.get_event_loop()
+            deleted = await loop.run_in_executor(self.executor, self._delete_images_sync, image_ids)
+            return {"success": True, "deleted_count": deleted}
+        except Exception as e:
+            logger.error(f"Error deleting from lexical index: {str(e)}")
+            return {"success": False, "error": str(e), "deleted_count": 0}
+
+    def _search_sync(self, query: str, n_results: int, tenant: str) -> Dict[str, Any]:
+        match_query = self.build_match_query(query)
+        if not match_query:
+            return {"success": True, "results": [], "total_results": 0}
+
+        table = self.fts_table(tenant)
+        with self.lock:
+            if not self._has_fts_table(table):
+                # A tenant that never indexed anything has no table; reads must not create one
+                return {"success": True, "results": [], "total_results": 0}
+            # Only the tenant's own rows are in the table, so bm25() uses that tenant's statistics
+            rows = self.connection.execute(
+                f"""
+                SELECT chunk_rows.vector_id, chunk_rows.image_id, bm25({table}) AS score
+                FROM {table} JOIN chunk_rows ON chunk_rows.rowid = {table}.rowid
+                WHERE {table} MATCH ?
+                ORDER BY score
+                LIMIT ?
+                """,
+                (match_query, n_results)
+            ).fetchall()
+
+        # FTS5 bm25() is lower-is-better; report the conventional positive score
+        results = [
+            {"id": vector_id, "image_id": image_id, "bm25": -score, "rank": rank + 1}
+            for rank, (vector_id, image_id, score) in enumerate(rows)
+        ]
+        return {"success": True, "results": results, "total_results": len(results)}
+
+    async def search(self, query: str, n_results: int = 10, tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        BM25 keyword search
+
+        Args:
+            query: Search query
+            n_results: Number of chunks to return
+            tenant: Tenant partition to search (default partition if None)
+
+        Returns:
+            Dictionary with ranked chunk results (id, image_id, bm25, rank)
+        """
+        try:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(self.executor, self._search_sync, query, n_results, tenant or "")
+        except Exception as e:
+            logger.error(f"Error searching lexical index: {str(e)}")
+            return {"success": False, "error": str(e), "results": [], "total_results": 0}
+
+    def __del__(self):
+        """Cleanup when service is destroyed"""
+        try:
+            if hasattr(self, 'executor'):
+                self.executor.shutdown(wait=True)
+            if getattr(self, 'connection', None) is not None:
+                self.connection.close()
+        except:
+            pass
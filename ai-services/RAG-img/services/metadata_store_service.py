@@ -0,0 +1,311 @@
+import sqlite3
+import base64
+from typing import List, Dict, Any, Optional, Tuple, Set
+import logging
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import json
+import os
+from datetime import datetime
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class MetadataStoreService:
+    """
+    Persistent image metadata store backed by SQLite in WAL mode
+
+    Every uvicorn worker opens its own connection to the same file; WAL
+    lets readers proceed while another worker writes. Records are stored
+    as JSON next to indexed upload time and content-hash columns.
+
+    A single write-version row is bumped in the same transaction as every
+    put and delete. Because the metadata write comes last when images are
+    stored or deleted, the version tells every worker that the vector DB
+    and keyword index changed, which keys the result cache.
+    """
+
+    BUMP_VERSION = "UPDATE write_version SET version = version + 1 WHERE id = 0"
+
+    def __init__(self, db_path: str = "cache/image_metadata.db"):
+        """
+        Initialize metadata store
+
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        self.db_path = db_path
+        self.connection = None
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=2)
+
+        self._initialize_db()
+
+    def _initialize_db(self):
+        """Create tables and indexes if needed"""
+        try:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS images (
+                    image_id TEXT PRIMARY KEY,
+                    file_hash TEXT,
+                    upload_timestamp TEXT NOT NULL,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_images_upload ON images (upload_timestamp, image_id);
+                CREATE INDEX IF NOT EXISTS idx_images_hash ON images (file_hash);
+                CREATE INDEX IF NOT EXISTS idx_images_file_path ON images (json_extract(data, '$.file_path'));
+                CREATE TABLE IF NOT EXISTS write_version (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    version INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO write_version (id, version) VALUES (0, 0);
+                """
+            )
+            self.connection.commit()
+            logger.info(f"Metadata store initialized at: {self.db_path}")
+        except Exception as e:
+            logger.error(f"Failed to initialize metadata store: {str(e)}")
+            raise
+
+    async def _run(self, func, *args):
+        """Run a synchronous store operation on the executor"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    @staticmethod
+    def _encode_cursor(upload_timestamp: str, image_id: str) -> str:
+        """Opaque keyset cursor"""
+        return base64.urlsafe_b64encode(json.dumps([upload_timestamp, image_id]).encode()).decode()
+
+    @classmethod
+    def _decode_cursor(cls, cursor: str) -> Tuple[str, str]:
+        """
+        Decode a cursor produced by _encode_cursor
+
+        Raises:
+            ValueError: If the cursor was not produced by _encode_cursor
+        """
+        try:
+            decoded = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+            upload_timestamp, image_id = decoded
+            valid = (
+                isinstance(upload_timestamp, str) and isinstance(image_id, str) and image_id
+                # Re-encoding must reproduce it exactly, which rejects edited or re-padded cursors
+                and cls._encode_cursor(upload_timestamp, image_id) == cursor
+            )
+            if valid and upload_timestamp:
+                datetime.fromisoformat(upload_timestamp)
+        except (ValueError, TypeError, UnicodeError):
+            valid = False
+        if not valid:
+            raise ValueError("Invalid cursor")
+        return upload_timestamp, image_id
+
+    @staticmethod
+    def _to_record(image_id: str, data: str) -> Dict[str, Any]:
+        return {"image_id": image_id, **json.loads(data)}
+
+    def _put_many_sync(self, records: Dict[str, Dict[str, Any]]) -> int:
+        """Insert or replace several records in one transaction"""
+        rows = [
+            (
+                image_id,
+                record.get("file_hash"),
+                record.get("upload_timestamp", ""),
+                json.dumps({k: v for k, v in record.items() if k != "image_id"}, default=str)
+            )
+            for image_id, record in records.items()
+        ]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO images (image_id, file_hash, upload_timestamp, data) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self.connection.execute(self.BUMP_VERSION)
+        return len(rows)
+
+    async def put_many(self, records: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Insert or replace image records
+
+        Args:
+            records: Mapping of image ID to metadata
+
+        Returns:
+            Number of records written
+        """
+        if not records:
+            return 0
+        return await self._run(self._put_many_sync, records)
+
+    async def put(self, image_id: str, record: Dict[str, Any]) -> int:
+        """Insert or replace one image record"""
+        return await self.put_many({image_id: record})
+
+    def _get_sync(self, image_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT image_id, data FROM images WHERE image_id = ?", (image_id,)
+            ).fetchone()
+        return self._to_record(*row) if row else None
+
+    async def get(self, image_id: str) -> Optional[Dict[str, Any]]:
+        """Get one image record, or None"""
+        return await self._run(self._get_sync, image_id)
+
+    def _get_many_sync(self, image_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT image_id, data FROM images WHERE image_id IN ({','.join('?' * len(image_ids))})",
+                image_ids
+            ).fetchall()
+        return {image_id: self._to_record(image_id, data) for image_id, data in rows}
+
+    async def get_many(self, image_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get several image records keyed by image ID; missing IDs are left out"""
+        if not image_ids:
+            return {}
+        return await self._run(self._get_many_sync, list(dict.fromkeys(image_ids)))
+
+    def _existing_ids_sync(self, image_ids: List[str]) -> Set[str]:
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT image_id FROM images WHERE image_id IN ({','.join('?' * len(image_ids))})",
+                image_ids
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    async def existing_ids(self, image_ids: List[str]) -> Set[str]:
+        """Subset of the given image IDs that have a record"""
+        if not image_ids:
+            return set()
+        return await self._run(self._existing_ids_sync, list(dict.fromkeys(image_ids)))
+
+    def _referenced_paths_sync(self, file_paths: List[str]) -> Set[str]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT json_extract(data, '$.file_path') FROM images "
+                f"WHERE json_extract(data, '$.file_path') IN ({','.join('?' * len(file_paths))})",
+                file_paths
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    async def referenced_paths(self, file_paths: List[str]) -> Set[str]:
+        """Subset of the given upload paths that some image record points to"""
+        if not file_paths:
+            return set()
+        return await self._run(self._referenced_paths_sync, file_paths)
+
+    def _find_by_hash_sync(self, file_hash: str) -> List[Dict[str, Any]]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT image_id, data FROM images WHERE file_hash = ?", (file_hash,)
+            ).fetchall()
+        return [self._to_record(*row) for row in rows]
+
+    async def find_by_hash(self, file_hash: str) -> List[Dict[str, Any]]:
+        """Get every image record with a given content hash"""
+        return await self._run(self._find_by_hash_sync, file_hash)
+
+    def _list_sync(self, limit: int, cursor: Optional[str]) -> Dict[str, Any]:
+        query = "SELECT image_id, upload_timestamp, data FROM images"
+        params: List[Any] = []
+        if cursor:
+            upload_timestamp, image_id = self._decode_cursor(cursor)
+            query += " WHERE (upload_timestamp, image_id) < (?, ?)"
+            params.extend([upload_timestamp, image_id])
+        query += " ORDER BY upload_timestamp DESC, image_id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self.lock:
+            rows = self.connection.execute(query, params).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = self._encode_cursor(rows[-1][1], rows[-1][0]) if has_more and rows else None
+        return {
+            "images": [self._to_record(image_id, data) for image_id, _, data in rows],
+            "next_cursor": next_cursor
+        }
+
+    async def list(self, limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        List images, newest first, one page at a time
+
+        Args:
+            limit: Page size
+            cursor: Cursor returned with the previous page
+
+        Returns:
+            Dictionary with "images" and "next_cursor" (None on the last page)
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        if cursor:
+            # Checked here so a bad cursor fails before any query runs
+            self._decode_cursor(cursor)
+        return await self._run(self._list_sync, max(1, limit), cursor)
+
+    def _delete_many_sync(self, image_ids: List[str]) -> int:
+        with self.lock, self.connection:
+            cursor = self.connection.executemany(
+                "DELETE FROM images WHERE image_id = ?", [(image_id,) for image_id in image_ids]
+            )
+            deleted = cursor.rowcount
+            self.connection.execute(self.BUMP_VERSION)
+        return deleted
+
+    async def delete_many(self, image_ids: List[str]) -> int:
+        """Delete several image records; returns the number removed"""
+        if not image_ids:
+            return 0
+        return await self._run(self._delete_many_sync, image_ids)
+
+    async def delete(self, image_id: str) -> bool:
+        """Delete one image record"""
+        return await self.delete_many([image_id]) > 0
+
+    def _count_sync(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    async def count(self) -> int:
+        """Total number of stored images"""
+        return await self._run(self._count_sync)
+
+    def _version_sync(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT version FROM write_version WHERE id = 0").fetchone()[0]
+
+    async def version(self) -> int:
+        """Write version shared by every worker using this database"""
+        return await self._run(self._version_sync)
+
+    def _bump_version_sync(self):
+        with self.lock, self.connection:
+            self.connection.execute(self.BUMP_VERSION)
+
+    async def bump_version(self):
+        """Mark a change to indexed data that wrote no metadata, such as removing orphan vectors"""
+        await self._run(self._bump_version_sync)
+
+    def __del__(self):
+        """Cleanup when service is destroyed"""
+        try:
+            if hasattr(self, 'executor'):
+                self.executor.shutdown(wait=True)
+            if getattr(self, 'connection', None) is not None:
+                self.connection.close()
+        except:
+            pass
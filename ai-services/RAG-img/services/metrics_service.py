@@ -0,0 +1,259 @@
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram
+
+    Recording a sample is a binary search and two additions, so it can sit
+    on every request path. Quantiles are estimated from the buckets the way
+    Prometheus' histogram_quantile does, by linear interpolation inside the
+    bucket the rank falls in; with buckets growing by sqrt(2) the estimate
+    is within one bucket of the true value.
+    """
+
+    # 0.1 ms to ~74 s, each bound sqrt(2) times the previous one
+    BUCKETS = tuple(round(0.0001 * 2 ** (k / 2), 7) for k in range(40))
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        # One count per bucket plus the +Inf bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        """Record one duration in seconds"""
+        index = bisect_left(self.buckets, seconds)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def quantile(self, q: float) -> float:
+        """Estimated q-quantile in seconds (0.0 without samples)"""
+        with self.lock:
+            counts = list(self.counts)
+            total = self.count
+        if not total:
+            return 0.0
+
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                if index == len(self.buckets):
+                    # Beyond the last bound only the bound itself is known
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def get_stats(self) -> Dict[str, float]:
+        """Sample count, mean and p50/p95/p99 in seconds"""
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99)
+        }
+
+
+class MetricsService:
+    """
+    Per-stage latency histograms rendered in the Prometheus text format
+
+    Two histogram families are kept: "stage" for the steps of a request
+    (upload save, decode, preprocessing, OCR, embedding, vector add and
+    search, answer generation, ...) and "operation" for whole requests
+    (process_image, answer_question, search_images). Histograms are created
+    on first use. Gauges such as executor queue depth are not stored here;
+    the caller samples them at scrape time and passes them to render.
+
+    Everything is kept per process. Every series carries a "worker" label
+    (the process ID by default), so with several uvicorn workers the
+    series a scrape reaches never look like one counter that jumps and
+    resets; sum over the label to aggregate.
+    """
+
+    FAMILIES = {
+        "stage": ("rag_img_stage_duration_seconds", "Duration of one pipeline stage"),
+        "operation": ("rag_img_operation_duration_seconds", "Duration of one service operation")
+    }
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, worker: Optional[str] = None):
+        """
+        Initialize metrics
+
+        Args:
+            worker: Value of the "worker" label (process ID if None)
+        """
+        self.worker = worker or str(os.getpid())
+        self.histograms: Dict[str, Dict[str, LatencyHistogram]] = {family: {} for family in self.FAMILIES}
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+
+    def _histogram(self, name: str, family: str) -> LatencyHistogram:
+        histograms = self.histograms[family]
+        histogram = histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def observe(self, name: str, seconds: float, family: str = "stage"):
+        """
+        Record one duration
+
+        Args:
+            name: Stage or operation name, used as the metric label
+            seconds: Duration in seconds
+            family: "stage" or "operation"
+        """
+        self._histogram(name, family).observe(seconds)
+
+    def observe_many(self, timings: Dict[str, float], family: str = "stage"):
+        """Record a {name: seconds} mapping, such as the timings of an OCR result"""
+        for name, seconds in timings.items():
+            self.observe(name, seconds, family)
+
+    @contextmanager
+    def timer(self, name: str, family: str = "stage"):
+        """Time the enclosed block, including when it raises"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, family)
+
+    async def track(self, name: str, awaitable, family: str = "stage"):
+        """Await and time an awaitable, e.g. one wrapped in a task to run concurrently"""
+        with self.timer(name, family):
+            return await awaitable
+
+    def get_stats(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Count, mean and p50/p95/p99 per family and name"""
+        return {
+            family: {name: histogram.get_stats() for name, histogram in sorted(histograms.items())}
+            for family, histograms in self.histograms.items()
+        }
+
+    @staticmethod
+    def executor_gauges(executors: Dict[str, Optional[Executor]]) -> List[Dict[str, Any]]:
+        """
+        Sample queue depth and thread counts of thread pool executors
+
+        A queue that keeps growing while every thread is busy marks the
+        stage whose pool is saturated.
+
+        Args:
+            executors: Executors by name; None and non-thread-pool entries are skipped
+
+        Returns:
+            Gauges for render
+        """
+        pools = {name: executor for name, executor in executors.items() if isinstance(executor, ThreadPoolExecutor)}
+        return [
+            {
+                "name": "rag_img_executor_queue_depth",
+                "help": "Tasks submitted to an executor that no thread has started yet",
+                "label": "executor",
+                "values": {name: executor._work_queue.qsize() for name, executor in pools.items()}
+            },
+            {
+                "name": "rag_img_executor_threads",
+                "help": "Threads an executor has started",
+                "label": "executor",
+                "values": {name: len(executor._threads) for name, executor in pools.items()}
+            },
+            {
+                "name": "rag_img_executor_max_workers",
+                "help": "Maximum threads of an executor",
+                "label": "executor",
+                "values": {name: executor._max_workers for name, executor in pools.items()}
+            }
+        ]
+
+    @staticmethod
+    def _labels(**labels: Any) -> str:
+        pairs = ",".join(
+            f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+            for key, value in labels.items()
+        )
+        return "{" + pairs + "}"
+
+    def _series(self, **labels: Any) -> str:
+        """Label set of one series, including this worker"""
+        return self._labels(worker=self.worker, **labels)
+
+    @staticmethod
+    def _number(value: float) -> str:
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(float(value)) if isinstance(value, float) else str(value)
+
+    def render(self, gauges: Optional[List[Dict[str, Any]]] = None) -> str:
+        """
+        Render every histogram and the given gauges in the Prometheus text format (0.0.4)
+
+        Args:
+            gauges: Items with "name", "help", "label" and "values" ({label value: number});
+                without a "label", "values" holds a single number under the key ""
+
+        Returns:
+            Exposition text
+        """
+        lines: List[str] = []
+        for family, (metric, help_text) in self.FAMILIES.items():
+            histograms = sorted(self.histograms[family].items())
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+            for name, histogram in histograms:
+                with histogram.lock:
+                    counts = list(histogram.counts)
+                    total, total_sum = histogram.count, histogram.sum
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (math.inf,), counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{self._series(**{family: name, 'le': self._number(bound)})} {cumulative}")
+                lines.append(f"{metric}_sum{self._series(**{family: name})} {self._number(total_sum)}")
+                lines.append(f"{metric}_count{self._series(**{family: name})} {total}")
+
+            # Precomputed quantiles for dashboards that do not run histogram_quantile
+            quantile_metric = metric.replace("_duration_seconds", "_duration_quantile_seconds")
+            lines += [
+                f"# HELP {quantile_metric} Estimated {family} duration quantile",
+                f"# TYPE {quantile_metric} gauge"
+            ]
+            for name, histogram in histograms:
+                for q in self.QUANTILES:
+                    value = histogram.quantile(q)
+                    lines.append(f"{quantile_metric}{self._series(**{family: name, 'quantile': q})} {self._number(value)}")
+
+        for gauge in gauges or []:
+            lines += [f"# HELP {gauge['name']} {gauge['help']}", f"# TYPE {gauge['name']} gauge"]
+            for label_value, value in gauge["values"].items():
+                labels = self._series(**{gauge["label"]: label_value}) if gauge.get("label") else self._series()
+                lines.append(f"{gauge['name']}{labels} {self._number(value)}")
+
+        lines += [
+            "# HELP rag_img_uptime_seconds Seconds since metrics collection started",
+            "# TYPE rag_img_uptime_seconds gauge",
+            f"rag_img_uptime_seconds{self._series()} {self._number(time.time() - self.started_at)}"
+        ]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,178 @@
+import numpy as np
+from typing import List, Dict, Any, Callable, Optional, Tuple
+import logging
+import asyncio
+from concurrent.futures import Executor
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent encode requests into single model forward passes
+
+    Requests are collected for up to max_wait_ms or until max_batch_size
+    texts are queued, sorted by length so similarly sized texts share a
+    padded batch, encoded in one call, and split back into each caller's
+    future.
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str], bool], np.ndarray], executor: Executor,
+                 max_wait_ms: float = 5.0, max_batch_size: int = 32):
+        """
+        Initialize micro-batcher
+
+        Args:
+            encode_fn: Synchronous function (texts, normalize) -> embedding matrix
+            executor: Executor that runs encode_fn
+            max_wait_ms: Maximum time to wait for more requests after the first
+            max_batch_size: Maximum number of texts per forward pass
+        """
+        self.encode_fn = encode_fn
+        self.executor = executor
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+        # Request that did not fit into the previous batch
+        self.carry: Optional[Tuple[List[str], bool, asyncio.Future]] = None
+
+        self.total_requests = 0
+        self.total_texts = 0
+        self.total_batches = 0
+
+    def _ensure_worker(self):
+        """Start the batching loop on the running event loop"""
+        if self.worker is None or self.worker.done():
+            if self.queue is not None:
+                # Requests left on the old queue would otherwise never be answered
+                self._fail_pending(RuntimeError("Embedding micro-batcher restarted"))
+            self.queue = asyncio.Queue()
+            self.worker = asyncio.get_event_loop().create_task(self._run())
+
+    async def submit(self, texts: List[str], normalize: bool = True) -> np.ndarray:
+        """
+        Queue texts for the next batch and wait for their embeddings
+
+        Args:
+            texts: Texts to encode
+            normalize: Whether to normalize embeddings
+
+        Returns:
+            Embedding matrix with one row per text
+        """
+        self._ensure_worker()
+        future = asyncio.get_event_loop().create_future()
+        await self.queue.put((texts, normalize, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[List[str], bool, asyncio.Future]]:
+        """Wait for one request, then gather more until the deadline or size limit"""
+        if self.carry is not None:
+            requests = [self.carry]
+            self.carry = None
+        else:
+            requests = [await self.queue.get()]
+        queued_texts = len(requests[0][0])
+        deadline = time.monotonic() + self.max_wait
+
+        while queued_texts < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self.queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if queued_texts + len(request[0]) > self.max_batch_size:
+                # Held for the next batch so no forward pass exceeds max_batch_size
+                self.carry = request
+                break
+            requests.append(request)
+            queued_texts += len(request[0])
+
+        return requests
+
+    async def _run(self):
+        """Batching loop; if it stops, every request it holds or has queued is failed"""
+        loop = asyncio.get_event_loop()
+        requests = []
+        try:
+            while True:
+                requests = await self._collect()
+
+                # One forward pass per normalize flag
+                for normalize in (True, False):
+                    group = [request for request in requests if request[1] == normalize]
+                    if group:
+                        await self._encode_group(loop, group, normalize)
+                requests = []
+        except BaseException as e:
+            error = e if isinstance(e, Exception) else RuntimeError("Embedding micro-batcher stopped")
+            if isinstance(e, Exception):
+                logger.error(f"Embedding micro-batcher failed: {str(e)}")
+            self._fail_requests(requests, error)
+            self._fail_pending(error)
+            raise
+
+    @staticmethod
+    def _fail_requests(requests: List[Tuple[List[str], bool, asyncio.Future]], error: Exception):
+        for _, _, future in requests:
+            if not future.done():
+                try:
+                    future.set_exception(error)
+                except RuntimeError:
+                    # The future's event loop is already closed
+                    pass
+
+    def _fail_pending(self, error: Exception):
+        """Fail the held-over request and everything still on the queue"""
+        pending = [self.carry] if self.carry is not None else []
+        self.carry = None
+        while self.queue is not None and not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        self._fail_requests(pending, error)
+
+    async def _encode_group(self, loop, group: List[Tuple[List[str], bool, asyncio.Future]], normalize: bool):
+        """Encode a group of requests in one call and resolve their futures"""
+        texts = [text for request_texts, _, _ in group for text in request_texts]
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+
+        try:
+            sorted_embeddings = await loop.run_in_executor(
+                self.executor,
+                self.encode_fn,
+                [texts[i] for i in order],
+                normalize
+            )
+            embeddings = np.empty_like(sorted_embeddings)
+            embeddings[order] = sorted_embeddings
+        except Exception as e:
+            logger.error(f"Error in micro-batch encoding: {str(e)}")
+            for _, _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.total_requests += len(group)
+        self.total_texts += len(texts)
+        self.total_batches += 1
+
+        offset = 0
+        for request_texts, _, future in group:
+            if not future.done():
+                future.set_result(embeddings[offset:offset + len(request_texts)])
+            offset += len(request_texts)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get batching statistics"""
+        return {
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_batch_size": self.max_batch_size,
+            "total_requests": self.total_requests,
+            "total_batches": self.total_batches,
+            "avg_requests_per_batch": self.total_requests / self.total_batches if self.total_batches else 0.0,
+            "avg_texts_per_batch": self.total_texts / self.total_batches if self.total_batches else 0.0
+        }
@@ -1,7 +1,7 @@
-import easyocr
 import cv2
 import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+from collections import Counter
 import logging
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
@@ -11,6 +11,7 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils.utils import ImageUtils, TextUtils
+from services.ocr_worker_pool import OCRWorkerPool
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -19,31 +20,218 @@ logger = logging.getLogger(__name__)
 class OCRService:
     """Service for Optical Character Recognition using EasyOCR"""
     
-    def __init__(self, languages: List[str] = ['vi', 'en'], gpu: bool = False):
+    def __init__(self, languages: List[str] = ['vi', 'en'], gpu: bool = False,
+                 worker_processes: int = 0, max_queue_depth: int = 32,
+                 tile_size: int = 0, tile_overlap: int = 200, tile_threshold: int = 2400,
+                 tile_workers: int = 4, cascade: bool = True, cascade_fast_size: int = 1280,
+                 cascade_min_confidence: float = 0.6, cascade_min_density: float = 20.0):
+        """
+        Initialize OCR service
+        
+        Args:
+            languages: Languages to recognize
+            gpu: Whether to use GPU
+            worker_processes: Number of OCR worker processes; 0 runs EasyOCR in-process
+            max_queue_depth: Maximum in-flight images in worker-pool mode
+            tile_size: Tile edge in pixels for large images; 0 disables tiling
+            tile_overlap: Overlap between neighbouring tiles in pixels
+            tile_threshold: Images whose longer side exceeds this are tiled
+            tile_workers: Number of tiles recognized in parallel
+            cascade: Try cheap OCR passes first and escalate only when they look poor
+            cascade_fast_size: Longer side of the downscaled first pass
+            cascade_min_confidence: Mean confidence a pass needs to be accepted
+            cascade_min_density: Recognized characters per megapixel a pass needs to be accepted
+        """
         self.languages = languages
         self.gpu = gpu
         self.reader = None
-        self.executor = ThreadPoolExecutor(max_workers=2)
-        self._initialize_reader()
+        self.worker_pool = None
+        self.worker_processes = worker_processes
+        self.tile_size = tile_size
+        self.tile_overlap = min(tile_overlap, tile_size // 2)
+        self.tile_threshold = max(tile_threshold, tile_size)
+        self.cascade = cascade
+        self.cascade_fast_size = cascade_fast_size
+        self.cascade_min_confidence = cascade_min_confidence
+        self.cascade_min_density = cascade_min_density
+        self.tier_counts = Counter()
+        self.load_timings: Dict[str, float] = {}
+        # Separate executor: tiles are submitted from inside self.executor threads
+        self.tile_executor = ThreadPoolExecutor(max_workers=tile_workers) if tile_size > 0 else None
+        # In pool mode threads only preprocess and wait on workers, so allow one per in-flight image
+        self.executor = ThreadPoolExecutor(max_workers=max(2, worker_processes * 2))
+        
+        if worker_processes > 0:
+            start_time = time.time()
+            self.worker_pool = OCRWorkerPool(
+                languages=languages,
+                gpu=gpu,
+                num_workers=worker_processes,
+                max_queue_depth=max_queue_depth
+            )
+            self.load_timings = {"import": 0.0, "load": time.time() - start_time}
+        else:
+            self._initialize_reader()
     
     def _initialize_reader(self):
         """Initialize EasyOCR reader"""
         try:
             logger.info(f"Initializing EasyOCR reader for languages: {self.languages}")
+            start_time = time.time()
+            # Imported lazily: torch dominates cold start, and pool mode never needs it here
+            import easyocr
+            self.load_timings["import"] = time.time() - start_time
             self.reader = easyocr.Reader(self.languages, gpu=self.gpu)
-            logger.info("EasyOCR reader initialized successfully")
+            self.load_timings["load"] = time.time() - start_time - self.load_timings["import"]
+            logger.info(
+                f"EasyOCR reader initialized successfully "
+                f"(import {self.load_timings['import']:.2f}s, load {self.load_timings['load']:.2f}s)"
+            )
         except Exception as e:
             logger.error(f"Failed to initialize EasyOCR reader: {str(e)}")
             raise
     
-    def _preprocess_image(self, image_path: str) -> np.ndarray:
+    def _preprocess_image(self, image: np.ndarray) -> np.ndarray:
         """Preprocess image for better OCR results"""
         try:
-            processed_image = ImageUtils.preprocess_image_for_ocr(image_path)
+            processed_image = ImageUtils.preprocess_image_for_ocr(image)
             return processed_image
         except Exception as e:
             logger.error(f"Error preprocessing image: {str(e)}")
-            return cv2.imread(image_path)
+            return image
+    
+    # Cascade tiers, cheapest first
+    TIERS = ("fast", "full", "preprocessed")
+    
+    def _recognize(self, image: np.ndarray, detail: int, start_time: float) -> Dict[str, Any]:
+        """OCR an already decoded image, through the cascade when enabled"""
+        if self.cascade and detail == 1:
+            result = self._recognize_cascade(image)
+        else:
+            result = self._recognize_tier(image, detail, preprocess=True)
+            result["ocr_tier"] = "preprocessed"
+            result["ocr_tiers_tried"] = ["preprocessed"]
+        
+        self.tier_counts[result["ocr_tier"]] += 1
+        result["processing_time"] = time.time() - start_time
+        return result
+    
+    def _recognize_cascade(self, image: np.ndarray) -> Dict[str, Any]:
+        """
+        Escalating OCR: downscaled raw pass, native-resolution raw pass,
+        then native resolution with the full preprocessing chain
+        
+        A pass is accepted as soon as both its mean confidence and its text
+        density (characters per megapixel of the input) clear the configured
+        thresholds. If none does, the pass with the highest total confidence
+        is returned.
+        
+        Args:
+            image: Decoded BGR image
+            
+        Returns:
+            OCR result of the accepted pass, with "ocr_tier" and "ocr_tiers_tried"
+        """
+        height, width = image.shape[:2]
+        megapixels = max(height * width / 1e6, 1e-6)
+        
+        tiers = []
+        resize_start = time.time()
+        fast_image = ImageUtils.resize_array_if_needed(image, self.cascade_fast_size)
+        timings = {"preprocess": time.time() - resize_start, "ocr": 0.0}
+        if fast_image.shape[:2] != image.shape[:2]:
+            tiers.append(("fast", fast_image, False))
+        tiers.append(("full", image, False))
+        tiers.append(("preprocessed", image, True))
+        
+        best = None
+        tried = []
+        for name, tier_image, preprocess in tiers:
+            result = self._recognize_tier(tier_image, 1, preprocess, scale=tier_image.shape[1] / width)
+            for stage, seconds in result["timings"].items():
+                timings[stage] += seconds
+            density = len(result["extracted_text"].replace(" ", "")) / megapixels
+            result.update({"ocr_tier": name, "text_density": density})
+            tried.append(name)
+            
+            accepted = result["confidence"] >= self.cascade_min_confidence and density >= self.cascade_min_density
+            if accepted or best is None or self._tier_score(result) > self._tier_score(best):
+                best = result
+            if accepted:
+                break
+        
+        best["ocr_tiers_tried"] = tried
+        # Every pass tried counts towards the time spent, not only the accepted one
+        best["timings"] = timings
+        return best
+    
+    @staticmethod
+    def _tier_score(result: Dict[str, Any]) -> float:
+        """Total block confidence, rewarding both more text and surer text"""
+        return result["confidence"] * result["total_blocks"]
+    
+    def _recognize_tier(self, image: np.ndarray, detail: int, preprocess: bool,
+                        scale: float = 1.0) -> Dict[str, Any]:
+        """
+        Run one OCR pass
+        
+        Args:
+            image: Decoded image for this pass
+            detail: EasyOCR detail level
+            preprocess: Whether to apply the grayscale/threshold/morphology chain
+            scale: Size of this image relative to the caller's; boxes are mapped back by 1/scale
+            
+        Returns:
+            OCR result dictionary (without processing_time), with "timings" of preprocessing and recognition
+        """
+        stage_start = time.time()
+        processed_image = self._preprocess_image(image) if preprocess else image
+        preprocess_time = time.time() - stage_start
+        tile_count = 1
+        if self._should_tile(processed_image):
+            results, tile_count = self._readtext_tiled(processed_image)
+            if detail == 0:
+                results = [text for _, text, _ in results]
+        else:
+            results = self._readtext(processed_image, detail)
+        ocr_time = time.time() - stage_start - preprocess_time
+        
+        extracted_text = ""
+        text_blocks = []
+        confidence_scores = []
+        
+        for result in results:
+            if detail == 0:
+                text = result
+                extracted_text += text + " "
+            else:
+                bbox, text, confidence = result
+                cleaned_text = TextUtils.clean_ocr_text(text)
+                if cleaned_text:
+                    if scale != 1.0:
+                        bbox = [[float(px) / scale, float(py) / scale] for px, py in bbox]
+                    extracted_text += cleaned_text + " "
+                    text_blocks.append({
+                        "text": cleaned_text,
+                        "bbox": bbox,
+                        "confidence": confidence
+                    })
+                    confidence_scores.append(confidence)
+        
+        extracted_text = TextUtils.clean_ocr_text(extracted_text)
+        avg_confidence = sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0.0
+        detected_language = self._detect_language(extracted_text)
+        
+        return {
+            "success": True,
+            "extracted_text": extracted_text,
+            "text_blocks": text_blocks,
+            "confidence": avg_confidence,
+            "detected_language": detected_language,
+            "total_blocks": len(text_blocks),
+            "tiles": tile_count,
+            "timings": {"preprocess": preprocess_time, "ocr": ocr_time}
+        }
     
     def _extract_text_sync(self, image_path: str, detail: int = 0) -> Dict[str, Any]:
         """Synchronous text extraction from image"""
@@ -53,46 +241,74 @@ class OCRService:
             if not ImageUtils.validate_image_format(image_path):
                 raise ValueError(f"Unsupported image format: {image_path}")
             
-            processed_image = self._preprocess_image(image_path)
-            results = self.reader.readtext(processed_image, detail=detail)
-            
-            extracted_text = ""
-            text_blocks = []
-            confidence_scores = []
-            
-            for result in results:
-                if detail == 0:
-                    text = result
-                    extracted_text += text + " "
-                else:
-                    bbox, text, confidence = result
-                    cleaned_text = TextUtils.clean_ocr_text(text)
-                    if cleaned_text:
-                        extracted_text += cleaned_text + " "
-                        text_blocks.append({
-                            "text": cleaned_text,
-                            "bbox": bbox,
-                            "confidence": confidence
-                        })
-                        confidence_scores.append(confidence)
-            
-            extracted_text = TextUtils.clean_ocr_text(extracted_text)
-            avg_confidence = sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0.0
-            detected_language = self._detect_language(extracted_text)
-            processing_time = time.time() - start_time
+            image = cv2.imread(image_path)
+            if image is None:
+                raise ValueError(f"Could not read image: {image_path}")
+            
+            return self._recognize(image, detail, start_time)
             
+        except Exception as e:
+            logger.error(f"Error extracting text from {image_path}: {str(e)}")
             return {
-                "success": True,
-                "extracted_text": extracted_text,
-                "text_blocks": text_blocks,
-                "confidence": avg_confidence,
-                "detected_language": detected_language,
-                "processing_time": processing_time,
-                "total_blocks": len(text_blocks)
+                "success": False,
+                "error": str(e),
+                "extracted_text": "",
+                "confidence": 0.0,
+                "processing_time": 0.0
             }
+    
+    def _extract_text_from_bytes_sync(self, content: bytes, detail: int = 1,
+                                      max_size: Optional[int] = None) -> Dict[str, Any]:
+        """Synchronous text extraction from encoded image bytes, decoding exactly once"""
+        try:
+            start_time = time.time()
+            
+            image = ImageUtils.decode_image(content)
+            if image is None:
+                raise ValueError("Could not decode image")
+            decode_time = time.time() - start_time
+            
+            result = self._extract_text_from_array_sync(image, detail, max_size, start_time)
+            if result["success"]:
+                result["timings"]["decode"] = decode_time
+            return result
             
         except Exception as e:
-            logger.error(f"Error extracting text from {image_path}: {str(e)}")
+            logger.error(f"Error extracting text from image bytes: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "extracted_text": "",
+                "confidence": 0.0,
+                "processing_time": 0.0
+            }
+    
+    def _extract_text_from_array_sync(self, image: np.ndarray, detail: int = 1,
+                                      max_size: Optional[int] = None,
+                                      start_time: Optional[float] = None) -> Dict[str, Any]:
+        """Synchronous text extraction from a decoded BGR array"""
+        try:
+            start_time = start_time or time.time()
+            
+            height, width = image.shape[:2]
+            resize_start = time.time()
+            if max_size and not self.tiling_enabled:
+                image = ImageUtils.resize_array_if_needed(image, max_size)
+            resize_time = time.time() - resize_start
+            
+            result = self._recognize(image, detail, start_time)
+            result["dimensions"] = (width, height)
+            result["timings"]["preprocess"] += resize_time
+            
+            # Report boxes in the coordinates of the image the caller passed in
+            scale = image.shape[1] / width
+            if scale != 1.0:
+                for block in result.get("text_blocks", []):
+                    block["bbox"] = [[float(px) / scale, float(py) / scale] for px, py in block["bbox"]]
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error extracting text from image array: {str(e)}")
             return {
                 "success": False,
                 "error": str(e),
@@ -101,6 +317,102 @@ class OCRService:
                 "processing_time": 0.0
             }
     
+    def _readtext(self, image: np.ndarray, detail: int) -> List[Any]:
+        """Run EasyOCR in-process or in the worker pool"""
+        if self.worker_pool is not None:
+            return self.worker_pool.readtext(image, detail=detail)
+        return self.reader.readtext(image, detail=detail)
+    
+    @property
+    def tiling_enabled(self) -> bool:
+        """Whether large images are recognized tile by tile"""
+        return self.tile_executor is not None
+    
+    def _should_tile(self, image: np.ndarray) -> bool:
+        """Check if an image is large enough to be tiled"""
+        return self.tiling_enabled and max(image.shape[:2]) > self.tile_threshold
+    
+    def _readtext_tiled(self, image: np.ndarray) -> Tuple[List[Any], int]:
+        """
+        Recognize a large image as overlapping tiles in parallel
+        
+        Args:
+            image: Preprocessed image
+            
+        Returns:
+            Tuple of (merged detail=1 results in image coordinates, number of tiles)
+        """
+        height, width = image.shape[:2]
+        tiles = ImageUtils.compute_tiles(width, height, self.tile_size, self.tile_overlap)
+        
+        def recognize(tile):
+            x, y, w, h = tile
+            tile_results = self._readtext(image[y:y + h, x:x + w], 1)
+            return [
+                ([[float(px) + x, float(py) + y] for px, py in bbox], text, float(confidence))
+                for bbox, text, confidence in tile_results
+            ]
+        
+        tile_results = list(self.tile_executor.map(recognize, tiles))
+        merged = self._merge_tile_results([block for blocks in tile_results for block in blocks])
+        return merged, len(tiles)
+    
+    @staticmethod
+    def _merge_tile_results(results: List[Any], overlap_ratio: float = 0.6) -> List[Any]:
+        """
+        Drop duplicate detections from tile seams and sort into reading order
+        
+        Two boxes are duplicates when their intersection covers most of the
+        smaller one; the larger box wins, since the smaller one is usually a
+        word cut off at a tile edge.
+        
+        Args:
+            results: detail=1 results in image coordinates
+            overlap_ratio: Intersection / smaller-area ratio that marks a duplicate
+            
+        Returns:
+            Deduplicated results in reading order
+        """
+        if not results:
+            return []
+        
+        rects = []
+        for bbox, text, confidence in results:
+            xs = [point[0] for point in bbox]
+            ys = [point[1] for point in bbox]
+            rects.append((min(xs), min(ys), max(xs), max(ys)))
+        
+        areas = [max(0.0, x2 - x1) * max(0.0, y2 - y1) for x1, y1, x2, y2 in rects]
+        order = sorted(range(len(results)), key=lambda i: rects[i][0])
+        dropped = set()
+        
+        # Sweep left to right; only boxes whose x-ranges overlap can be duplicates
+        for position, i in enumerate(order):
+            if i in dropped:
+                continue
+            x1, y1, x2, y2 = rects[i]
+            for j in order[position + 1:]:
+                if rects[j][0] >= x2:
+                    break
+                if j in dropped:
+                    continue
+                ix = min(x2, rects[j][2]) - max(x1, rects[j][0])
+                iy = min(y2, rects[j][3]) - max(y1, rects[j][1])
+                if ix <= 0 or iy <= 0:
+                    continue
+                smaller = min(areas[i], areas[j])
+                if smaller > 0 and ix * iy / smaller >= overlap_ratio:
+                    loser = j if (areas[i], results[i][2]) >= (areas[j], results[j][2]) else i
+                    dropped.add(loser)
+                    if loser == i:
+                        break
+        
+        kept = [i for i in range(len(results)) if i not in dropped]
+        heights = sorted(rects[i][3] - rects[i][1] for i in kept)
+        line_height = max(1.0, heights[len(heights) // 2])
+        kept.sort(key=lambda i: (int(((rects[i][1] + rects[i][3]) / 2) // line_height), rects[i][0]))
+        return [results[i] for i in kept]
+    
     async def extract_text(self, image_path: str, detail: int = 1) -> Dict[str, Any]:
         """Asynchronous text extraction from image"""
         try:
@@ -122,6 +434,78 @@ class OCRService:
                 "processing_time": 0.0
             }
     
+    async def extract_text_from_bytes(self, content: bytes, detail: int = 1,
+                                      max_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Asynchronous text extraction from encoded image bytes
+        
+        Decoding, preprocessing and OCR all operate on one in-memory array,
+        without touching the filesystem.
+        
+        Args:
+            content: Encoded image bytes (e.g. the raw upload body)
+            detail: EasyOCR detail level
+            max_size: Downscale the decoded image so its longer side fits (ignored when tiling)
+            
+        Returns:
+            OCR result dictionary, including the original "dimensions" (width, height)
+            and the "timings" of decode, preprocess and ocr in seconds
+        """
+        try:
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(
+                self.executor,
+                self._extract_text_from_bytes_sync,
+                content,
+                detail,
+                max_size
+            )
+            return result
+        except Exception as e:
+            logger.error(f"Error in async text extraction: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "extracted_text": "",
+                "confidence": 0.0,
+                "processing_time": 0.0
+            }
+    
+    async def extract_text_from_array(self, image: np.ndarray, detail: int = 1,
+                                      max_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Asynchronous text extraction from an already decoded image
+        
+        Used for document pages, which are rasterized rather than decoded.
+        
+        Args:
+            image: BGR image array
+            detail: EasyOCR detail level
+            max_size: Downscale the image so its longer side fits (ignored when tiling)
+            
+        Returns:
+            OCR result dictionary, including the array's "dimensions" (width, height)
+        """
+        try:
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(
+                self.executor,
+                self._extract_text_from_array_sync,
+                image,
+                detail,
+                max_size
+            )
+            return result
+        except Exception as e:
+            logger.error(f"Error in async text extraction: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "extracted_text": "",
+                "confidence": 0.0,
+                "processing_time": 0.0
+            }
+    
     def _detect_language(self, text: str) -> str:
         """Simple language detection based on character patterns"""
         if not text:
@@ -141,22 +525,22 @@ class OCRService:
             test_image = np.ones((100, 300, 3), dtype=np.uint8) * 255
             cv2.putText(test_image, "Test OCR", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
             
-            test_path = "temp_test_image.jpg"
-            cv2.imwrite(test_path, test_image)
-            
+            # OCR the in-memory image; no temporary file is written
             start_time = time.time()
-            result = await self.extract_text(test_path, detail=0)
+            result = await self.extract_text_from_array(test_image, detail=0)
             test_time = time.time() - start_time
-            
-            if os.path.exists(test_path):
-                os.remove(test_path)
-            
+
             return {
                 "status": "healthy" if result["success"] else "unhealthy",
                 "test_time": test_time,
                 "languages": self.languages,
                 "gpu_enabled": self.gpu,
-                "test_result": result["success"]
+                "test_result": result["success"],
+                "worker_pool": self.worker_pool.get_stats() if self.worker_pool else None,
+                "cascade": {
+                    "enabled": self.cascade,
+                    "tier_counts": {tier: self.tier_counts.get(tier, 0) for tier in self.TIERS}
+                }
             }
             
         except Exception as e:
@@ -173,5 +557,9 @@ class OCRService:
         try:
             if hasattr(self, 'executor'):
                 self.executor.shutdown(wait=True)
+            if getattr(self, 'tile_executor', None) is not None:
+                self.tile_executor.shutdown(wait=True)
+            if getattr(self, 'worker_pool', None) is not None:
+                self.worker_pool.shutdown()
         except:
             pass 
\ No newline at end of file
@@ -0,0 +1,173 @@
+import numpy as np
+from typing import List, Dict, Any
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# EasyOCR reader owned by the current worker process
+_worker_reader = None
+
+
+def _initialize_worker(languages: List[str], gpu: bool, torch_threads: int):
+    """Load the EasyOCR reader once when a worker process starts"""
+    global _worker_reader
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except Exception:
+        pass
+
+    import easyocr
+    _worker_reader = easyocr.Reader(languages, gpu=gpu)
+
+
+def _readtext_from_shared_memory(shm_name: str, shape: tuple, dtype: str, detail: int) -> List[Any]:
+    """Run OCR on an image stored in a shared memory block"""
+    # Spawned workers share the parent's resource tracker, and the parent closes and unlinks the block
+    shm = shared_memory.SharedMemory(name=shm_name)
+    image = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    try:
+        results = _worker_reader.readtext(image, detail=detail)
+    finally:
+        del image
+        shm.close()
+
+    if detail == 0:
+        return list(results)
+    # Convert numpy scalars so results pickle compactly
+    return [
+        ([[float(x), float(y)] for x, y in bbox], text, float(confidence))
+        for bbox, text, confidence in results
+    ]
+
+
+class OCRWorkerPool:
+    """Pool of OCR worker processes, each holding a warm EasyOCR reader"""
+
+    def __init__(self, languages: List[str], gpu: bool = False, num_workers: int = 2,
+                 max_queue_depth: int = 32, torch_threads: int = 1):
+        """
+        Initialize OCR worker pool
+
+        Args:
+            languages: Languages to load in every worker's reader
+            gpu: Whether workers should use GPU
+            num_workers: Number of worker processes
+            max_queue_depth: Maximum number of in-flight images before callers block
+            torch_threads: Torch intra-op threads per worker (avoids oversubscription)
+        """
+        self.languages = languages
+        self.gpu = gpu
+        self.num_workers = max(1, num_workers)
+        self.max_queue_depth = max(self.num_workers, max_queue_depth)
+        self.torch_threads = torch_threads
+        self.executor = None
+
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(self.max_queue_depth)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_task_time = 0.0
+
+        self._initialize_pool()
+
+    def _initialize_pool(self):
+        """Start worker processes"""
+        try:
+            logger.info(f"Starting {self.num_workers} OCR worker processes for languages: {self.languages}")
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_initialize_worker,
+                initargs=(self.languages, self.gpu, self.torch_threads)
+            )
+            # Force every worker to start and load its reader now, not on the first request
+            futures = [self.executor.submit(time.sleep, 0) for _ in range(self.num_workers)]
+            for future in futures:
+                future.result()
+            logger.info("OCR worker pool started successfully")
+        except Exception as e:
+            logger.error(f"Failed to start OCR worker pool: {str(e)}")
+            raise
+
+    def readtext(self, image: np.ndarray, detail: int = 1) -> List[Any]:
+        """
+        Blocking OCR of an image in a worker process
+
+        The image is copied once into shared memory; workers read it in place.
+
+        Args:
+            image: Image array (grayscale or BGR)
+            detail: EasyOCR detail level
+
+        Returns:
+            EasyOCR readtext results
+        """
+        image = np.ascontiguousarray(image)
+        self.slots.acquire()
+        shm = None
+        start_time = time.time()
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        try:
+            shm = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+            buffer = np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)
+            buffer[...] = image
+            del buffer
+
+            future = self.executor.submit(
+                _readtext_from_shared_memory,
+                shm.name,
+                image.shape,
+                image.dtype.str,
+                detail
+            )
+            results = future.result()
+
+            with self.lock:
+                self.completed += 1
+                self.total_task_time += time.time() - start_time
+            return results
+        except Exception:
+            with self.lock:
+                self.failed += 1
+            raise
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+            self.slots.release()
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get concurrency and queue-depth metrics"""
+        with self.lock:
+            finished = self.completed + self.failed
+            return {
+                "num_workers": self.num_workers,
+                "max_queue_depth": self.max_queue_depth,
+                "in_flight": self.in_flight,
+                "queue_depth": max(0, self.in_flight - self.num_workers),
+                "max_in_flight": self.max_in_flight,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_task_time": self.total_task_time / self.completed if self.completed else 0.0,
+                "failure_rate": self.failed / finished if finished else 0.0
+            }
+
+    def shutdown(self):
+        """Stop worker processes"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
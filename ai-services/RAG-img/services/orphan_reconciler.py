@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Any, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class OrphanReconciler:
+    """
+    Periodic sweep that removes data left behind by failed or partial uploads
+
+    Two kinds of orphans are collected, both streamed page by page so
+    memory stays flat however large the node grows:
+
+    - files in the upload directory that no image record points to
+    - Chroma vectors, in the default and every tenant collection, whose
+      image has no metadata record
+
+    Anything younger than min_age is left alone, because an upload in
+    flight writes its file and vectors before its metadata record.
+    """
+
+    def __init__(self, rag_service, interval: float = 3600, min_age: float = 3600, page_size: int = 1000):
+        """
+        Initialize reconciler
+
+        Args:
+            rag_service: RAGService whose stores are reconciled
+            interval: Seconds between scheduled sweeps (0 disables scheduling)
+            min_age: Minimum age in seconds of a file or vector before it can be removed
+            page_size: Files or vectors examined per page
+        """
+        self.rag_service = rag_service
+        self.interval = interval
+        self.min_age = min_age
+        self.page_size = max(1, page_size)
+        self.task: Optional[asyncio.Task] = None
+        self.running = asyncio.Lock()
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    def _scan_upload_page(self, iterator, cutoff: float) -> Dict[str, Any]:
+        """Read the next page of old-enough upload files from a scandir iterator"""
+        files = {}
+        scanned = 0
+        for entry in iterator:
+            scanned += 1
+            try:
+                if entry.is_file():
+                    stat = entry.stat()
+                    if stat.st_mtime < cutoff:
+                        files[entry.path] = stat.st_size
+            except OSError:
+                pass
+            if scanned >= self.page_size:
+                break
+        return {"files": files, "scanned": scanned}
+
+    async def _sweep_files(self, cutoff: float, dry_run: bool) -> Dict[str, Any]:
+        """Remove upload files without an image record"""
+        loop = asyncio.get_event_loop()
+        report = {"files_scanned": 0, "orphan_files": 0, "file_bytes_reclaimed": 0}
+        upload_dir = self.rag_service.upload_dir
+        if not os.path.isdir(upload_dir):
+            return report
+
+        with os.scandir(upload_dir) as iterator:
+            while True:
+                page = await loop.run_in_executor(None, self._scan_upload_page, iterator, cutoff)
+                report["files_scanned"] += page["scanned"]
+                if page["files"]:
+                    referenced = await self.rag_service.metadata_store.referenced_paths(list(page["files"]))
+                    for path, size in page["files"].items():
+                        if path in referenced:
+                            continue
+                        report["orphan_files"] += 1
+                        if dry_run or await loop.run_in_executor(None, self._remove_file, path):
+                            report["file_bytes_reclaimed"] += size
+                if page["scanned"] < self.page_size:
+                    break
+        return report
+
+    @staticmethod
+    def _remove_file(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError as e:
+            logger.warning(f"Could not remove orphan upload {path}: {str(e)}")
+            return False
+
+    async def _sweep_vectors(self, cutoff: float, dry_run: bool) -> Dict[str, Any]:
+        """Remove vectors whose image has no metadata record, one collection at a time"""
+        vector_db = self.rag_service.vector_db_service
+        report = {"vectors_scanned": 0, "orphan_vectors": 0, "vector_bytes_reclaimed": 0}
+        for tenant in await vector_db.list_tenants():
+            tenant_report = await self._sweep_collection(tenant, cutoff, dry_run)
+            for key, value in tenant_report.items():
+                report[key] += value
+        return report
+
+    async def _sweep_collection(self, tenant: Optional[str], cutoff: float, dry_run: bool) -> Dict[str, Any]:
+        """Remove orphan vectors of one tenant collection"""
+        vector_db = self.rag_service.vector_db_service
+        report = {"vectors_scanned": 0, "orphan_vectors": 0, "vector_bytes_reclaimed": 0}
+        orphan_ids: List[str] = []
+        orphan_images = set()
+        offset = 0
+
+        # Collect first and delete afterwards, so deletions do not shift the pages being read
+        while True:
+            page = await vector_db.list_vectors_page(offset=offset, limit=self.page_size, tenant=tenant)
+            if not page["success"]:
+                raise RuntimeError(page["error"])
+            if not page["ids"]:
+                break
+            offset += len(page["ids"])
+            report["vectors_scanned"] += len(page["ids"])
+
+            image_ids = [(metadata or {}).get("image_id", "") for metadata in page["metadatas"]]
+            existing = await self.rag_service.metadata_store.existing_ids([image_id for image_id in image_ids if image_id])
+            for vector_id, image_id, document, metadata in zip(page["ids"], image_ids, page["documents"], page["metadatas"]):
+                if image_id in existing or (metadata or {}).get("timestamp", 0) >= cutoff:
+                    continue
+                orphan_ids.append(vector_id)
+                orphan_images.add(image_id)
+                # Embedding size is added below from the collection's dimension
+                report["vector_bytes_reclaimed"] += len((document or "").encode("utf-8"))
+
+        report["orphan_vectors"] = len(orphan_ids)
+        if orphan_ids:
+            sample = await vector_db.get_vectors(orphan_ids[:1], include_embeddings=True, tenant=tenant)
+            if sample["success"] and sample["results"]:
+                report["vector_bytes_reclaimed"] += len(orphan_ids) * sample["results"][0]["embedding"].nbytes
+
+        if orphan_ids and not dry_run:
+            for start in range(0, len(orphan_ids), self.page_size):
+                result = await vector_db.delete_vectors(orphan_ids[start:start + self.page_size], tenant=tenant)
+                if not result["success"]:
+                    raise RuntimeError(result["error"])
+            orphan_images.discard("")
+            await self.rag_service.lexical_index.delete_images(list(orphan_images))
+            await self.rag_service.region_store.delete_many(list(orphan_images))
+            # Orphans can still turn up in searches, so cached results that saw them are stale
+            await self.rag_service.metadata_store.bump_version()
+        return report
+
+    async def run(self, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Run one sweep
+
+        Args:
+            dry_run: Only count orphans and the space they use
+
+        Returns:
+            Report with scanned and orphan counts and bytes reclaimed
+        """
+        if self.running.locked():
+            return {"success": False, "busy": True, "error": "A reconciliation is already running"}
+
+        async with self.running:
+            start_time = time.time()
+            cutoff = start_time - self.min_age
+            try:
+                await self.rag_service._require("vector_db")
+                report = {"success": True, "dry_run": dry_run}
+                report.update(await self._sweep_files(cutoff, dry_run))
+                report.update(await self._sweep_vectors(cutoff, dry_run))
+                report["bytes_reclaimed"] = report["file_bytes_reclaimed"] + report["vector_bytes_reclaimed"]
+            except Exception as e:
+                logger.error(f"Orphan reconciliation failed: {str(e)}")
+                report = {"success": False, "dry_run": dry_run, "error": str(e)}
+
+            report["duration"] = time.time() - start_time
+            report["finished_at"] = time.time()
+            self.last_report = report
+            if report["success"] and (report["orphan_files"] or report["orphan_vectors"]):
+                logger.info(
+                    f"Reconciliation {'found' if dry_run else 'removed'} {report['orphan_files']} orphan files and "
+                    f"{report['orphan_vectors']} orphan vectors ({report['bytes_reclaimed']} bytes)"
+                )
+            return report
+
+    def start(self):
+        """Schedule sweeps every interval seconds"""
+        if self.task is None and self.interval > 0:
+            self.task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Cancel scheduled sweeps"""
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run()
@@ -0,0 +1,77 @@
+from typing import List, Tuple
+from array import array
+import threading
+
+
+class MultiIndexHashTable:
+    """
+    Hamming-radius search over fixed-width binary hashes
+
+    Each hash is split into radius + 1 disjoint bit blocks, and each block
+    has its own exact-match table. By the pigeonhole principle, any hash
+    within the radius agrees with the query on at least one whole block,
+    so only the few entries sharing a block value are compared. With 64-bit
+    hashes and radius 4 (13-bit blocks), a million entries put roughly a
+    hundred entries in each bucket, which keeps lookups well under a
+    millisecond.
+    """
+
+    def __init__(self, bits: int = 64, radius: int = 4):
+        """
+        Initialize the index
+
+        Args:
+            bits: Hash width in bits
+            radius: Largest Hamming distance that search() can guarantee to find
+        """
+        self.bits = bits
+        self.radius = radius
+        block_count = radius + 1
+        widths = [bits // block_count + (1 if i < bits % block_count else 0) for i in range(block_count)]
+        self.blocks = []
+        shift = 0
+        for width in widths:
+            self.blocks.append((shift, (1 << width) - 1))
+            shift += width
+        self.tables = [dict() for _ in self.blocks]
+        self.hashes = array('Q')
+        self.keys: List[str] = []
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, value: int, key: str):
+        """Index a hash under a key"""
+        with self.lock:
+            position = len(self.keys)
+            self.hashes.append(value)
+            self.keys.append(key)
+            for table, (shift, mask) in zip(self.tables, self.blocks):
+                table.setdefault((value >> shift) & mask, array('I')).append(position)
+
+    def search(self, value: int, radius: int = None) -> List[Tuple[int, str]]:
+        """
+        Find indexed hashes within a Hamming radius
+
+        Args:
+            value: Query hash
+            radius: Search radius (capped at the index radius)
+
+        Returns:
+            (distance, key) pairs, closest first
+        """
+        radius = self.radius if radius is None else min(radius, self.radius)
+        seen = set()
+        matches = []
+        with self.lock:
+            for table, (shift, mask) in zip(self.tables, self.blocks):
+                for position in table.get((value >> shift) & mask, ()):
+                    if position in seen:
+                        continue
+                    seen.add(position)
+                    distance = bin(self.hashes[position] ^ value).count("1")
+                    if distance <= radius:
+                        matches.append((distance, self.keys[position]))
+        matches.sort()
+        return matches
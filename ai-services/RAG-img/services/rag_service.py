@@ -3,13 +3,15 @@ import sys
 import uuid
 import time
 import json
+import hashlib
 import logging
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 from pathlib import Path
 import asyncio
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
 from fastapi import UploadFile
+import numpy as np
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -17,7 +19,17 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from services.ocr_service import OCRService
 from services.embedding_service import EmbeddingService
 from services.vector_db_service import VectorDBService
-from utils.utils import FileUtils, ImageUtils, TextUtils, ValidationUtils
+from services.hash_cache_service import HashCacheService
+from services.metadata_store_service import MetadataStoreService
+from services.lexical_index_service import LexicalIndexService
+from services.ingestion_pipeline import IngestionPipeline
+from services.job_queue_service import JobQueueService
+from services.document_reader import DocumentReader
+from services.region_store_service import RegionStoreService, RegionSet
+from services.orphan_reconciler import OrphanReconciler
+from services.health_monitor import HealthMonitor
+from services.metrics_service import MetricsService
+from utils.utils import FileUtils, ImageUtils, TextUtils, ValidationUtils, LRUCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -37,6 +49,20 @@ class ImageProcessingResult:
     processing_time: float
     success: bool
     error_message: Optional[str] = None
+    deduplicated: bool = False
+
+
+@dataclass
+class PreparedImage:
+    """Image that has been saved and OCR'd but not yet indexed"""
+    result: ImageProcessingResult
+    metadata: Dict[str, Any]
+    file_hash: str = ""
+    chunks: List[str] = field(default_factory=list)
+    embeddings: Optional[np.ndarray] = None
+    perceptual: Optional[Dict[str, Any]] = None
+    regions: Optional[RegionSet] = None
+    source_image_id: Optional[str] = None
 
 
 @dataclass
@@ -50,110 +76,767 @@ class QuestionAnswerResult:
     processing_time: float
     success: bool
     error_message: Optional[str] = None
+    regions: List[Dict[str, Any]] = field(default_factory=list)
 
 
 class RAGService:
     """Main RAG service that orchestrates all components"""
     
-    def __init__(self, upload_dir: str = "uploads", db_path: str = "chroma_db"):
+    # Lazily loaded components and the attributes they are stored in
+    COMPONENTS = {
+        "ocr": "ocr_service",
+        "embedding": "embedding_service",
+        "vector_db": "vector_db_service"
+    }
+    
+    def __init__(self, upload_dir: str = "uploads", db_path: str = "chroma_db",
+                 hash_cache_path: str = "cache/content_hashes.db",
+                 ocr_worker_processes: int = 0, ocr_max_queue_depth: int = 32,
+                 ocr_tile_size: int = 1600, ocr_tile_overlap: int = 200, ocr_tile_threshold: int = 2400,
+                 ocr_cascade: bool = True, ocr_cascade_fast_size: int = 1280,
+                 ocr_cascade_min_confidence: float = 0.6, ocr_cascade_min_density: float = 20.0,
+                 embedding_batch_wait_ms: float = 5.0, embedding_max_batch_size: int = 32,
+                 embedding_cache_size: int = 2048, embedding_cache_ttl: float = 0,
+                 embedding_backend: str = "pytorch", onnx_cache_dir: str = "cache/onnx",
+                 chunk_size: int = 150, chunk_overlap: int = 30,
+                 metadata_db_path: str = "cache/image_metadata.db",
+                 lexical_index_path: str = "cache/lexical_index.db", hybrid_search: bool = True,
+                 job_db_path: str = "cache/jobs.db", job_spool_dir: str = "cache/job_spool",
+                 job_concurrency: int = 2, job_max_attempts: int = 3, job_retention: float = 7 * 86400,
+                 job_lease_timeout: float = 120.0,
+                 vector_snapshot_max_vectors: int = 5000,
+                 near_duplicate_max_distance: int = 4, document_page_concurrency: int = 2,
+                 document_dpi: int = 200, document_max_pages: int = 500,
+                 result_cache_size: int = 1024, result_cache_ttl: float = 0,
+                 region_index: bool = True, region_db_path: str = "cache/regions.db",
+                 reconcile_interval: float = 3600, reconcile_min_age: float = 3600,
+                 reconcile_page_size: int = 1000, vector_max_open_collections: int = 64,
+                 health_check_interval: float = 30, health_check_timeout: float = 10,
+                 workers: int = 1):
         """
         Initialize RAG service
         
         Args:
             upload_dir: Directory to store uploaded images
             db_path: Path to vector database
+            hash_cache_path: Path to the content-hash dedup cache
+            ocr_worker_processes: Number of OCR worker processes (0 = in-process OCR)
+            ocr_max_queue_depth: Maximum in-flight images for the OCR worker pool
+            ocr_tile_size: Tile edge for OCR of large images (0 disables tiling)
+            ocr_tile_overlap: Overlap between OCR tiles in pixels
+            ocr_tile_threshold: Longer-side size above which images are tiled
+            ocr_cascade: Run a cheap downscaled OCR pass first and escalate only on poor results
+            ocr_cascade_fast_size: Longer side of the first OCR pass
+            ocr_cascade_min_confidence: Mean OCR confidence needed to accept a pass
+            ocr_cascade_min_density: Characters per megapixel needed to accept a pass
+            embedding_batch_wait_ms: Micro-batching window for concurrent encode requests (0 disables)
+            embedding_max_batch_size: Maximum texts per embedding micro-batch
+            embedding_cache_size: Capacity of the query-embedding LRU cache (0 disables)
+            embedding_cache_ttl: Query-embedding cache TTL in seconds (0 = no expiry)
+            embedding_backend: Embedding inference backend ("pytorch", "onnx" or "onnx-int8")
+            onnx_cache_dir: Directory for exported ONNX embedding models
+            chunk_size: Words per indexed chunk of OCR text
+            chunk_overlap: Words shared by consecutive chunks
+            metadata_db_path: Path to the SQLite image metadata store
+            lexical_index_path: Path to the BM25 keyword index
+            hybrid_search: Whether search_images fuses keyword and vector results by default
+            job_db_path: Path to the SQLite ingestion job queue
+            job_spool_dir: Directory holding uploads of queued jobs
+            job_concurrency: Number of queued uploads processed at the same time
+            job_max_attempts: Times a job interrupted by a dying worker is claimed before it is failed
+            job_retention: Seconds finished jobs are kept before being purged (0 keeps them)
+            job_lease_timeout: Seconds a running job may go without a lease renewal before
+                another worker requeues it
+            vector_snapshot_max_vectors: Collection size up to which searches use the exact memory-mapped snapshot (0 disables)
+            near_duplicate_max_distance: dHash Hamming distance within which a re-encoded image reuses cached OCR (negative disables)
+            document_page_concurrency: Pages of one PDF/TIFF rasterized and OCR'd at the same time
+            document_dpi: Resolution PDF pages are rendered at
+            document_max_pages: Largest accepted PDF/TIFF page count
+            result_cache_size: Capacity of the search/answer result cache (0 disables)
+            result_cache_ttl: Result cache TTL in seconds (0 = until the collection changes or evicted)
+            region_index: Persist and embed OCR text lines so answers can cite exact regions
+            region_db_path: Path to the SQLite OCR region store
+            reconcile_interval: Seconds between orphan sweeps of uploads and vectors (0 disables)
+            reconcile_min_age: Age in seconds before an unreferenced file or vector counts as orphaned
+            reconcile_page_size: Files or vectors examined per page during a sweep
+            vector_max_open_collections: Tenant (course) collection handles kept open by the vector DB
+            health_check_interval: Seconds between background deep health checks served by /health (0 checks per request)
+            health_check_timeout: Seconds a component's deep health check may take before it counts as unhealthy
+            workers: Server processes sharing these data paths (exact vector snapshots need 1)
         """
         self.upload_dir = upload_dir
         self.db_path = db_path
+        self.chunk_size = chunk_size
+        self.chunk_overlap = min(chunk_overlap, max(0, chunk_size - 1))
+        self.document_page_concurrency = max(1, document_page_concurrency)
+        self.document_dpi = document_dpi
+        self.document_max_pages = document_max_pages
+        self.workers = max(1, workers)
+        if self.workers > 1 and vector_snapshot_max_vectors > 0:
+            # A snapshot is updated only by its own process, so it would miss the other workers' writes
+            logger.warning(f"{self.workers} workers share the vector DB; exact snapshot search disabled")
+            vector_snapshot_max_vectors = 0
+        
+        # Model-backed components load in the background (see start_initialization)
+        self.ocr_service: Optional[OCRService] = None
+        self.embedding_service: Optional[EmbeddingService] = None
+        self.vector_db_service: Optional[VectorDBService] = None
+        self.component_factories = {
+            "ocr": lambda: OCRService(
+                languages=['vi', 'en'],
+                worker_processes=ocr_worker_processes,
+                max_queue_depth=ocr_max_queue_depth,
+                tile_size=ocr_tile_size,
+                tile_overlap=ocr_tile_overlap,
+                tile_threshold=ocr_tile_threshold,
+                cascade=ocr_cascade,
+                cascade_fast_size=ocr_cascade_fast_size,
+                cascade_min_confidence=ocr_cascade_min_confidence,
+                cascade_min_density=ocr_cascade_min_density
+            ),
+            "embedding": lambda: EmbeddingService(
+                batch_wait_ms=embedding_batch_wait_ms,
+                max_batch_size=embedding_max_batch_size,
+                cache_size=embedding_cache_size,
+                cache_ttl=embedding_cache_ttl,
+                backend=embedding_backend,
+                onnx_cache_dir=onnx_cache_dir
+            ),
+            "vector_db": lambda: VectorDBService(
+                db_path=db_path,
+                snapshot_max_vectors=vector_snapshot_max_vectors,
+                max_open_collections=vector_max_open_collections
+            )
+        }
+        self.component_status = {name: {"status": "pending"} for name in self.COMPONENTS}
+        self.component_tasks: Dict[str, asyncio.Task] = {}
         
-        # Initialize services
-        self.ocr_service = OCRService(languages=['vi', 'en'])
-        self.embedding_service = EmbeddingService()
-        self.vector_db_service = VectorDBService(db_path=db_path)
+        self.hash_cache = HashCacheService(
+            cache_path=hash_cache_path,
+            near_duplicate_max_distance=near_duplicate_max_distance
+        )
+        self.lexical_index = LexicalIndexService(db_path=lexical_index_path)
+        self.region_index = region_index
+        self.region_store = RegionStoreService(db_path=region_db_path)
+        self.hybrid_search = hybrid_search
+        # Entries are keyed on the metadata store's shared write version, so any worker's write invalidates them
+        self.result_cache = LRUCache(max_size=result_cache_size, ttl=result_cache_ttl) if result_cache_size > 0 else None
+        self.job_queue = JobQueueService(
+            db_path=job_db_path,
+            spool_dir=job_spool_dir,
+            concurrency=job_concurrency,
+            max_attempts=job_max_attempts,
+            retention=job_retention,
+            lease_timeout=job_lease_timeout
+        )
         
         # Create upload directory
         os.makedirs(upload_dir, exist_ok=True)
         
-        # In-memory storage for image metadata
-        self.image_metadata: Dict[str, Dict[str, Any]] = {}
+        # Persistent image metadata, shared by all workers using the same path
+        self.metadata_store = MetadataStoreService(db_path=metadata_db_path)
+        
+        self.reconciler = OrphanReconciler(
+            self,
+            interval=reconcile_interval,
+            min_age=reconcile_min_age,
+            page_size=reconcile_page_size
+        )
+        
+        # Deep checks run inference, so they run on a schedule and /health serves the last report
+        self.health_check_timeout = health_check_timeout
+        self.health_monitor = HealthMonitor(self, interval=health_check_interval)
+        
+        # Per-stage latency histograms, exposed by get_metrics
+        self.metrics = MetricsService()
+
+        logger.info("RAG service initialized successfully; models load on start_initialization")
+    
+    def start_initialization(self):
+        """
+        Start loading the OCR, embedding and vector DB components concurrently
+        
+        Returns immediately; endpoints that only touch the metadata store
+        are served while models load, and model-backed calls wait for the
+        components they need.
+        """
+        if self.component_tasks:
+            return
+        for name in self.COMPONENTS:
+            self.component_tasks[name] = asyncio.create_task(self._load_component(name))
+    
+    async def _load_component(self, name: str):
+        """Build one component on its own thread and record its timings"""
+        self.component_status[name] = {"status": "loading"}
+        start_time = time.time()
+        try:
+            loop = asyncio.get_event_loop()
+            # The default executor gives every component its own thread
+            component = await loop.run_in_executor(None, self.component_factories[name])
+            setattr(self, self.COMPONENTS[name], component)
+            total_time = time.time() - start_time
+            self.component_status[name] = {
+                "status": "ready",
+                "import_time": component.load_timings.get("import", 0.0),
+                "load_time": component.load_timings.get("load", 0.0),
+                "total_time": total_time
+            }
+            logger.info(f"Component '{name}' ready in {total_time:.2f}s")
+        except Exception as e:
+            logger.error(f"Component '{name}' failed to load: {str(e)}")
+            self.component_status[name] = {
+                "status": "failed",
+                "error": str(e),
+                "total_time": time.time() - start_time
+            }
+    
+    async def _require(self, *names: str):
+        """
+        Wait until the given components are loaded
         
-        logger.info("RAG service initialized successfully")
+        Raises:
+            RuntimeError: If a component failed to load
+        """
+        self.start_initialization()
+        for name in names:
+            await asyncio.shield(self.component_tasks[name])
+            if self.component_status[name]["status"] != "ready":
+                raise RuntimeError(f"Component '{name}' is unavailable: {self.component_status[name].get('error', '')}")
     
-    async def process_image(self, file: UploadFile, description: Optional[str] = None) -> ImageProcessingResult:
+    @property
+    def is_ready(self) -> bool:
+        """Whether every component has loaded"""
+        return all(status["status"] == "ready" for status in self.component_status.values())
+    
+    def get_readiness(self) -> Dict[str, Any]:
+        """Readiness and per-component load status and timings"""
+        return {
+            "ready": self.is_ready,
+            "components": self.component_status
+        }
+    
+    async def process_image(self, file: UploadFile, description: Optional[str] = None,
+                            tenant: Optional[str] = None) -> ImageProcessingResult:
         """
         Process uploaded image: save, OCR, embed, and store in vector DB
         
         Args:
             file: Uploaded image file
             description: Optional description of the image
-            
+            tenant: Tenant (course) partition to index the image into; None uses the shared collection
+        
         Returns:
             ImageProcessingResult object
         """
         start_time = time.time()
+        
+        with self.metrics.timer("process_image", "operation"):
+            try:
+                await self._require("ocr", "embedding", "vector_db")
+            except RuntimeError as e:
+                return self._failed_result(str(uuid.uuid4()), file.filename, start_time, str(e))
+            
+            prepared = await self._prepare_image(file, description, tenant)
+            if not prepared.result.success:
+                return prepared.result
+            
+            store_result = await self._index_images([prepared])
+            if not store_result["success"]:
+                prepared.result.success = False
+                prepared.result.error_message = store_result.get("error")
+            prepared.result.processing_time = time.time() - start_time
+            return prepared.result
+    
+    async def process_images_batch(self, files: List[UploadFile],
+                                   descriptions: Optional[List[Optional[str]]] = None,
+                                   batch_size: int = 16, queue_size: int = 32,
+                                   ocr_concurrency: int = 2, tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Process many uploaded images through the staged ingestion pipeline
+        
+        Args:
+            files: Uploaded image files
+            descriptions: Optional descriptions aligned with files
+            batch_size: Maximum number of images per embedding/insert batch
+            queue_size: Capacity of each inter-stage queue
+            ocr_concurrency: Number of images saved and OCR'd concurrently
+            tenant: Tenant (course) partition to index every image into
+
+        Returns:
+            Dictionary with per-file results and per-stage throughput
+        """
+        await self._require("ocr", "embedding", "vector_db")
+        pipeline = IngestionPipeline(
+            self,
+            batch_size=batch_size,
+            queue_size=queue_size,
+            ocr_concurrency=ocr_concurrency
+        )
+        return await pipeline.run(files, descriptions, tenant)
+    
+    async def process_document(self, file: UploadFile, description: Optional[str] = None,
+                               tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Process an uploaded multi-page PDF or TIFF page by page
+        
+        Args:
+            file: Uploaded document
+            description: Optional description of the document
+            tenant: Tenant (course) partition to index the pages into
+
+        Returns:
+            Dictionary with the document ID and per-page results
+        """
+        start_time = time.time()
+        try:
+            await self._require("ocr", "embedding", "vector_db")
+            
+            validation_result = ValidationUtils.validate_document_file(file)
+            tenant_validation = ValidationUtils.validate_tenant(tenant)
+            errors = validation_result["errors"] + tenant_validation["errors"]
+            if errors:
+                return {"success": False, "error": "; ".join(errors)}
+            
+            read_result = await FileUtils.read_upload_file(file)
+            if not read_result["success"]:
+                return {"success": False, "error": read_result["error"]}
+            
+            return await self._process_document_content(
+                file.filename, read_result["content"], read_result["file_hash"], description,
+                start_time=start_time, tenant=tenant
+            )
+        except Exception as e:
+            logger.error(f"Error processing document: {str(e)}")
+            return {"success": False, "error": str(e)}
+    
+    async def _process_document_content(self, filename: str, content: bytes, file_hash: str,
+                                        description: Optional[str] = None,
+                                        start_time: Optional[float] = None,
+                                        tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Save a document, then rasterize, OCR and index its pages as a stream
+        
+        At most document_page_concurrency pages are rasterized at any time;
+        each page is embedded and written to the vector DB as soon as its
+        OCR finishes, so a long document is searchable while it is still
+        being processed and never sits fully rasterized in memory.
+        
+        Args:
+            filename: Original filename
+            content: Encoded document bytes
+            file_hash: Content hash of the bytes
+            description: Optional description of the document
+            start_time: Start of processing (now if omitted)
+            tenant: Tenant partition to index the pages into
+
+        Returns:
+            Dictionary with the document ID and per-page results
+        """
+        start_time = start_time or time.time()
+        document_id = str(uuid.uuid4())
+        loop = asyncio.get_event_loop()
+        write_task = None
+        
+        try:
+            unique_filename = FileUtils.generate_unique_filename(filename)
+            save_path = os.path.join(self.upload_dir, unique_filename)
+            write_task = asyncio.create_task(self.metrics.track("upload_save", FileUtils.write_file(save_path, content)))
+            
+            reader = await loop.run_in_executor(
+                None, lambda: DocumentReader(content, filename, dpi=self.document_dpi, max_size=2048)
+            )
+        except Exception as e:
+            logger.error(f"Error opening document {filename}: {str(e)}")
+            if write_task is not None and (await write_task)["success"]:
+                FileUtils.delete_file(save_path)
+            return {"success": False, "error": str(e)}
+        
+        try:
+            save_result = await write_task
+            if not save_result["success"]:
+                return {"success": False, "error": save_result["error"]}
+            
+            page_count = reader.page_count
+            if page_count > self.document_max_pages:
+                FileUtils.delete_file(save_path)
+                return {
+                    "success": False,
+                    "error": f"Document has {page_count} pages; the limit is {self.document_max_pages}"
+                }
+            
+            document_metadata = {
+                "filename": filename,
+                "unique_filename": unique_filename,
+                "file_size": len(content),
+                "file_hash": file_hash,
+                "description": description,
+                "document_id": document_id,
+                "page_count": page_count,
+                "upload_timestamp": datetime.now().isoformat()
+            }
+            if tenant:
+                # Pages inherit it, so deletes and sweeps find their partition
+                document_metadata["tenant"] = tenant
+            semaphore = asyncio.Semaphore(self.document_page_concurrency)
+            
+            async def process_page(page_index: int) -> ImageProcessingResult:
+                page_start = time.time()
+                page_id = f"{document_id}_p{page_index + 1}"
+                try:
+                    async with semaphore:
+                        with self.metrics.timer("page_render"):
+                            image = await loop.run_in_executor(None, reader.render_page, page_index)
+                        ocr_result = await self._run_ocr(self.ocr_service.extract_text_from_array(image))
+                        # Release the bitmap before the next page is rendered
+                        del image
+                    
+                    prepared = self._prepare_page(page_id, page_index + 1, ocr_result, document_metadata, page_start)
+                    if prepared.result.success:
+                        store_result = await self._index_images([prepared])
+                        if not store_result["success"]:
+                            prepared.result.success = False
+                            prepared.result.error_message = store_result.get("error")
+                    return prepared.result
+                except Exception as e:
+                    logger.error(f"Error processing page {page_index + 1} of {filename}: {str(e)}")
+                    return self._failed_result(page_id, filename, page_start, str(e))
+            
+            page_results = await asyncio.gather(*[process_page(page_index) for page_index in range(page_count)])
+        finally:
+            reader.close()
+        
+        indexed = [result for result in page_results if result.success]
+        if indexed:
+            await self.metadata_store.put(document_id, {
+                **document_metadata,
+                "file_path": save_path,
+                "page_ids": [result.image_id for result in indexed],
+                "extracted_text": ""
+            })
+        else:
+            FileUtils.delete_file(save_path)
+        
+        return {
+            "success": bool(indexed),
+            "document_id": document_id,
+            "filename": filename,
+            "page_count": page_count,
+            "pages_indexed": len(indexed),
+            "pages": [
+                {
+                    "page_number": page_number,
+                    "image_id": result.image_id,
+                    "success": result.success,
+                    "ocr_confidence": result.ocr_confidence,
+                    "error_message": result.error_message
+                }
+                for page_number, result in enumerate(page_results, start=1)
+            ],
+            "processing_time": time.time() - start_time,
+            "error": None if indexed else "No page could be processed"
+        }
+    
+    def _prepare_page(self, page_id: str, page_number: int, ocr_result: Dict[str, Any],
+                      document_metadata: Dict[str, Any], start_time: float) -> PreparedImage:
+        """Turn the OCR result of one document page into a PreparedImage"""
+        filename = document_metadata["filename"]
+        dimensions = tuple(ocr_result.get("dimensions", (0, 0)))
+        if not ocr_result["success"]:
+            return PreparedImage(self._failed_result(
+                page_id, filename, start_time, ocr_result["error"], dimensions=dimensions
+            ), {})
+        
+        extracted_text = ocr_result["extracted_text"]
+        if not extracted_text or not extracted_text.strip():
+            logger.warning(f"No text extracted from page {page_number} of {filename}")
+            extracted_text = "No text found in image"
+        
+        chunks = self._split_into_chunks(extracted_text)
+        metadata = {
+            **document_metadata,
+            "dimensions": dimensions,
+            "page_number": page_number,
+            "ocr_confidence": ocr_result["confidence"],
+            "detected_language": ocr_result["detected_language"],
+            "ocr_tier": ocr_result.get("ocr_tier", ""),
+            "chunk_count": len(chunks)
+        }
+        result = ImageProcessingResult(
+            image_id=page_id,
+            filename=filename,
+            file_path="",
+            file_size=0,
+            dimensions=dimensions,
+            extracted_text=extracted_text,
+            ocr_confidence=ocr_result["confidence"],
+            detected_language=ocr_result["detected_language"],
+            processing_time=time.time() - start_time,
+            success=True
+        )
+        regions = RegionSet.from_blocks(ocr_result.get("text_blocks"), dimensions) if self.region_index else None
+        # No file hash: pages are not entries of the whole-file dedup cache
+        return PreparedImage(result=result, metadata=metadata, chunks=chunks, regions=regions)
+    
+    async def submit_image_job(self, file: UploadFile, description: Optional[str] = None,
+                               lane: str = "interactive", tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Validate and spool an upload, then queue it for background processing
+        
+        Args:
+            file: Uploaded image file
+            description: Optional description of the image
+            lane: "interactive" (processed first) or "bulk"
+            tenant: Tenant (course) partition to index the upload into
+
+        Returns:
+            Dictionary with the job ID, or an error
+        """
+        try:
+            if DocumentReader.is_document(file.filename):
+                validation_result = ValidationUtils.validate_document_file(file)
+            else:
+                validation_result = ValidationUtils.validate_image_file(file)
+            errors = validation_result["errors"] + ValidationUtils.validate_tenant(tenant)["errors"]
+            if errors:
+                return {"success": False, "error": "; ".join(errors)}
+            
+            read_result = await FileUtils.read_upload_file(file)
+            if not read_result["success"]:
+                return {"success": False, "error": read_result["error"]}
+            
+            return await self.job_queue.enqueue(file.filename, read_result["content"], description, lane, tenant)
+        except Exception as e:
+            logger.error(f"Error submitting image job: {str(e)}")
+            return {"success": False, "error": str(e)}
+    
+    async def _run_image_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Process one queued upload, timing each stage
+        
+        Args:
+            job: Job claimed from the queue
+            
+        Returns:
+            Dictionary with "success", "stage_timings", "result" and "error"
+        """
+        await self._require("ocr", "embedding", "vector_db")
+        stage_timings = {}
+        start_time = time.time()
+        
+        content = Path(job["spool_path"]).read_bytes()
+        if DocumentReader.is_document(job["filename"]):
+            # Pages are OCR'd and indexed in an interleaved stream, so only the total is timed
+            document_result = await self._process_document_content(
+                job["filename"], content, hashlib.md5(content).hexdigest(), job["description"],
+                tenant=job.get("tenant")
+            )
+            stage_timings["total"] = time.time() - start_time
+            return {
+                "success": document_result["success"],
+                "stage_timings": stage_timings,
+                "result": document_result if document_result["success"] else None,
+                "error": document_result.get("error")
+            }
+        
+        prepared = await self._prepare_content(
+            job["filename"], content, hashlib.md5(content).hexdigest(), job["description"],
+            tenant=job.get("tenant")
+        )
+        stage_timings["ocr"] = time.time() - start_time
+        if not prepared.result.success:
+            return {"success": False, "stage_timings": stage_timings, "error": prepared.result.error_message}
+        
+        stage_start = time.time()
+        await self._embed_prepared([prepared])
+        stage_timings["embedding"] = time.time() - stage_start
+        
+        stage_start = time.time()
+        store_result = await self._store_images([prepared])
+        stage_timings["indexing"] = time.time() - stage_start
+        stage_timings["total"] = time.time() - start_time
+        
+        if not store_result["success"]:
+            return {"success": False, "stage_timings": stage_timings, "error": store_result.get("error")}
+        
+        return {
+            "success": True,
+            "stage_timings": stage_timings,
+            "result": {
+                "image_id": prepared.result.image_id,
+                "filename": prepared.result.filename,
+                "extracted_text": prepared.result.extracted_text,
+                "ocr_confidence": prepared.result.ocr_confidence,
+                "deduplicated": prepared.result.deduplicated,
+                "chunks_indexed": store_result.get("added_count", 0)
+            }
+        }
+    
+    async def start_job_workers(self):
+        """Start processing queued uploads, including ones left over from a previous run"""
+        await self.job_queue.start(self._run_image_job)
+    
+    async def stop_job_workers(self):
+        """Stop processing queued uploads"""
+        await self.job_queue.stop()
+    
+    def start_maintenance(self):
+        """Schedule the periodic orphan sweep and deep health check"""
+        self.reconciler.start()
+        self.health_monitor.start()
+    
+    async def stop_maintenance(self):
+        """Cancel the periodic orphan sweep and deep health check"""
+        await self.reconciler.stop()
+        await self.health_monitor.stop()
+    
+    async def reconcile_orphans(self, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Remove upload files and vectors that no image record refers to
+        
+        Args:
+            dry_run: Only report what would be removed
+            
+        Returns:
+            Sweep report, including bytes reclaimed
+        """
+        return await self.reconciler.run(dry_run=dry_run)
+    
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get the status of a queued upload"""
+        return await self.job_queue.get(job_id)
+    
+    def _failed_result(self, image_id: str, filename: str, start_time: float, error_message: str,
+                       file_path: str = "", file_size: int = 0,
+                       dimensions: Tuple[int, int] = (0, 0)) -> ImageProcessingResult:
+        """Build an unsuccessful ImageProcessingResult"""
+        return ImageProcessingResult(
+            image_id=image_id,
+            filename=filename,
+            file_path=file_path,
+            file_size=file_size,
+            dimensions=dimensions,
+            extracted_text="",
+            ocr_confidence=0.0,
+            detected_language="",
+            processing_time=time.time() - start_time,
+            success=False,
+            error_message=error_message
+        )
+    
+    async def _prepare_image(self, file: UploadFile, description: Optional[str] = None,
+                             tenant: Optional[str] = None) -> PreparedImage:
+        """
+        Validate, save and OCR an uploaded image without indexing it
+        
+        Byte-identical re-uploads are served from the content-hash cache,
+        skipping OCR and embedding entirely.
+        
+        Args:
+            file: Uploaded image file
+            description: Optional description of the image
+            tenant: Tenant partition the image will be indexed into
+        
+        Returns:
+            PreparedImage; its result is unsuccessful on failure
+        """
+        start_time = time.time()
         image_id = str(uuid.uuid4())
         
         try:
             # Validate file
             validation_result = ValidationUtils.validate_image_file(file)
-            if not validation_result["is_valid"]:
-                return ImageProcessingResult(
-                    image_id=image_id,
-                    filename=file.filename,
-                    file_path="",
-                    file_size=0,
-                    dimensions=(0, 0),
-                    extracted_text="",
-                    ocr_confidence=0.0,
-                    detected_language="",
-                    processing_time=time.time() - start_time,
-                    success=False,
-                    error_message="; ".join(validation_result["errors"])
-                )
+            errors = validation_result["errors"] + ValidationUtils.validate_tenant(tenant)["errors"]
+            if errors:
+                return PreparedImage(self._failed_result(
+                    image_id, file.filename, start_time, "; ".join(errors)
+                ), {})
+            
+            # Read upload into memory, hashing while streaming
+            with self.metrics.timer("upload_read"):
+                read_result = await FileUtils.read_upload_file(file)
+            if not read_result["success"]:
+                return PreparedImage(self._failed_result(image_id, file.filename, start_time, read_result["error"]), {})
+            
+            return await self._prepare_content(
+                file.filename, read_result["content"], read_result["file_hash"], description,
+                image_id=image_id, start_time=start_time, tenant=tenant
+            )
             
+        except Exception as e:
+            logger.error(f"Error processing image: {str(e)}")
+            return PreparedImage(self._failed_result(image_id, file.filename if file else "", start_time, str(e)), {})
+    
+    async def _prepare_content(self, filename: str, content: bytes, file_hash: str,
+                               description: Optional[str] = None, image_id: Optional[str] = None,
+                               start_time: Optional[float] = None, tenant: Optional[str] = None) -> PreparedImage:
+        """
+        Save and OCR already-read image bytes without indexing them
+        
+        Args:
+            filename: Original filename
+            content: Encoded image bytes
+            file_hash: Content hash of the bytes
+            description: Optional description of the image
+            image_id: Image ID to use (generated if omitted)
+            start_time: Start of processing (now if omitted)
+            tenant: Tenant partition the image will be indexed into
+
+        Returns:
+            PreparedImage; its result is unsuccessful on failure
+        """
+        start_time = start_time or time.time()
+        image_id = image_id or str(uuid.uuid4())
+        
+        try:
             # Generate unique filename and save path
-            unique_filename = FileUtils.generate_unique_filename(file.filename)
+            unique_filename = FileUtils.generate_unique_filename(filename)
             save_path = os.path.join(self.upload_dir, unique_filename)
+            file_size = len(content)
             
-            # Save uploaded file
-            save_result = await FileUtils.save_upload_file(file, save_path)
-            if not save_result["success"]:
-                return ImageProcessingResult(
-                    image_id=image_id,
-                    filename=file.filename,
-                    file_path="",
-                    file_size=0,
-                    dimensions=(0, 0),
-                    extracted_text="",
-                    ocr_confidence=0.0,
-                    detected_language="",
-                    processing_time=time.time() - start_time,
-                    success=False,
-                    error_message=save_result["error"]
-                )
+            # Persist the original bytes while OCR runs on the in-memory copy
+            write_task = asyncio.create_task(self.metrics.track("upload_save", FileUtils.write_file(save_path, content)))
+            
+            with self.metrics.timer("dedup_lookup"):
+                cached = await self.hash_cache.get(file_hash)
+                perceptual = None
+                if not cached and self.hash_cache.phash_index is not None:
+                    # Re-encoded or resized copies of a known image are found by perceptual hash
+                    loop = asyncio.get_event_loop()
+                    perceptual = await loop.run_in_executor(None, ImageUtils.compute_perceptual_hashes, content)
+                    cached = await self.hash_cache.find_similar(perceptual)
+                    if cached:
+                        logger.info(
+                            f"Near-duplicate of {cached['source_hash']} (distance {cached['phash_distance']}) "
+                            f"for image {image_id}; reusing OCR and embedding"
+                        )
+                elif cached:
+                    logger.info(f"Duplicate upload {file_hash} for image {image_id}; reusing OCR and embedding")
             
-            # Get image dimensions
-            dimensions = ImageUtils.get_image_dimensions(save_path)
+            regions = None
+            if cached:
+                dimensions = ImageUtils.get_image_dimensions(content)
+                ocr_result = {
+                    "success": True,
+                    "extracted_text": cached["extracted_text"],
+                    "confidence": cached["ocr_confidence"],
+                    "detected_language": cached["detected_language"]
+                }
+            else:
+                # Decode once and OCR the array; large images are downscaled in memory unless tiled
+                ocr_result = await self._run_ocr(self.ocr_service.extract_text_from_bytes(content, max_size=2048))
+                dimensions = tuple(ocr_result.get("dimensions", (0, 0)))
+                if self.region_index and ocr_result["success"]:
+                    regions = RegionSet.from_blocks(ocr_result.get("text_blocks"), dimensions)
             
-            # Resize image if needed
-            ImageUtils.resize_image_if_needed(save_path)
+            save_result = await write_task
+            if not save_result["success"]:
+                return PreparedImage(self._failed_result(image_id, filename, start_time, save_result["error"]), {})
             
-            # Extract text using OCR
-            ocr_result = await self.ocr_service.extract_text(save_path)
             if not ocr_result["success"]:
-                return ImageProcessingResult(
-                    image_id=image_id,
-                    filename=file.filename,
-                    file_path=save_path,
-                    file_size=save_result["file_size"],
-                    dimensions=dimensions,
-                    extracted_text="",
-                    ocr_confidence=0.0,
-                    detected_language="",
-                    processing_time=time.time() - start_time,
-                    success=False,
-                    error_message=ocr_result["error"]
-                )
+                return PreparedImage(self._failed_result(
+                    image_id, filename, start_time, ocr_result["error"],
+                    file_path=save_path, file_size=file_size, dimensions=dimensions
+                ), {})
             
             extracted_text = ocr_result["extracted_text"]
             
@@ -162,79 +845,262 @@ class RAGService:
                 logger.warning(f"No text extracted from image {image_id}")
                 extracted_text = "No text found in image"
             
-            # Create embedding
-            embedding = await self.embedding_service.encode_text(extracted_text)
-            
-            # Store in vector database
             metadata = {
-                "filename": file.filename,
+                "filename": filename,
                 "unique_filename": unique_filename,
                 "file_path": save_path,
-                "file_size": save_result["file_size"],
+                "file_size": file_size,
+                "file_hash": file_hash,
                 "dimensions": dimensions,
                 "description": description,
                 "ocr_confidence": ocr_result["confidence"],
                 "detected_language": ocr_result["detected_language"],
+                "ocr_tier": ocr_result.get("ocr_tier", "cached"),
                 "upload_timestamp": datetime.now().isoformat()
             }
             
-            vector_result = await self.vector_db_service.add_image_text(
-                image_id=image_id,
-                text=extracted_text,
-                embedding=embedding[0],  # embedding service returns array
-                metadata=metadata
-            )
-            
-            if not vector_result["success"]:
-                logger.error(f"Failed to store in vector DB: {vector_result['error']}")
-            
-            # Store metadata in memory
-            self.image_metadata[image_id] = {
-                "filename": file.filename,
-                "unique_filename": unique_filename,
-                "file_path": save_path,
-                "file_size": save_result["file_size"],
-                "dimensions": dimensions,
-                "extracted_text": extracted_text,
-                "ocr_confidence": ocr_result["confidence"],
-                "detected_language": ocr_result["detected_language"],
-                "description": description,
-                "upload_timestamp": datetime.now().isoformat()
-            }
-            
-            processing_time = time.time() - start_time
-            
-            return ImageProcessingResult(
+            result = ImageProcessingResult(
                 image_id=image_id,
-                filename=file.filename,
+                filename=filename,
                 file_path=save_path,
-                file_size=save_result["file_size"],
+                file_size=file_size,
                 dimensions=dimensions,
                 extracted_text=extracted_text,
                 ocr_confidence=ocr_result["confidence"],
                 detected_language=ocr_result["detected_language"],
-                processing_time=processing_time,
-                success=True
+                processing_time=time.time() - start_time,
+                success=True,
+                deduplicated=cached is not None
+            )
+            chunks = self._split_into_chunks(extracted_text)
+            cached_embeddings = None
+            if cached and len(cached["embeddings"]) == len(chunks):
+                cached_embeddings = cached["embeddings"]
+            
+            metadata["chunk_count"] = len(chunks)
+            if tenant:
+                metadata["tenant"] = tenant
+            if cached and "source_hash" in cached:
+                metadata["near_duplicate_of"] = cached["source_hash"]
+                metadata["phash_distance"] = cached["phash_distance"]
+            return PreparedImage(
+                result=result,
+                metadata=metadata,
+                file_hash=file_hash,
+                chunks=chunks,
+                embeddings=cached_embeddings,
+                perceptual=perceptual,
+                regions=regions,
+                source_image_id=VectorDBService.image_id_from_vector_id(cached["vector_id"]) if cached else None
             )
             
         except Exception as e:
             logger.error(f"Error processing image: {str(e)}")
-            return ImageProcessingResult(
-                image_id=image_id,
-                filename=file.filename if file else "",
-                file_path="",
-                file_size=0,
-                dimensions=(0, 0),
-                extracted_text="",
-                ocr_confidence=0.0,
-                detected_language="",
-                processing_time=time.time() - start_time,
-                success=False,
-                error_message=str(e)
-            )
+            return PreparedImage(self._failed_result(image_id, filename, start_time, str(e)), {})
+    
+    async def _run_ocr(self, ocr_call) -> Dict[str, Any]:
+        """
+        Await an OCR call and record its decode, preprocess and OCR stage timings
+        
+        The time the call spent waiting for a free OCR executor thread is
+        recorded as "ocr_wait".
+        
+        Args:
+            ocr_call: Awaitable returned by an OCRService extract method
+        
+        Returns:
+            The OCR result
+        """
+        start_time = time.time()
+        ocr_result = await ocr_call
+        self.metrics.observe_many(ocr_result.get("timings", {}))
+        if ocr_result["success"]:
+            self.metrics.observe("ocr_wait", max(0.0, time.time() - start_time - ocr_result["processing_time"]))
+        return ocr_result
+    
+    def _split_into_chunks(self, text: str) -> List[str]:
+        """Split OCR text into chunks that fit the embedding model's sequence length"""
+        chunks = TextUtils.split_text_into_chunks(text, self.chunk_size, self.chunk_overlap)
+        return chunks or [text]
+    
+    async def _embed_prepared(self, prepared: List[PreparedImage]) -> int:
+        """
+        Embed, in one batch, the chunks and region lines of every prepared image without cached embeddings
+        
+        Args:
+            prepared: Prepared images; embeddings are filled in place
+            
+        Returns:
+            Number of texts sent to the embedding model
+        """
+        missing = [item for item in prepared if item.embeddings is None]
+        region_lines = [
+            (item.regions, item.regions.line_texts()) for item in prepared
+            if item.regions is not None and item.regions.embeddings is None
+        ]
+        texts = [chunk for item in missing for chunk in item.chunks]
+        texts += [line for _, lines in region_lines for line in lines]
+        if not texts:
+            return 0
+        
+        with self.metrics.timer("embedding"):
+            # Ingested text bypasses the query-embedding cache so bulk uploads do not evict queries
+            embeddings = await self.embedding_service.encode_text(texts, use_cache=False)
+        
+        offset = 0
+        for item in missing:
+            item.embeddings = np.asarray(embeddings[offset:offset + len(item.chunks)], dtype=np.float32)
+            offset += len(item.chunks)
+        for regions, lines in region_lines:
+            regions.embeddings = np.asarray(embeddings[offset:offset + len(lines)], dtype=np.float16)
+            offset += len(lines)
+        return len(texts)
+    
+    async def _index_images(self, prepared: List[PreparedImage]) -> Dict[str, Any]:
+        """
+        Embed prepared images in one batch and store them in the vector DB
+        
+        Args:
+            prepared: Prepared images returned by _prepare_image
+            
+        Returns:
+            Dictionary with the vector DB operation results
+        """
+        if not prepared:
+            return {"success": True, "added_count": 0}
+        
+        await self._embed_prepared(prepared)
+        return await self._store_images(prepared)
+    
+    async def _store_images(self, prepared: List[PreparedImage]) -> Dict[str, Any]:
+        """
+        Store embedded images in the vector DB, the metadata store and the hash cache
+        
+        Args:
+            prepared: Prepared images whose embeddings are set
+            
+        Returns:
+            Dictionary with the vector DB operation results; "failed" maps the
+            image_id of every image whose vectors were not stored to its error
+        """
+        # Each tenant's images go to that tenant's collection
+        by_tenant: Dict[Optional[str], List[PreparedImage]] = {}
+        for item in prepared:
+            by_tenant.setdefault(item.metadata.get("tenant"), []).append(item)
+        
+        tenant_results = []
+        stored: List[PreparedImage] = []
+        failed_items: Dict[str, str] = {}
+        for tenant, items in by_tenant.items():
+            with self.metrics.timer("vector_add"):
+                tenant_result = await self.vector_db_service.add_image_chunks(
+                    image_ids=[item.result.image_id for item in items],
+                    chunk_texts=[item.chunks for item in items],
+                    chunk_embeddings=[item.embeddings for item in items],
+                    metadatas=[item.metadata for item in items],
+                    tenant=tenant
+                )
+            tenant_results.append(tenant_result)
+            
+            if not tenant_result["success"]:
+                logger.error(f"Failed to store in vector DB: {tenant_result['error']}")
+                for item in items:
+                    failed_items[item.result.image_id] = tenant_result["error"]
+                continue
+            stored.extend(items)
+            
+            vector_ids, image_ids, texts = [], [], []
+            for item in items:
+                for chunk_index, chunk in enumerate(item.chunks):
+                    vector_ids.append(VectorDBService.chunk_vector_id(item.result.image_id, chunk_index, len(item.chunks)))
+                    image_ids.append(item.result.image_id)
+                    texts.append(chunk)
+            with self.metrics.timer("lexical_add"):
+                await self.lexical_index.add_chunks(vector_ids, image_ids, texts, tenant=tenant)
+            with self.metrics.timer("region_add"):
+                await self._store_regions(items)
+        
+        failed = [result for result in tenant_results if not result["success"]]
+        vector_result = {
+            "success": not failed,
+            "added_count": sum(result.get("added_count", 0) for result in tenant_results),
+            "failed": failed_items
+        }
+        if failed:
+            vector_result["error"] = failed[0]["error"]
+
+        # Only images whose vectors landed get a metadata record; the reconciler
+        # sweeps vectors without metadata, not the reverse
+        if stored:
+            with self.metrics.timer("metadata_add"):
+                await self.metadata_store.put_many({
+                    item.result.image_id: {**item.metadata, "extracted_text": item.result.extracted_text}
+                    for item in stored
+                })
+        
+        for item in stored:
+            # Remember OCR and embedding so byte-identical re-uploads skip both
+            if item.file_hash and not item.result.deduplicated:
+                await self.hash_cache.put(
+                    file_hash=item.file_hash,
+                    extracted_text=item.result.extracted_text,
+                    ocr_confidence=item.result.ocr_confidence,
+                    detected_language=item.result.detected_language,
+                    embeddings=item.embeddings,
+                    vector_id=VectorDBService.chunk_vector_id(item.result.image_id, 0, len(item.chunks)),
+                    perceptual=item.perceptual
+                )
+        
+        return vector_result
+    
+    @staticmethod
+    def _check_tenant(tenant: Optional[str]):
+        """
+        Reject tenant names that cannot name a partition
+        
+        Raises:
+            ValueError: If the tenant name is invalid
+        """
+        validation_result = ValidationUtils.validate_tenant(tenant)
+        if not validation_result["is_valid"]:
+            raise ValueError("; ".join(validation_result["errors"]))
+    
+    async def _result_cache_key(self, kind: str, text: str, *params: Any) -> Optional[Tuple[Any, ...]]:
+        """
+        Result cache key for the current state of the collection
+        
+        The key embeds the write version of the metadata store, which every
+        worker shares and which is bumped once an add or delete has reached
+        the vector DB, keyword index and regions. A result computed before a
+        write in any worker can never be returned after it; superseded
+        entries simply age out of the LRU.
+        
+        Args:
+            kind: "search" or "answer"
+            text: Query or question, normalized for case and whitespace
+            params: Remaining parameters the result depends on
+            
+        Returns:
+            Cache key, or None when the cache is disabled
+        """
+        if self.result_cache is None:
+            return None
+        normalized = " ".join(text.split()).casefold()
+        return (kind, normalized, *params, await self.metadata_store.version())
+    
+    async def _store_regions(self, prepared: List[PreparedImage]):
+        """Persist OCR regions; deduplicated images reuse the regions of the image they duplicate"""
+        records = {item.result.image_id: item.regions for item in prepared if item.regions is not None}
+        duplicates = [item for item in prepared if item.regions is None and item.source_image_id]
+        if duplicates:
+            sources = await self.region_store.get_many([item.source_image_id for item in duplicates])
+            for item in duplicates:
+                if item.source_image_id in sources:
+                    records[item.result.image_id] = sources[item.source_image_id].scaled(item.result.dimensions)
+        await self.region_store.put_many(records)
     
     async def answer_question(self, question: str, image_id: Optional[str] = None, 
-                             top_k: int = 5) -> QuestionAnswerResult:
+                             top_k: int = 5, tenant: Optional[str] = None) -> QuestionAnswerResult:
         """
         Answer question about images using RAG
         
@@ -242,31 +1108,45 @@ class RAGService:
             question: Question to answer
             image_id: Optional specific image ID to query
             top_k: Number of top results to retrieve
-            
+            tenant: Tenant (course) partition to search; None uses the shared collection
+
         Returns:
             QuestionAnswerResult object
         """
         start_time = time.time()
         
         try:
+            self._check_tenant(tenant)
+            await self._require("embedding", "vector_db")
+            
+            cache_key = await self._result_cache_key("answer", question, image_id, top_k, tenant)
+            if cache_key is not None:
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    return replace(cached, question=question, processing_time=time.time() - start_time)
+            
             # Create question embedding
-            question_embedding = await self.embedding_service.encode_text(question)
+            with self.metrics.timer("query_embedding"):
+                question_embedding = await self.embedding_service.encode_text(question)
             
             # Search for relevant images
-            if image_id:
-                # Search for specific image
-                search_result = await self.vector_db_service.search_vectors(
-                    query_embedding=question_embedding[0],
-                    n_results=1,
-                    where={"image_id": image_id}
-                )
-            else:
-                # Search all images
-                search_result = await self.vector_db_service.search_similar_images(
-                    query_embedding=question_embedding[0],
-                    n_results=top_k,
-                    similarity_threshold=0.3
-                )
+            with self.metrics.timer("vector_search"):
+                if image_id:
+                    # Search the best chunks of a specific image
+                    search_result = await self.vector_db_service.search_vectors(
+                        query_embedding=question_embedding[0],
+                        n_results=top_k,
+                        where={"image_id": image_id},
+                        tenant=tenant
+                    )
+                else:
+                    # Search all images of the tenant
+                    search_result = await self.vector_db_service.search_similar_images(
+                        query_embedding=question_embedding[0],
+                        n_results=top_k,
+                        similarity_threshold=0.3,
+                        tenant=tenant
+                    )
             
             if not search_result["success"] or not search_result["results"]:
                 return QuestionAnswerResult(
@@ -288,7 +1168,8 @@ class RAGService:
             for result in search_result["results"]:
                 relevant_texts.append(result["document"])
                 img_id = result["metadata"].get("image_id", "")
-                relevant_images.append(img_id)
+                if img_id not in relevant_images:
+                    relevant_images.append(img_id)
                 
                 sources.append({
                     "image_id": img_id,
@@ -298,8 +1179,17 @@ class RAGService:
                     "confidence": result["metadata"].get("ocr_confidence", 0.0)
                 })
             
+            # Prefer the best-matching OCR lines of the retrieved images over whole chunks
+            with self.metrics.timer("region_search"):
+                regions = await self.region_store.search(
+                    question_embedding[0], relevant_images, top_k, similarity_threshold=0.3
+                )
+            if regions:
+                relevant_texts = [region["text"] for region in regions]
+            
             # Simple answer generation based on retrieved context
-            answer = await self._generate_answer(question, relevant_texts, sources)
+            with self.metrics.timer("answer_generation"):
+                answer = await self._generate_answer(question, relevant_texts, sources)
             
             # Calculate overall confidence
             avg_similarity = sum(s["similarity"] for s in sources) / len(sources)
@@ -308,15 +1198,19 @@ class RAGService:
             
             processing_time = time.time() - start_time
             
-            return QuestionAnswerResult(
+            result = QuestionAnswerResult(
                 question=question,
                 answer=answer,
                 confidence=overall_confidence,
                 relevant_images=relevant_images,
                 sources=sources,
                 processing_time=processing_time,
-                success=True
+                success=True,
+                regions=regions
             )
+            if cache_key is not None:
+                self.result_cache.put(cache_key, result)
+            return result
             
         except Exception as e:
             logger.error(f"Error answering question: {str(e)}")
@@ -330,6 +1224,8 @@ class RAGService:
                 success=False,
                 error_message=str(e)
             )
+        finally:
+            self.metrics.observe("answer_question", time.time() - start_time, "operation")
     
     async def _generate_answer(self, question: str, relevant_texts: List[str], 
                              sources: List[Dict[str, Any]]) -> str:
@@ -394,7 +1290,8 @@ class RAGService:
             return "I encountered an error while generating the answer."
     
     async def search_images(self, query: str, top_k: int = 10, 
-                           similarity_threshold: float = 0.5) -> Dict[str, Any]:
+                           similarity_threshold: float = 0.5, hybrid: Optional[bool] = None,
+                           tenant: Optional[str] = None) -> Dict[str, Any]:
         """
         Search for images based on text query
         
@@ -402,45 +1299,55 @@ class RAGService:
             query: Search query
             top_k: Number of results to return
             similarity_threshold: Minimum similarity threshold
-            
+            hybrid: Fuse BM25 keyword results with vector results (defaults to the service setting)
+            tenant: Tenant (course) partition to search; None uses the shared collection
+
         Returns:
             Dictionary with search results
         """
+        start_time = time.time()
         try:
-            # Create query embedding
-            query_embedding = await self.embedding_service.encode_text(query)
-            
-            # Search in vector database
-            search_result = await self.vector_db_service.search_similar_images(
-                query_embedding=query_embedding[0],
-                n_results=top_k,
-                similarity_threshold=similarity_threshold
-            )
+            self._check_tenant(tenant)
+            await self._require("embedding", "vector_db")
+            
+            use_hybrid = self.hybrid_search if hybrid is None else hybrid
+            
+            cache_key = await self._result_cache_key("search", query, top_k, similarity_threshold, use_hybrid, tenant)
+            if cache_key is not None:
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    return {**cached, "query": query}
+            
+            if use_hybrid:
+                search_result = await self._hybrid_search(query, top_k, similarity_threshold, tenant=tenant)
+            else:
+                # Create query embedding
+                with self.metrics.timer("query_embedding"):
+                    query_embedding = await self.embedding_service.encode_text(query)
+                
+                # Search in vector database
+                with self.metrics.timer("vector_search"):
+                    search_result = await self.vector_db_service.search_similar_images(
+                        query_embedding=query_embedding[0],
+                        n_results=top_k,
+                        similarity_threshold=similarity_threshold,
+                        tenant=tenant
+                    )
             
             if not search_result["success"]:
                 return search_result
             
-            # Enhance results with metadata
-            enhanced_results = []
-            for result in search_result["results"]:
-                img_id = result["metadata"].get("image_id", "")
-                enhanced_result = {
-                    "image_id": img_id,
-                    "filename": result["metadata"].get("filename", ""),
-                    "similarity": result["similarity"],
-                    "matched_text": result["document"],
-                    "ocr_confidence": result["metadata"].get("ocr_confidence", 0.0),
-                    "detected_language": result["metadata"].get("detected_language", ""),
-                    "upload_timestamp": result["metadata"].get("upload_timestamp", "")
-                }
-                enhanced_results.append(enhanced_result)
+            enhanced_results = self._format_search_results(search_result["results"])
             
-            return {
+            result = {
                 "success": True,
                 "results": enhanced_results,
                 "total_results": len(enhanced_results),
                 "query": query
             }
+            if cache_key is not None:
+                self.result_cache.put(cache_key, result)
+            return result
             
         except Exception as e:
             logger.error(f"Error searching images: {str(e)}")
@@ -450,6 +1357,212 @@ class RAGService:
                 "results": [],
                 "total_results": 0
             }
+        finally:
+            self.metrics.observe("search_images", time.time() - start_time, "operation")
+    
+    async def search_images_batch(self, queries: List[Dict[str, Any]],
+                                  hybrid: Optional[bool] = None, tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run several searches with one embedding forward pass and one vector DB query
+        
+        Args:
+            queries: Items with "id", "query", "top_k" and "threshold"
+            hybrid: Fuse BM25 keyword results with vector results (defaults to the service setting)
+            tenant: Tenant (course) partition every query searches
+
+        Returns:
+            Dictionary with results keyed by query id
+        """
+        try:
+            self._check_tenant(tenant)
+            await self._require("embedding", "vector_db")
+            
+            if not queries:
+                return {"success": True, "results": {}, "total_queries": 0}
+            
+            use_hybrid = self.hybrid_search if hybrid is None else hybrid
+            texts = [item["query"] for item in queries]
+            top_ks = [item.get("top_k", 10) for item in queries]
+            thresholds = [item.get("threshold", 0.5) for item in queries]
+            
+            if use_hybrid:
+                n_candidates = max(top_ks) * 3
+                lexical_task = asyncio.gather(*[
+                    self.lexical_index.search(text, n_candidates, tenant=tenant) for text in texts
+                ])
+                query_embeddings = await self.embedding_service.encode_text(texts)
+                vector_result = await self.vector_db_service.search_vectors_batch(
+                    query_embeddings, n_candidates, tenant=tenant
+                )
+                lexical_results = await lexical_task
+                
+                if not vector_result["success"]:
+                    return vector_result
+                
+                per_query = await asyncio.gather(*[
+                    self._fuse_results(embedding, vector_hits, lexical_result, top_k, threshold, tenant=tenant)
+                    for embedding, vector_hits, lexical_result, top_k, threshold in zip(
+                        query_embeddings, vector_result["results"], lexical_results, top_ks, thresholds
+                    )
+                ])
+            else:
+                query_embeddings = await self.embedding_service.encode_text(texts)
+                search_result = await self.vector_db_service.search_similar_images_batch(
+                    query_embeddings=query_embeddings,
+                    n_results=top_ks,
+                    similarity_thresholds=thresholds,
+                    tenant=tenant
+                )
+                
+                if not search_result["success"]:
+                    return search_result
+                per_query = search_result["results"]
+            
+            return {
+                "success": True,
+                "results": {
+                    item["id"]: self._format_search_results(results)
+                    for item, results in zip(queries, per_query)
+                },
+                "total_queries": len(queries)
+            }
+            
+        except Exception as e:
+            logger.error(f"Error in batch search: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "results": {},
+                "total_queries": 0
+            }
+    
+    @staticmethod
+    def _format_search_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Enhance vector DB results with image metadata"""
+        enhanced_results = []
+        for result in results:
+            metadata = result["metadata"] or {}
+            enhanced_results.append({
+                "image_id": metadata.get("image_id", ""),
+                "filename": metadata.get("filename", ""),
+                "similarity": result["similarity"],
+                "matched_text": result["document"],
+                "ocr_confidence": metadata.get("ocr_confidence", 0.0),
+                "detected_language": metadata.get("detected_language", ""),
+                "upload_timestamp": metadata.get("upload_timestamp", ""),
+                "fusion_score": result.get("fusion_score"),
+                "retrievers": result.get("retrievers", ["vector"]),
+                "document_id": metadata.get("document_id") or None,
+                "page_number": metadata.get("page_number") or None
+            })
+        return enhanced_results
+    
+    async def _hybrid_search(self, query: str, top_k: int, similarity_threshold: float,
+                             over_fetch: int = 3, tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Vector + BM25 retrieval fused with reciprocal-rank fusion
+        
+        Both retrievers run concurrently over chunks; see _fuse_results.
+        
+        Args:
+            query: Search query
+            top_k: Number of images to return
+            similarity_threshold: Minimum similarity for vector-only hits
+            over_fetch: Chunks fetched per requested image from each retriever
+            tenant: Tenant partition both retrievers search
+
+        Returns:
+            Dictionary with fused results, one per image
+        """
+        n_candidates = top_k * max(1, over_fetch)
+        
+        # Keyword search needs no embedding, so it runs while the query is encoded and searched
+        lexical_task = asyncio.create_task(
+            self.metrics.track("lexical_search", self.lexical_index.search(query, n_candidates, tenant=tenant))
+        )
+        with self.metrics.timer("query_embedding"):
+            query_embedding = (await self.embedding_service.encode_text(query))[0]
+        with self.metrics.timer("vector_search"):
+            vector_result = await self.vector_db_service.search_vectors(query_embedding, n_candidates, tenant=tenant)
+        lexical_result = await lexical_task
+        
+        if not vector_result["success"] and not lexical_result["success"]:
+            return vector_result
+        
+        with self.metrics.timer("fusion"):
+            results = await self._fuse_results(
+                query_embedding, vector_result.get("results", []), lexical_result, top_k, similarity_threshold,
+                tenant=tenant
+            )
+        
+        return {
+            "success": True,
+            "results": results,
+            "total_results": len(results),
+            "similarity_threshold": similarity_threshold
+        }
+    
+    async def _fuse_results(self, query_embedding: np.ndarray, vector_hits: List[Dict[str, Any]],
+                            lexical_result: Dict[str, Any], top_k: int, similarity_threshold: float,
+                            rrf_k: int = 60, tenant: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Fuse vector and keyword chunk rankings with reciprocal-rank fusion
+        
+        A chunk is kept if it clears the similarity threshold or matched
+        lexically, so exact codes with low cosine similarity still surface.
+        Chunks are then collapsed to images.
+        
+        Args:
+            query_embedding: Query embedding
+            vector_hits: Vector search results, best first
+            lexical_result: Result of LexicalIndexService.search
+            top_k: Number of images to return
+            similarity_threshold: Minimum similarity for vector-only hits
+            rrf_k: RRF rank offset
+            tenant: Tenant partition holding the lexical-only chunks
+
+        Returns:
+            Fused results, one per image
+        """
+        candidates: Dict[str, Dict[str, Any]] = {}
+        for rank, result in enumerate(vector_hits):
+            candidates[result["id"]] = {
+                **result,
+                "fusion_score": 1.0 / (rrf_k + rank + 1),
+                "retrievers": ["vector"]
+            }
+        
+        lexical_only = []
+        for rank, result in enumerate(lexical_result.get("results", [])):
+            score = 1.0 / (rrf_k + rank + 1)
+            if result["id"] in candidates:
+                candidates[result["id"]]["fusion_score"] += score
+                candidates[result["id"]]["retrievers"].append("lexical")
+            else:
+                lexical_only.append((result["id"], score))
+        
+        # Lexical-only chunks need their text, metadata and an exact similarity
+        if lexical_only:
+            fetched = await self.vector_db_service.get_vectors(
+                [vector_id for vector_id, _ in lexical_only], include_embeddings=True, tenant=tenant
+            )
+            scores = dict(lexical_only)
+            for result in fetched.get("results", []):
+                candidates[result["id"]] = {
+                    "id": result["id"],
+                    "document": result["document"],
+                    "metadata": result["metadata"],
+                    "similarity": float(np.dot(result["embedding"], query_embedding)),
+                    "fusion_score": scores[result["id"]],
+                    "retrievers": ["lexical"]
+                }
+        
+        fused = [
+            result for result in candidates.values()
+            if result["similarity"] >= similarity_threshold or "lexical" in result["retrievers"]
+        ]
+        fused.sort(key=lambda result: result["fusion_score"], reverse=True)
+        return VectorDBService.collapse_by_image(fused, top_k)
     
     async def get_image_info(self, image_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -462,26 +1575,34 @@ class RAGService:
             Dictionary with image information or None if not found
         """
         try:
-            if image_id in self.image_metadata:
-                return self.image_metadata[image_id]
-            else:
-                return None
+            return await self.metadata_store.get(image_id)
         except Exception as e:
             logger.error(f"Error getting image info: {str(e)}")
             return None
     
-    async def list_images(self) -> List[Dict[str, Any]]:
+    async def list_images(self, limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
         """
-        List all uploaded images
+        List uploaded images, newest first, one page at a time
         
+        Args:
+            limit: Page size
+            cursor: Cursor returned with the previous page
+            
         Returns:
-            List of image metadata
+            Dictionary with "images", "next_cursor" and "total_count"
+        
+        Raises:
+            ValueError: If the cursor is malformed
         """
         try:
-            return list(self.image_metadata.values())
+            page = await self.metadata_store.list(limit=limit, cursor=cursor)
+            page["total_count"] = await self.metadata_store.count()
+            return page
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"Error listing images: {str(e)}")
-            return []
+            return {"images": [], "next_cursor": None, "total_count": 0}
     
     async def delete_image(self, image_id: str) -> Dict[str, Any]:
         """
@@ -493,48 +1614,165 @@ class RAGService:
         Returns:
             Dictionary with deletion results
         """
+        result = await self.delete_images([image_id])
+        if not result["success"]:
+            return result
+        if not result["deleted_count"]:
+            return {
+                "success": False,
+                "error": "Image not found"
+            }
+        
+        return {
+            "success": True,
+            "message": f"Image {image_id} deleted successfully"
+        }
+    
+    async def delete_images(self, image_ids: List[str]) -> Dict[str, Any]:
+        """
+        Delete many images and their associated data with one call per store
+        
+        Args:
+            image_ids: Image IDs to delete; a document ID also deletes its pages
+            
+        Returns:
+            Dictionary with the deleted IDs, the IDs not found and the bytes of upload files removed
+        """
         try:
-            # Get image info
-            image_info = await self.get_image_info(image_id)
-            if not image_info:
-                return {
-                    "success": False,
-                    "error": "Image not found"
-                }
+            await self._require("vector_db")
+            
+            records = await self.metadata_store.get_many(image_ids)
+            not_found = [image_id for image_id in dict.fromkeys(image_ids) if image_id not in records]
+            
+            # A document is deleted together with all of its pages
+            page_ids = [page_id for record in records.values() for page_id in record.get("page_ids", [])]
+            records.update(await self.metadata_store.get_many([page_id for page_id in page_ids if page_id not in records]))
+            deleted_ids = list(records)
             
-            # Delete file
-            file_path = image_info.get("file_path", "")
-            if file_path and os.path.exists(file_path):
-                FileUtils.delete_file(file_path)
+            # Delete files (pages share their document's file, so they have none of their own)
+            bytes_reclaimed = 0
+            for record in records.values():
+                file_path = record.get("file_path", "")
+                if file_path and os.path.exists(file_path):
+                    file_size = os.path.getsize(file_path)
+                    if FileUtils.delete_file(file_path):
+                        bytes_reclaimed += file_size
             
-            # Delete from vector database
-            await self.vector_db_service.delete_vectors([f"img_{image_id}"])
+            # Chunk vector IDs follow from the stored chunk count; older records are deleted by filter
+            vector_ids: Dict[Optional[str], List[str]] = {}
+            for image_id, record in records.items():
+                for chunk_index in range(record.get("chunk_count", 0)):
+                    vector_ids.setdefault(record.get("tenant"), []).append(
+                        VectorDBService.chunk_vector_id(image_id, chunk_index, record["chunk_count"])
+                    )
+            for tenant, tenant_vector_ids in vector_ids.items():
+                await self.vector_db_service.delete_vectors(tenant_vector_ids, tenant=tenant)
+            for image_id, record in records.items():
+                if "chunk_count" not in record and "page_ids" not in record:
+                    await self.vector_db_service.delete_image_vectors(image_id, tenant=record.get("tenant"))
             
-            # Remove from memory
-            if image_id in self.image_metadata:
-                del self.image_metadata[image_id]
+            await self.lexical_index.delete_images(deleted_ids)
+            await self.region_store.delete_many(deleted_ids)
+            await self.metadata_store.delete_many(deleted_ids)
             
             return {
                 "success": True,
-                "message": f"Image {image_id} deleted successfully"
+                "deleted_count": len(deleted_ids),
+                "deleted_ids": deleted_ids,
+                "not_found": not_found,
+                "bytes_reclaimed": bytes_reclaimed
             }
             
         except Exception as e:
-            logger.error(f"Error deleting image: {str(e)}")
+            logger.error(f"Error deleting images: {str(e)}")
             return {
                 "success": False,
                 "error": str(e)
             }
     
+    async def get_health(self, refresh: bool = False) -> Dict[str, Any]:
+        """
+        Last deep health report, without running inference on the caller's request
+        
+        Args:
+            refresh: Run a deep check now instead of serving the scheduled one
+        
+        Returns:
+            Health report with its age and per-component check latency stats
+        """
+        return await self.health_monitor.get(refresh=refresh)
+    
+    def get_metrics(self) -> str:
+        """
+        Stage latency histograms and queue-depth gauges in the Prometheus text format
+        
+        Gauges are sampled now: the backlog of every service's thread pool,
+        the OCR worker pool's in-flight images and the embedding micro-batch queue.
+        
+        Returns:
+            Exposition text
+        """
+        ocr, embedding, vector_db = self.ocr_service, self.embedding_service, self.vector_db_service
+        executors = {
+            "ocr": ocr.executor if ocr else None,
+            "ocr_tiles": ocr.tile_executor if ocr else None,
+            "embedding": embedding.executor if embedding else None,
+            "vector_db": vector_db.executor if vector_db else None,
+            "metadata_store": self.metadata_store.executor,
+            "hash_cache": self.hash_cache.executor,
+            "lexical_index": self.lexical_index.executor,
+            "region_store": self.region_store.executor,
+            "job_queue": self.job_queue.executor,
+            # Page rendering, perceptual hashing and the orphan sweep use the loop's default pool
+            "default": getattr(asyncio.get_event_loop(), "_default_executor", None)
+        }
+        gauges = MetricsService.executor_gauges(executors)
+        
+        if ocr is not None and ocr.worker_pool is not None:
+            pool_stats = ocr.worker_pool.get_stats()
+            gauges.append({
+                "name": "rag_img_ocr_pool_images",
+                "help": "Images held by the OCR worker pool",
+                "label": "state",
+                "values": {"in_flight": pool_stats["in_flight"], "queued": pool_stats["queue_depth"]}
+            })
+        if embedding is not None and embedding.batcher is not None and embedding.batcher.queue is not None:
+            gauges.append({
+                "name": "rag_img_embedding_batch_queue_depth",
+                "help": "Encode requests waiting for the next embedding micro-batch",
+                "values": {"": embedding.batcher.queue.qsize()}
+            })
+        return self.metrics.render(gauges)
+    
+    async def _check_component(self, name: str) -> Dict[str, Any]:
+        """Deep-check one component, bounded by health_check_timeout"""
+        component = getattr(self, self.COMPONENTS[name])
+        if component is None:
+            # Components still loading report their load status
+            return {"status": self.component_status[name]["status"]}
+        
+        start_time = time.time()
+        try:
+            health = await asyncio.wait_for(component.health_check(), timeout=self.health_check_timeout)
+        except asyncio.TimeoutError:
+            health = {"status": "unhealthy", "error": f"Health check timed out after {self.health_check_timeout}s"}
+        health["check_time"] = time.time() - start_time
+        return health
+    
     async def health_check(self) -> Dict[str, Any]:
-        """Perform health check on all services"""
+        """
+        Perform a deep health check on all services
+        
+        Runs OCR and embedding inference and a vector search; probes should
+        use get_health, which serves the result of the scheduled check.
+        """
         try:
             start_time = time.time()
             
-            # Check individual services
-            ocr_health = await self.ocr_service.health_check()
-            embedding_health = await self.embedding_service.health_check()
-            vector_db_health = await self.vector_db_service.health_check()
+            # Check individual services concurrently
+            ocr_health, embedding_health, vector_db_health = await asyncio.gather(
+                *[self._check_component(name) for name in self.COMPONENTS]
+            )
             
             # Check file system
             upload_dir_exists = os.path.exists(self.upload_dir)
@@ -557,7 +1795,17 @@ class RAGService:
                 "upload_dir": self.upload_dir,
                 "upload_dir_exists": upload_dir_exists,
                 "upload_dir_writable": upload_dir_writable,
-                "total_images": len(self.image_metadata),
+                "total_images": await self.metadata_store.count(),
+                "hash_cache": self.hash_cache.get_stats(),
+                "result_cache": self.result_cache.get_stats() if self.result_cache else None,
+                "regions": await self.region_store.get_stats(),
+                "query_embedding_cache": (
+                    self.embedding_service.cache.get_stats()
+                    if self.embedding_service is not None and self.embedding_service.cache else None
+                ),
+                "components": self.component_status,
+                "job_queue": await self.job_queue.get_stats(),
+                "reconciler": self.reconciler.last_report,
                 "services": {
                     "ocr": ocr_health,
                     "embedding": embedding_health,
@@ -570,6 +1818,5 @@ class RAGService:
             return {
                 "status": "unhealthy",
                 "error": str(e),
-                "upload_dir": self.upload_dir,
-                "total_images": len(self.image_metadata)
+                "upload_dir": self.upload_dir
             } 
\ No newline at end of file
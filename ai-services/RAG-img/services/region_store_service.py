@@ -0,0 +1,340 @@
+import sqlite3
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
+from dataclasses import dataclass, replace
+import logging
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.utils import LRUCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RegionSet:
+    """
+    OCR text blocks of one image, grouped into lines, as flat arrays
+
+    Block i covers text[block_offsets[i]:block_offsets[i + 1]] and line j
+    covers blocks line_starts[j]:line_starts[j + 1], in reading order.
+    Boxes are axis-aligned (x0, y0, x1, y1) in original image pixels.
+    """
+    width: int
+    height: int
+    text: str
+    block_offsets: np.ndarray      # int32, (blocks + 1,)
+    block_boxes: np.ndarray        # float32, (blocks, 4)
+    block_confidences: np.ndarray  # float32, (blocks,)
+    line_starts: np.ndarray        # int32, (lines + 1,)
+    embeddings: Optional[np.ndarray] = None  # float16, (lines, dim)
+
+    @property
+    def line_count(self) -> int:
+        return len(self.line_starts) - 1
+
+    def line_text(self, line: int) -> str:
+        """Text of one line, its blocks joined by spaces"""
+        first, last = self.line_starts[line], self.line_starts[line + 1]
+        return " ".join(
+            self.text[self.block_offsets[block]:self.block_offsets[block + 1]] for block in range(first, last)
+        )
+
+    def line_texts(self) -> List[str]:
+        return [self.line_text(line) for line in range(self.line_count)]
+
+    def line_box(self, line: int) -> List[float]:
+        """Union of the boxes of one line's blocks"""
+        boxes = self.block_boxes[self.line_starts[line]:self.line_starts[line + 1]]
+        return [float(boxes[:, 0].min()), float(boxes[:, 1].min()), float(boxes[:, 2].max()), float(boxes[:, 3].max())]
+
+    def line_confidence(self, line: int) -> float:
+        return float(self.block_confidences[self.line_starts[line]:self.line_starts[line + 1]].mean())
+
+    @classmethod
+    def from_blocks(cls, text_blocks: List[Dict[str, Any]], dimensions: Tuple[int, int]) -> Optional["RegionSet"]:
+        """
+        Build a region set from OCRService text blocks
+
+        Blocks are ordered into rows of median block height and each row
+        becomes one line, so a line is what a reader would see as one
+        line of a slide or page.
+
+        Args:
+            text_blocks: Blocks with "text", "bbox" (four corner points) and "confidence"
+            dimensions: (width, height) of the image the boxes refer to
+
+        Returns:
+            RegionSet, or None if there are no blocks
+        """
+        if not text_blocks:
+            return None
+
+        corners = np.asarray([block["bbox"] for block in text_blocks], dtype=np.float32).reshape(len(text_blocks), -1, 2)
+        boxes = np.concatenate([corners.min(axis=1), corners.max(axis=1)], axis=1)
+        heights = np.maximum(boxes[:, 3] - boxes[:, 1], 1.0)
+        rows = ((boxes[:, 1] + boxes[:, 3]) / 2 // float(np.median(heights))).astype(np.int64)
+        order = np.lexsort((boxes[:, 0], rows))
+
+        texts = [text_blocks[i]["text"] for i in order]
+        block_offsets = np.zeros(len(texts) + 1, dtype=np.int32)
+        block_offsets[1:] = np.cumsum([len(text) for text in texts])
+        sorted_rows = rows[order]
+        line_starts = np.concatenate([[0], np.flatnonzero(np.diff(sorted_rows)) + 1, [len(order)]]).astype(np.int32)
+
+        return cls(
+            width=int(dimensions[0]),
+            height=int(dimensions[1]),
+            text="".join(texts),
+            block_offsets=block_offsets,
+            block_boxes=boxes[order],
+            block_confidences=np.asarray([text_blocks[i]["confidence"] for i in order], dtype=np.float32),
+            line_starts=line_starts
+        )
+
+    def scaled(self, dimensions: Tuple[int, int]) -> "RegionSet":
+        """Copy with boxes mapped onto an image of another size (e.g. a resized near-duplicate)"""
+        width, height = int(dimensions[0]), int(dimensions[1])
+        if not (self.width and self.height and width and height) or (width, height) == (self.width, self.height):
+            return replace(self, width=width or self.width, height=height or self.height)
+        scale = np.asarray([width / self.width, height / self.height] * 2, dtype=np.float32)
+        return replace(self, width=width, height=height, block_boxes=self.block_boxes * scale)
+
+
+class RegionStoreService:
+    """
+    Per-image store of OCR text regions and their line embeddings
+
+    Each image is one SQLite row of packed arrays, so a region set loads
+    with a handful of np.frombuffer calls. Line embeddings are stored as
+    float16. Recently used sets are kept decoded in an LRU cache, which
+    makes scoring the regions of the images a question retrieved a
+    single in-memory matrix product per image.
+    """
+
+    def __init__(self, db_path: str = "cache/regions.db", cache_size: int = 256):
+        """
+        Initialize region store
+
+        Args:
+            db_path: Path to the SQLite database file
+            cache_size: Number of decoded region sets kept in memory
+        """
+        self.db_path = db_path
+        self.connection = None
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.cache = LRUCache(max_size=cache_size)
+
+        self._initialize_db()
+
+    def _initialize_db(self):
+        """Create the regions table if needed"""
+        try:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS regions (
+                    image_id TEXT PRIMARY KEY,
+                    width INTEGER NOT NULL,
+                    height INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    block_offsets BLOB NOT NULL,
+                    block_boxes BLOB NOT NULL,
+                    block_confidences BLOB NOT NULL,
+                    line_starts BLOB NOT NULL,
+                    dim INTEGER NOT NULL,
+                    embeddings BLOB
+                )
+                """
+            )
+            self.connection.commit()
+            logger.info(f"Region store initialized at: {self.db_path}")
+        except Exception as e:
+            logger.error(f"Failed to initialize region store: {str(e)}")
+            raise
+
+    async def _run(self, func, *args):
+        """Run a synchronous store operation on the executor"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    @staticmethod
+    def _to_row(image_id: str, regions: RegionSet) -> Tuple[Any, ...]:
+        embeddings = regions.embeddings
+        return (
+            image_id,
+            regions.width,
+            regions.height,
+            regions.text,
+            np.ascontiguousarray(regions.block_offsets, dtype=np.int32).tobytes(),
+            np.ascontiguousarray(regions.block_boxes, dtype=np.float32).tobytes(),
+            np.ascontiguousarray(regions.block_confidences, dtype=np.float32).tobytes(),
+            np.ascontiguousarray(regions.line_starts, dtype=np.int32).tobytes(),
+            embeddings.shape[1] if embeddings is not None else 0,
+            np.ascontiguousarray(embeddings, dtype=np.float16).tobytes() if embeddings is not None else None
+        )
+
+    @staticmethod
+    def _from_row(row: Tuple[Any, ...]) -> RegionSet:
+        width, height, text, block_offsets, block_boxes, block_confidences, line_starts, dim, embeddings = row
+        line_starts = np.frombuffer(line_starts, dtype=np.int32)
+        return RegionSet(
+            width=width,
+            height=height,
+            text=text,
+            block_offsets=np.frombuffer(block_offsets, dtype=np.int32),
+            block_boxes=np.frombuffer(block_boxes, dtype=np.float32).reshape(-1, 4),
+            block_confidences=np.frombuffer(block_confidences, dtype=np.float32),
+            line_starts=line_starts,
+            embeddings=np.frombuffer(embeddings, dtype=np.float16).reshape(len(line_starts) - 1, dim) if dim else None
+        )
+
+    def _put_many_sync(self, records: Dict[str, RegionSet]) -> int:
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO regions (image_id, width, height, text, block_offsets, block_boxes, "
+                "block_confidences, line_starts, dim, embeddings) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [self._to_row(image_id, regions) for image_id, regions in records.items()]
+            )
+        for image_id, regions in records.items():
+            self.cache.put(image_id, regions)
+        return len(records)
+
+    async def put_many(self, records: Dict[str, RegionSet]) -> int:
+        """Store the region sets of several images"""
+        if not records:
+            return 0
+        try:
+            return await self._run(self._put_many_sync, records)
+        except Exception as e:
+            logger.error(f"Error storing regions: {str(e)}")
+            return 0
+
+    def _get_many_sync(self, image_ids: List[str]) -> Dict[str, RegionSet]:
+        found = {}
+        missing = []
+        for image_id in image_ids:
+            regions = self.cache.get(image_id)
+            if regions is not None:
+                found[image_id] = regions
+            else:
+                missing.append(image_id)
+
+        if missing:
+            with self.lock:
+                rows = self.connection.execute(
+                    "SELECT image_id, width, height, text, block_offsets, block_boxes, block_confidences, "
+                    f"line_starts, dim, embeddings FROM regions WHERE image_id IN ({','.join('?' * len(missing))})",
+                    missing
+                ).fetchall()
+            for row in rows:
+                regions = self._from_row(row[1:])
+                self.cache.put(row[0], regions)
+                found[row[0]] = regions
+        return found
+
+    async def get_many(self, image_ids: List[str]) -> Dict[str, RegionSet]:
+        """Region sets of the given images; images without regions are left out"""
+        if not image_ids:
+            return {}
+        return await self._run(self._get_many_sync, list(dict.fromkeys(image_ids)))
+
+    def _delete_many_sync(self, image_ids: List[str]) -> int:
+        with self.lock, self.connection:
+            cursor = self.connection.executemany(
+                "DELETE FROM regions WHERE image_id = ?", [(image_id,) for image_id in image_ids]
+            )
+        # Cached sets may belong to deleted images; dropping them all is cheaper than tracking
+        self.cache.clear()
+        return cursor.rowcount
+
+    async def delete_many(self, image_ids: List[str]) -> int:
+        """Delete the region sets of several images; returns the number removed"""
+        if not image_ids:
+            return 0
+        return await self._run(self._delete_many_sync, image_ids)
+
+    def _search_sync(self, query_embedding: np.ndarray, image_ids: List[str], top_k: int,
+                     similarity_threshold: float) -> List[Dict[str, Any]]:
+        region_sets = self._get_many_sync(list(dict.fromkeys(image_ids)))
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        candidates = []
+        for image_id, regions in region_sets.items():
+            if regions.embeddings is None or not regions.line_count:
+                continue
+            matrix = regions.embeddings.astype(np.float32)
+            scores = matrix @ query / np.clip(np.linalg.norm(matrix, axis=1), 1e-12, None)
+            for line in np.argsort(-scores)[:top_k]:
+                if scores[line] < similarity_threshold:
+                    break
+                candidates.append((float(scores[line]), image_id, int(line)))
+
+        candidates.sort(reverse=True)
+        return [
+            {
+                "image_id": image_id,
+                "line": line,
+                "text": region_sets[image_id].line_text(line),
+                "bbox": region_sets[image_id].line_box(line),
+                "confidence": region_sets[image_id].line_confidence(line),
+                "similarity": similarity
+            }
+            for similarity, image_id, line in candidates[:top_k]
+        ]
+
+    async def search(self, query_embedding: np.ndarray, image_ids: List[str],
+                     top_k: int = 5, similarity_threshold: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        Best-matching lines among the regions of the given images
+
+        Args:
+            query_embedding: Query embedding
+            image_ids: Images to search, typically those retrieved for a question
+            top_k: Number of regions to return
+            similarity_threshold: Minimum cosine similarity of a returned region
+
+        Returns:
+            Regions with "image_id", "line", "text", "bbox", "confidence" and "similarity", best first
+        """
+        if not image_ids:
+            return []
+        try:
+            return await self._run(self._search_sync, query_embedding, image_ids, top_k, similarity_threshold)
+        except Exception as e:
+            logger.error(f"Error searching regions: {str(e)}")
+            return []
+
+    def _count_sync(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM regions").fetchone()[0]
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Number of images with regions and decoded-set cache statistics"""
+        return {
+            "images": await self._run(self._count_sync),
+            "cache": self.cache.get_stats()
+        }
+
+    def __del__(self):
+        """Cleanup when service is destroyed"""
+        try:
+            if hasattr(self, 'executor'):
+                self.executor.shutdown(wait=True)
+            if getattr(self, 'connection', None) is not None:
+                self.connection.close()
+        except:
+            pass
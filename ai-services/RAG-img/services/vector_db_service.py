@@ -1,47 +1,85 @@
-import chromadb
-from chromadb.config import Settings
 import numpy as np
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, Sequence
 import logging
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
+import threading
 import time
 import os
 import json
 import uuid
 import sys
+from collections import OrderedDict
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.utils import TextUtils
+from utils.utils import TextUtils, ValidationUtils
+from services.vector_snapshot import VectorSnapshot
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class CollectionHandle:
+    """An open Chroma collection of one partition and its exact-search snapshot, if any"""
+    
+    def __init__(self, name: str, collection):
+        self.name = name
+        self.collection = collection
+        self.snapshot: Optional[VectorSnapshot] = None
+
+
 class VectorDBService:
-    """Service for vector database operations using ChromaDB"""
+    """
+    Service for vector database operations using ChromaDB
     
-    def __init__(self, db_path: str = "chroma_db", collection_name: str = "image_texts"):
+    Vectors are partitioned by tenant (a course): each tenant has its own
+    collection, created on first write, so a query only scans the vectors
+    of its own course. Calls without a tenant use the shared default
+    collection. Handles of recently used tenant collections are kept open
+    in an LRU of at most max_open_collections entries.
+    """
+    
+    # Chroma's limit for SQLite-backed clients that do not report one
+    DEFAULT_MAX_BATCH_SIZE = 5461
+    TENANT_SEPARATOR = "__"
+    
+    def __init__(self, db_path: str = "chroma_db", collection_name: str = "image_texts",
+                 snapshot_max_vectors: int = 0, max_open_collections: int = 64):
         """
         Initialize vector database service
         
         Args:
             db_path: Path to ChromaDB database
-            collection_name: Name of the collection to use
+            collection_name: Name of the default collection; tenant collections are named
+                {collection_name}__{tenant}
+            snapshot_max_vectors: Serve queries from an exact memory-mapped snapshot while a
+                collection holds at most this many vectors; 0 disables the snapshot
+            max_open_collections: Number of tenant collection handles kept open
         """
         self.db_path = db_path
         self.collection_name = collection_name
+        self.snapshot_max_vectors = snapshot_max_vectors
+        self.max_open_collections = max(1, max_open_collections)
         self.client = None
-        self.collection = None
+        self.default_handle: Optional[CollectionHandle] = None
+        self.handles: OrderedDict = OrderedDict()
+        self.handles_lock = threading.RLock()
+        self.handle_stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self.load_timings: Dict[str, float] = {}
         self.executor = ThreadPoolExecutor(max_workers=2)
         
         # Initialize ChromaDB
         self._initialize_db()
     
     def _initialize_db(self):
-        """Initialize ChromaDB client and collection"""
+        """Initialize ChromaDB client and the default collection"""
         try:
             logger.info(f"Initializing ChromaDB at path: {self.db_path}")
+            start_time = time.time()
+            # Imported lazily so modules using only the static helpers stay cheap to import
+            import chromadb
+            from chromadb.config import Settings
+            self.load_timings["import"] = time.time() - start_time
             
             # Create directory if it doesn't exist
             os.makedirs(self.db_path, exist_ok=True)
@@ -56,18 +94,199 @@ class VectorDBService:
             )
             
             # Get or create collection
-            self.collection = self.client.get_or_create_collection(
-                name=self.collection_name,
-                metadata={"hnsw:space": "cosine"}
+            self.default_handle = CollectionHandle(
+                self.collection_name,
+                self.client.get_or_create_collection(
+                    name=self.collection_name,
+                    metadata={"hnsw:space": "cosine"}
+                )
             )
             
-            logger.info(f"ChromaDB initialized successfully. Collection: {self.collection_name}")
+            self.load_timings["load"] = time.time() - start_time - self.load_timings["import"]
+            logger.info(
+                f"ChromaDB initialized successfully. Collection: {self.collection_name} "
+                f"(import {self.load_timings['import']:.2f}s, load {self.load_timings['load']:.2f}s)"
+            )
         except Exception as e:
             logger.error(f"Failed to initialize ChromaDB: {str(e)}")
             raise
+        
+        if self.snapshot_max_vectors > 0:
+            self._initialize_snapshot(self.default_handle)
+    
+    def tenant_collection_name(self, tenant: Optional[str]) -> str:
+        """
+        Collection holding a tenant's vectors
+        
+        Raises:
+            ValueError: If the tenant name is not a valid partition name
+        """
+        if tenant is None:
+            return self.collection_name
+        validation_result = ValidationUtils.validate_tenant(tenant)
+        if not validation_result["is_valid"]:
+            raise ValueError("; ".join(validation_result["errors"]))
+        return f"{self.collection_name}{self.TENANT_SEPARATOR}{tenant}"
+    
+    def _handle(self, tenant: Optional[str], create: bool = False) -> Optional[CollectionHandle]:
+        """
+        Open handle of a tenant's collection
+        
+        Args:
+            tenant: Tenant name, or None for the default collection
+            create: Create the collection if it does not exist yet (writes)
+            
+        Returns:
+            The handle, or None if the tenant has no collection and create is False
+        """
+        if tenant is None:
+            return self.default_handle
+        name = self.tenant_collection_name(tenant)
+        
+        with self.handles_lock:
+            handle = self.handles.get(name)
+            if handle is not None:
+                self.handles.move_to_end(name)
+                self.handle_stats["hits"] += 1
+                return handle
+            
+            self.handle_stats["misses"] += 1
+            if create:
+                collection = self.client.get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"})
+            else:
+                try:
+                    collection = self.client.get_collection(name=name)
+                except Exception:
+                    # Reads of a tenant that never wrote anything must not create its collection
+                    return None
+            
+            handle = CollectionHandle(name, collection)
+            if self.snapshot_max_vectors > 0:
+                self._initialize_snapshot(handle)
+            self.handles[name] = handle
+            while len(self.handles) > self.max_open_collections:
+                self.handles.popitem(last=False)
+                self.handle_stats["evictions"] += 1
+            return handle
+    
+    def _list_tenants_sync(self) -> List[Optional[str]]:
+        prefix = self.collection_name + self.TENANT_SEPARATOR
+        names = [getattr(collection, "name", collection) for collection in self.client.list_collections()]
+        return [None] + sorted(name[len(prefix):] for name in names if name.startswith(prefix))
+    
+    async def list_tenants(self) -> List[Optional[str]]:
+        """
+        Tenants that have a collection, starting with None for the default collection
+        
+        Returns:
+            List of tenant names
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, self._list_tenants_sync)
+    
+    def _initialize_snapshot(self, handle: CollectionHandle):
+        """Map a collection's exact-search snapshot, exporting it if missing or stale"""
+        try:
+            snapshot = VectorSnapshot(os.path.join(self.db_path, "snapshots", handle.name))
+            total = handle.collection.count()
+            if total > self.snapshot_max_vectors:
+                logger.info(f"Collection {handle.name} has {total} vectors; exact snapshot search disabled")
+                snapshot.remove()
+                return
+            
+            start_time = time.time()
+            if snapshot.load() and snapshot.count == total:
+                logger.info(f"Vector snapshot mapped in {time.time() - start_time:.3f}s ({total} vectors)")
+            else:
+                self._export_snapshot_sync(handle, snapshot)
+                logger.info(f"Vector snapshot exported in {time.time() - start_time:.3f}s ({total} vectors)")
+            handle.snapshot = snapshot
+        except Exception as e:
+            logger.error(f"Failed to initialize vector snapshot: {str(e)}")
+            handle.snapshot = None
+    
+    def _export_snapshot_sync(self, handle: CollectionHandle, snapshot: VectorSnapshot) -> int:
+        """Copy a whole collection into a snapshot, page by page"""
+        ids, documents, metadatas, embeddings = [], [], [], []
+        page_size = self.max_batch_size
+        offset = 0
+        while True:
+            page = handle.collection.get(
+                include=['documents', 'metadatas', 'embeddings'],
+                limit=page_size,
+                offset=offset
+            )
+            if not page['ids']:
+                break
+            ids.extend(page['ids'])
+            documents.extend(page['documents'])
+            metadatas.extend(page['metadatas'])
+            embeddings.append(np.asarray(page['embeddings'], dtype=np.float32))
+            offset += len(page['ids'])
+        
+        snapshot.write(ids, documents, metadatas, np.vstack(embeddings) if embeddings else np.zeros((0, 0)))
+        return len(ids)
+    
+    async def export_snapshot(self, tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Rebuild the exact-search snapshot from a collection
+        
+        Args:
+            tenant: Tenant whose collection is exported (default collection if None)
+            
+        Returns:
+            Dictionary with operation results
+        """
+        try:
+            loop = asyncio.get_event_loop()
+            handle = await loop.run_in_executor(self.executor, self._handle, tenant, True)
+            snapshot = handle.snapshot or VectorSnapshot(os.path.join(self.db_path, "snapshots", handle.name))
+            exported = await loop.run_in_executor(self.executor, self._export_snapshot_sync, handle, snapshot)
+            handle.snapshot = snapshot
+            return {"success": True, "exported_count": exported}
+        except Exception as e:
+            logger.error(f"Error exporting vector snapshot: {str(e)}")
+            return {"success": False, "error": str(e), "exported_count": 0}
+    
+    def _use_snapshot(self, handle: CollectionHandle, where: Optional[Dict[str, Any]]) -> bool:
+        """Whether a query can be answered exactly from the collection's snapshot"""
+        if handle.snapshot is None or handle.snapshot.count > self.snapshot_max_vectors:
+            return False
+        # Only flat equality filters are evaluated locally
+        return not where or all(
+            not key.startswith("$") and isinstance(value, (str, int, float, bool))
+            for key, value in where.items()
+        )
+    
+    def _after_write(self, handle: CollectionHandle, method: str, *args):
+        """
+        Apply a write to the collection's snapshot
+        
+        On snapshot failure searches fall back to Chroma rather than serve stale results.
+        A snapshot that outgrows snapshot_max_vectors is dropped along with its files,
+        so later writes do not keep rewriting a sidecar no search reads.
+        """
+        if handle.snapshot is None:
+            return
+        try:
+            getattr(handle.snapshot, method)(*args)
+        except Exception as e:
+            logger.error(f"Vector snapshot update failed, disabling snapshot search: {str(e)}")
+            handle.snapshot = None
+            return
+        
+        snapshot = handle.snapshot
+        if snapshot.count > self.snapshot_max_vectors:
+            logger.info(f"Collection {handle.name} has {snapshot.count} vectors; exact snapshot search disabled")
+            handle.snapshot = None
+            try:
+                snapshot.remove()
+            except Exception as e:
+                logger.error(f"Error removing vector snapshot: {str(e)}")
     
     def _add_vectors_sync(self, texts: List[str], embeddings: List[np.ndarray], 
-                          metadatas: List[Dict[str, Any]], ids: Optional[List[str]] = None) -> Dict[str, Any]:
+                          metadatas: List[Dict[str, Any]], ids: Optional[List[str]] = None,
+                          tenant: Optional[str] = None) -> Dict[str, Any]:
         """
         Synchronous vector addition
         
@@ -76,6 +295,7 @@ class VectorDBService:
             embeddings: List of embeddings
             metadatas: List of metadata dictionaries
             ids: Optional list of IDs (will be generated if not provided)
+            tenant: Tenant partition to write to (default collection if None)
             
         Returns:
             Dictionary with operation results
@@ -90,14 +310,17 @@ class VectorDBService:
             
             # Convert embeddings to list format
             embeddings_list = [embedding.tolist() for embedding in embeddings]
-            
+            metadatas = [self._clean_metadata(metadata) for metadata in metadatas]
+
             # Add to collection
-            self.collection.add(
+            handle = self._handle(tenant, create=True)
+            handle.collection.add(
                 documents=texts,
                 embeddings=embeddings_list,
                 metadatas=metadatas,
                 ids=ids
             )
+            self._after_write(handle, "upsert", ids, texts, metadatas, np.asarray(embeddings_list))
             
             return {
                 "success": True,
@@ -114,7 +337,8 @@ class VectorDBService:
             }
     
     async def add_vectors(self, texts: List[str], embeddings: List[np.ndarray], 
-                          metadatas: List[Dict[str, Any]], ids: Optional[List[str]] = None) -> Dict[str, Any]:
+                          metadatas: List[Dict[str, Any]], ids: Optional[List[str]] = None,
+                          tenant: Optional[str] = None) -> Dict[str, Any]:
         """
         Asynchronous vector addition
         
@@ -123,6 +347,7 @@ class VectorDBService:
             embeddings: List of embeddings
             metadatas: List of metadata dictionaries
             ids: Optional list of IDs
+            tenant: Tenant partition to write to (default collection if None)
             
         Returns:
             Dictionary with operation results
@@ -135,7 +360,8 @@ class VectorDBService:
                 texts,
                 embeddings,
                 metadatas,
-                ids
+                ids,
+                tenant
             )
             return result
         except Exception as e:
@@ -146,55 +372,228 @@ class VectorDBService:
                 "added_count": 0
             }
     
-    def _search_vectors_sync(self, query_embedding: np.ndarray, n_results: int = 10, 
-                            where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    @property
+    def max_batch_size(self) -> int:
+        """Largest number of records Chroma accepts in one write"""
+        return getattr(self.client, "max_batch_size", None) or self.DEFAULT_MAX_BATCH_SIZE
+    
+    @staticmethod
+    def _metadata_value(value: Any) -> Any:
+        """Coerce one metadata value to a type Chroma accepts (str, int, float or bool)"""
+        if isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, (str, bool, int, float)):
+            return value
+        if isinstance(value, (tuple, list, np.ndarray)):
+            items = value.tolist() if isinstance(value, np.ndarray) else list(value)
+            if items and all(isinstance(item, (int, float)) and not isinstance(item, bool) for item in items):
+                # Dimensions (width, height) become "WxH"
+                return "x".join(str(item) for item in items)
+        return json.dumps(value, default=str)
+    
+    @classmethod
+    def _clean_metadata(cls, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Drop None values and coerce the rest to valid Chroma metadata values"""
+        return {key: cls._metadata_value(value) for key, value in metadata.items() if value is not None}
+    
+    @classmethod
+    def _metadata_rows(cls, metadata: Dict[str, Sequence[Any]], count: int) -> List[Dict[str, Any]]:
+        """Turn columnar metadata into one valid Chroma metadata dict per row"""
+        columns = {}
+        for key, values in metadata.items():
+            values = values.tolist() if isinstance(values, np.ndarray) else list(values)
+            if len(values) != count:
+                raise ValueError(f"Metadata column '{key}' has {len(values)} values, expected {count}")
+            columns[key] = values
+        return [cls._clean_metadata({key: values[i] for key, values in columns.items()}) for i in range(count)]
+    
+    def _upsert_vectors_sync(self, ids: List[str], texts: List[str], embeddings: np.ndarray,
+                             metadata: Dict[str, Sequence[Any]], tenant: Optional[str] = None) -> Dict[str, Any]:
         """
-        Synchronous vector search
+        Synchronous bulk upsert
         
         Args:
-            query_embedding: Query embedding
-            n_results: Number of results to return
+            ids: Vector IDs
+            texts: Documents aligned with ids
+            embeddings: 2-D float32 matrix, one row per ID
+            metadata: Metadata columns, each aligned with ids
+            tenant: Tenant partition to write to (default collection if None)
+            
+        Returns:
+            Dictionary with operation results
+        """
+        try:
+            matrix = np.asarray(embeddings, dtype=np.float32)
+            if matrix.ndim != 2 or matrix.shape[0] != len(ids) or len(texts) != len(ids):
+                return {"success": False, "error": "ids, texts and embedding rows must align", "upserted_count": 0}
+            if not ids:
+                return {"success": True, "upserted_count": 0, "batches": 0, "ids": []}
+            
+            metadatas = self._metadata_rows(metadata, len(ids))
+            handle = self._handle(tenant, create=True)
+            batch_size = self.max_batch_size
+            batches = 0
+            for start in range(0, len(ids), batch_size):
+                end = start + batch_size
+                handle.collection.upsert(
+                    ids=ids[start:end],
+                    documents=texts[start:end],
+                    # One C-level conversion per batch instead of one per row
+                    embeddings=matrix[start:end].tolist(),
+                    metadatas=metadatas[start:end]
+                )
+                batches += 1
+            
+            self._after_write(handle, "upsert", ids, texts, metadatas, matrix)
+            
+            return {
+                "success": True,
+                "upserted_count": len(ids),
+                "batches": batches,
+                "ids": ids
+            }
+            
+        except Exception as e:
+            logger.error(f"Error upserting vectors: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "upserted_count": 0
+            }
+    
+    async def upsert_vectors(self, ids: List[str], texts: List[str], embeddings: np.ndarray,
+                             metadata: Optional[Dict[str, Sequence[Any]]] = None,
+                             tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Insert or replace many vectors, written in Chroma's maximum batch size
+        
+        Args:
+            ids: Vector IDs
+            texts: Documents aligned with ids
+            embeddings: 2-D float32 matrix, one row per ID
+            metadata: Optional metadata columns (name -> values aligned with ids)
+            tenant: Tenant partition to write to (default collection if None)
+            
+        Returns:
+            Dictionary with operation results
+        """
+        try:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(
+                self.executor,
+                self._upsert_vectors_sync,
+                list(ids),
+                list(texts),
+                embeddings,
+                metadata or {},
+                tenant
+            )
+        except Exception as e:
+            logger.error(f"Error in async vector upsert: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "upserted_count": 0
+            }
+    
+    async def upsert_image_vectors(self, image_ids: List[str], texts: List[str], embeddings: np.ndarray,
+                                   metadata: Optional[Dict[str, Sequence[Any]]] = None,
+                                   tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Bulk upsert of one vector per image under its img_{id} key
+        
+        Intended for backfills and re-indexing: existing vectors of the
+        given images are replaced in place.
+        
+        Args:
+            image_ids: Unique image identifiers
+            texts: Extracted texts aligned with image_ids
+            embeddings: 2-D float32 matrix, one row per image
+            metadata: Optional metadata columns aligned with image_ids
+            tenant: Tenant partition to write to (default collection if None)
+            
+        Returns:
+            Dictionary with operation results
+        """
+        now = time.time()
+        columns = {
+            "image_id": list(image_ids),
+            "text_length": [len(text) for text in texts],
+            "timestamp": [now] * len(image_ids),
+            **(metadata or {})
+        }
+        return await self.upsert_vectors(
+            ids=[f"img_{image_id}" for image_id in image_ids],
+            texts=texts,
+            embeddings=embeddings,
+            metadata=columns,
+            tenant=tenant
+        )
+    
+    def _search_vectors_batch_sync(self, query_embeddings: np.ndarray, n_results: int = 10,
+                                   where: Optional[Dict[str, Any]] = None,
+                                   tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Synchronous multi-query vector search in a single Chroma query
+        
+        Args:
+            query_embeddings: 2-D matrix, one query embedding per row
+            n_results: Number of results to return per query
             where: Optional filter conditions
+            tenant: Tenant partition to search (default collection if None)
             
         Returns:
-            Dictionary with search results
+            Dictionary with per-query result lists and a (queries x n_results)
+            similarity matrix padded with -inf where a query has fewer results
         """
         try:
-            # Convert embedding to list format
-            query_embedding_list = query_embedding.tolist()
+            matrix = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+            
+            handle = self._handle(tenant)
+            if handle is None:
+                # A tenant that never wrote anything has nothing to find
+                return self._format_snapshot_results([[] for _ in range(len(matrix))])
+            if self._use_snapshot(handle, where):
+                return self._format_snapshot_results(handle.snapshot.search(matrix, n_results, where))
             
             # Search in collection
-            results = self.collection.query(
-                query_embeddings=[query_embedding_list],
+            results = handle.collection.query(
+                query_embeddings=matrix.tolist(),
                 n_results=n_results,
                 where=where,
                 include=['documents', 'metadatas', 'distances']
             )
             
-            # Process results
-            documents = results.get('documents', [[]])[0]
-            metadatas = results.get('metadatas', [[]])[0]
-            distances = results.get('distances', [[]])[0]
-            ids = results.get('ids', [[]])[0]
+            all_documents = results.get('documents') or [[] for _ in range(len(matrix))]
+            all_metadatas = results.get('metadatas') or [[] for _ in range(len(matrix))]
+            all_distances = results.get('distances') or [[] for _ in range(len(matrix))]
+            all_ids = results.get('ids') or [[] for _ in range(len(matrix))]
             
             # Convert distances to similarities (ChromaDB uses distance, we want similarity)
-            similarities = [1 - distance for distance in distances]
+            width = max((len(distances) for distances in all_distances), default=0)
+            similarities = np.full((len(matrix), width), -np.inf, dtype=np.float32)
+            for row, distances in enumerate(all_distances):
+                similarities[row, :len(distances)] = 1 - np.asarray(distances, dtype=np.float32)
             
             # Format results
             formatted_results = []
-            for i, (doc, metadata, similarity, doc_id) in enumerate(zip(documents, metadatas, similarities, ids)):
-                formatted_results.append({
-                    "id": doc_id,
-                    "document": doc,
-                    "metadata": metadata,
-                    "similarity": similarity,
-                    "rank": i + 1
-                })
+            for row, (documents, metadatas, ids) in enumerate(zip(all_documents, all_metadatas, all_ids)):
+                formatted_results.append([
+                    {
+                        "id": doc_id,
+                        "document": doc,
+                        "metadata": metadata,
+                        "similarity": float(similarities[row, i]),
+                        "rank": i + 1
+                    }
+                    for i, (doc, metadata, doc_id) in enumerate(zip(documents, metadatas, ids))
+                ])
             
             return {
                 "success": True,
                 "results": formatted_results,
-                "total_results": len(formatted_results)
+                "similarities": similarities,
+                "total_queries": len(matrix)
             }
             
         except Exception as e:
@@ -203,11 +602,54 @@ class VectorDBService:
                 "success": False,
                 "error": str(e),
                 "results": [],
-                "total_results": 0
+                "total_queries": 0
             }
     
+    @staticmethod
+    def _format_snapshot_results(per_query: List[List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Shape snapshot hits like _search_vectors_batch_sync results"""
+        width = max((len(hits) for hits in per_query), default=0)
+        similarities = np.full((len(per_query), width), -np.inf, dtype=np.float32)
+        for row, hits in enumerate(per_query):
+            for i, hit in enumerate(hits):
+                hit["rank"] = i + 1
+                similarities[row, i] = hit["similarity"]
+        return {
+            "success": True,
+            "results": per_query,
+            "similarities": similarities,
+            "total_queries": len(per_query)
+        }
+    
+    def _search_vectors_sync(self, query_embedding: np.ndarray, n_results: int = 10, 
+                            where: Optional[Dict[str, Any]] = None,
+                            tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Synchronous vector search
+        
+        Args:
+            query_embedding: Query embedding
+            n_results: Number of results to return
+            where: Optional filter conditions
+            tenant: Tenant partition to search (default collection if None)
+            
+        Returns:
+            Dictionary with search results
+        """
+        batch = self._search_vectors_batch_sync(query_embedding, n_results, where, tenant)
+        if not batch["success"]:
+            return {**batch, "total_results": 0}
+        
+        formatted_results = batch["results"][0] if batch["results"] else []
+        return {
+            "success": True,
+            "results": formatted_results,
+            "total_results": len(formatted_results)
+        }
+    
     async def search_vectors(self, query_embedding: np.ndarray, n_results: int = 10, 
-                            where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+                            where: Optional[Dict[str, Any]] = None,
+                            tenant: Optional[str] = None) -> Dict[str, Any]:
         """
         Asynchronous vector search
         
@@ -215,6 +657,7 @@ class VectorDBService:
             query_embedding: Query embedding
             n_results: Number of results to return
             where: Optional filter conditions
+            tenant: Tenant partition to search (default collection if None)
             
         Returns:
             Dictionary with search results
@@ -226,7 +669,8 @@ class VectorDBService:
                 self._search_vectors_sync,
                 query_embedding,
                 n_results,
-                where
+                where,
+                tenant
             )
             return result
         except Exception as e:
@@ -238,12 +682,172 @@ class VectorDBService:
                 "total_results": 0
             }
     
-    def _delete_vectors_sync(self, ids: List[str]) -> Dict[str, Any]:
+    async def search_vectors_batch(self, query_embeddings: np.ndarray, n_results: int = 10,
+                                   where: Optional[Dict[str, Any]] = None,
+                                   tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Asynchronous multi-query vector search
+        
+        Args:
+            query_embeddings: 2-D matrix, one query embedding per row
+            n_results: Number of results to return per query
+            where: Optional filter conditions
+            tenant: Tenant partition to search (default collection if None)
+            
+        Returns:
+            Dictionary with per-query result lists and their similarity matrix
+        """
+        try:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(
+                self.executor,
+                self._search_vectors_batch_sync,
+                query_embeddings,
+                n_results,
+                where,
+                tenant
+            )
+        except Exception as e:
+            logger.error(f"Error in async batch vector search: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "results": [],
+                "total_queries": 0
+            }
+    
+    def _get_vectors_sync(self, ids: List[str], include_embeddings: bool = False,
+                          tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Synchronous vector retrieval by ID
+        
+        Args:
+            ids: Vector IDs
+            include_embeddings: Whether to return the stored embeddings
+            tenant: Tenant partition holding the vectors (default collection if None)
+            
+        Returns:
+            Dictionary with the found vectors
+        """
+        try:
+            handle = self._handle(tenant)
+            if not ids or handle is None:
+                return {"success": True, "results": [], "total_results": 0}
+            
+            include = ['documents', 'metadatas'] + (['embeddings'] if include_embeddings else [])
+            results = handle.collection.get(ids=ids, include=include)
+            
+            embeddings = results.get('embeddings') if include_embeddings else None
+            formatted_results = []
+            for i, doc_id in enumerate(results.get('ids', [])):
+                formatted_results.append({
+                    "id": doc_id,
+                    "document": results['documents'][i],
+                    "metadata": results['metadatas'][i],
+                    "embedding": np.asarray(embeddings[i], dtype=np.float32) if embeddings is not None else None
+                })
+            
+            return {
+                "success": True,
+                "results": formatted_results,
+                "total_results": len(formatted_results)
+            }
+            
+        except Exception as e:
+            logger.error(f"Error getting vectors: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "results": [],
+                "total_results": 0
+            }
+    
+    async def get_vectors(self, ids: List[str], include_embeddings: bool = False,
+                          tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Asynchronous vector retrieval by ID
+        
+        Args:
+            ids: Vector IDs
+            include_embeddings: Whether to return the stored embeddings
+            tenant: Tenant partition holding the vectors (default collection if None)
+            
+        Returns:
+            Dictionary with the found vectors
+        """
+        try:
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(
+                self.executor,
+                self._get_vectors_sync,
+                ids,
+                include_embeddings,
+                tenant
+            )
+            return result
+        except Exception as e:
+            logger.error(f"Error in async vector retrieval: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "results": [],
+                "total_results": 0
+            }
+    
+    def _list_vectors_page_sync(self, offset: int, limit: int, tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Synchronous retrieval of one page of a collection, without embeddings
+        
+        Args:
+            offset: Number of vectors to skip
+            limit: Page size
+            tenant: Tenant partition to list (default collection if None)
+            
+        Returns:
+            Dictionary with "ids", "documents" and "metadatas" of the page
+        """
+        try:
+            handle = self._handle(tenant)
+            if handle is None:
+                return {"success": True, "ids": [], "documents": [], "metadatas": []}
+            page = handle.collection.get(include=['documents', 'metadatas'], limit=limit, offset=offset)
+            return {
+                "success": True,
+                "ids": page['ids'],
+                "documents": page['documents'],
+                "metadatas": page['metadatas']
+            }
+        except Exception as e:
+            logger.error(f"Error listing vectors: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "ids": []
+            }
+    
+    async def list_vectors_page(self, offset: int = 0, limit: int = 1000,
+                                tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Asynchronous retrieval of one page of a collection, for sweeps over every vector
+        
+        Args:
+            offset: Number of vectors to skip
+            limit: Page size
+            tenant: Tenant partition to list (default collection if None)
+            
+        Returns:
+            Dictionary with "ids", "documents" and "metadatas" of the page
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, self._list_vectors_page_sync, offset, limit, tenant)
+    
+    def _delete_vectors_sync(self, ids: List[str], tenant: Optional[str] = None) -> Dict[str, Any]:
         """
         Synchronous vector deletion
         
         Args:
             ids: List of IDs to delete
+            tenant: Tenant partition holding the vectors (default collection if None)
             
         Returns:
             Dictionary with operation results
@@ -252,8 +856,13 @@ class VectorDBService:
             if not ids:
                 return {"success": False, "error": "No IDs provided"}
             
-            # Delete from collection
-            self.collection.delete(ids=ids)
+            # Delete from collection, within Chroma's batch limit
+            handle = self._handle(tenant)
+            if handle is not None:
+                batch_size = self.max_batch_size
+                for start in range(0, len(ids), batch_size):
+                    handle.collection.delete(ids=ids[start:start + batch_size])
+                self._after_write(handle, "delete", ids)
             
             return {
                 "success": True,
@@ -269,12 +878,13 @@ class VectorDBService:
                 "deleted_count": 0
             }
     
-    async def delete_vectors(self, ids: List[str]) -> Dict[str, Any]:
+    async def delete_vectors(self, ids: List[str], tenant: Optional[str] = None) -> Dict[str, Any]:
         """
         Asynchronous vector deletion
         
         Args:
             ids: List of IDs to delete
+            tenant: Tenant partition holding the vectors (default collection if None)
             
         Returns:
             Dictionary with operation results
@@ -284,7 +894,8 @@ class VectorDBService:
             result = await loop.run_in_executor(
                 self.executor,
                 self._delete_vectors_sync,
-                ids
+                ids,
+                tenant
             )
             return result
         except Exception as e:
@@ -295,23 +906,35 @@ class VectorDBService:
                 "deleted_count": 0
             }
     
-    def _get_collection_info_sync(self) -> Dict[str, Any]:
+    def _get_collection_info_sync(self, tenant: Optional[str] = None) -> Dict[str, Any]:
         """
         Synchronous collection information retrieval
         
+        Args:
+            tenant: Tenant partition to describe (default collection if None)
+            
         Returns:
             Dictionary with collection information
         """
         try:
+            handle = self._handle(tenant)
+            if handle is None:
+                return {
+                    "success": True,
+                    "collection_name": self.tenant_collection_name(tenant),
+                    "total_vectors": 0,
+                    "metadata": None
+                }
+            
             # Get collection count
-            count = self.collection.count()
+            count = handle.collection.count()
             
             # Get collection metadata
-            metadata = self.collection.metadata
+            metadata = handle.collection.metadata
             
             return {
                 "success": True,
-                "collection_name": self.collection_name,
+                "collection_name": handle.name,
                 "total_vectors": count,
                 "metadata": metadata
             }
@@ -324,10 +947,13 @@ class VectorDBService:
                 "total_vectors": 0
             }
     
-    async def get_collection_info(self) -> Dict[str, Any]:
+    async def get_collection_info(self, tenant: Optional[str] = None) -> Dict[str, Any]:
         """
         Asynchronous collection information retrieval
         
+        Args:
+            tenant: Tenant partition to describe (default collection if None)
+            
         Returns:
             Dictionary with collection information
         """
@@ -335,7 +961,8 @@ class VectorDBService:
             loop = asyncio.get_event_loop()
             result = await loop.run_in_executor(
                 self.executor,
-                self._get_collection_info_sync
+                self._get_collection_info_sync,
+                tenant
             )
             return result
         except Exception as e:
@@ -346,8 +973,135 @@ class VectorDBService:
                 "total_vectors": 0
             }
     
+    @staticmethod
+    def chunk_vector_id(image_id: str, chunk_index: int, chunk_count: int) -> str:
+        """Vector ID of an image chunk; single-chunk images keep the plain img_{id} key"""
+        if chunk_count <= 1:
+            return f"img_{image_id}"
+        return f"img_{image_id}_c{chunk_index}"
+    
+    @staticmethod
+    def image_id_from_vector_id(vector_id: str) -> str:
+        """Inverse of chunk_vector_id"""
+        image_id = vector_id[len("img_"):] if vector_id.startswith("img_") else vector_id
+        head, separator, tail = image_id.rpartition("_c")
+        return head if separator and tail.isdigit() else image_id
+    
+    async def add_image_chunks(self, image_ids: List[str], chunk_texts: List[List[str]],
+                               chunk_embeddings: List[np.ndarray],
+                               metadatas: List[Dict[str, Any]],
+                               tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Add the text chunks of several images, one vector per chunk, in one call
+        
+        Args:
+            image_ids: Unique image identifiers
+            chunk_texts: Chunk texts of each image
+            chunk_embeddings: Embedding matrix (one row per chunk) of each image
+            metadatas: Image-level metadata, copied onto every chunk
+            tenant: Tenant partition to write to (default collection if None)
+            
+        Returns:
+            Dictionary with operation results
+        """
+        try:
+            texts, ids, full_metadatas = [], [], []
+            now = time.time()
+            for image_id, chunks, metadata in zip(image_ids, chunk_texts, metadatas):
+                for chunk_index, chunk in enumerate(chunks):
+                    texts.append(chunk)
+                    ids.append(self.chunk_vector_id(image_id, chunk_index, len(chunks)))
+                    full_metadatas.append({
+                        "image_id": image_id,
+                        "text_length": len(chunk),
+                        "timestamp": now,
+                        **metadata,
+                        "chunk_index": chunk_index,
+                        "chunk_count": len(chunks)
+                    })
+            
+            if not ids:
+                return {"success": False, "error": "Empty texts or embeddings", "added_count": 0}
+            
+            # Metadata keys can differ between images; missing values are None, which rows drop
+            keys = list(dict.fromkeys(key for row in full_metadatas for key in row))
+            columns = {key: [row.get(key) for row in full_metadatas] for key in keys}
+            matrix = np.vstack([np.atleast_2d(m)[:len(c)] for m, c in zip(chunk_embeddings, chunk_texts) if len(c)])
+            
+            result = await self.upsert_vectors(ids=ids, texts=texts, embeddings=matrix, metadata=columns, tenant=tenant)
+            result["added_count"] = result.get("upserted_count", 0)
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error adding image chunks: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "added_count": 0
+            }
+    
+    def _delete_where_sync(self, where: Dict[str, Any], tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Synchronous deletion of all vectors matching a metadata filter
+        
+        Args:
+            where: Metadata filter
+            tenant: Tenant partition to delete from (default collection if None)
+            
+        Returns:
+            Dictionary with operation results
+        """
+        try:
+            handle = self._handle(tenant)
+            ids = handle.collection.get(where=where, include=[]).get("ids", []) if handle is not None else []
+            if ids:
+                handle.collection.delete(ids=ids)
+                self._after_write(handle, "delete", ids)
+            
+            return {
+                "success": True,
+                "deleted_count": len(ids),
+                "deleted_ids": ids
+            }
+            
+        except Exception as e:
+            logger.error(f"Error deleting vectors: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "deleted_count": 0
+            }
+    
+    async def delete_image_vectors(self, image_id: str, tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Delete every chunk vector of an image
+        
+        Args:
+            image_id: Image ID
+            tenant: Tenant partition holding the image (default collection if None)
+            
+        Returns:
+            Dictionary with operation results
+        """
+        try:
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(
+                self.executor,
+                self._delete_where_sync,
+                {"image_id": image_id},
+                tenant
+            )
+            return result
+        except Exception as e:
+            logger.error(f"Error in async image vector deletion: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "deleted_count": 0
+            }
+    
     async def add_image_text(self, image_id: str, text: str, embedding: np.ndarray, 
-                            metadata: Dict[str, Any]) -> Dict[str, Any]:
+                            metadata: Dict[str, Any], tenant: Optional[str] = None) -> Dict[str, Any]:
         """
         Add image text and embedding to vector database
         
@@ -356,53 +1110,104 @@ class VectorDBService:
             text: Extracted text from image
             embedding: Text embedding
             metadata: Additional metadata
+            tenant: Tenant partition to write to (default collection if None)
+            
+        Returns:
+            Dictionary with operation results
+        """
+        return await self.add_image_texts([image_id], [text], [embedding], [metadata], tenant=tenant)
+    
+    async def add_image_texts(self, image_ids: List[str], texts: List[str], embeddings: List[np.ndarray],
+                              metadatas: List[Dict[str, Any]], tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Add several image texts and embeddings to vector database in one call
+        
+        Args:
+            image_ids: Unique image identifiers
+            texts: Extracted texts aligned with image_ids
+            embeddings: Text embeddings aligned with image_ids
+            metadatas: Additional metadata aligned with image_ids
+            tenant: Tenant partition to write to (default collection if None)
             
         Returns:
             Dictionary with operation results
         """
         try:
             # Prepare metadata
-            full_metadata = {
-                "image_id": image_id,
-                "text_length": len(text),
-                "timestamp": time.time(),
-                **metadata
-            }
+            full_metadatas = []
+            for image_id, text, metadata in zip(image_ids, texts, metadatas):
+                full_metadatas.append({
+                    "image_id": image_id,
+                    "text_length": len(text),
+                    "timestamp": time.time(),
+                    **metadata
+                })
             
             # Add to vector database
-            result = await self.add_vectors(
-                texts=[text],
-                embeddings=[embedding],
-                metadatas=[full_metadata],
-                ids=[f"img_{image_id}"]
+            keys = list(dict.fromkeys(key for row in full_metadatas for key in row))
+            result = await self.upsert_vectors(
+                ids=[f"img_{image_id}" for image_id in image_ids],
+                texts=texts,
+                embeddings=np.vstack(embeddings),
+                metadata={key: [row.get(key, "") for row in full_metadatas] for key in keys},
+                tenant=tenant
             )
+            result["added_count"] = result.get("upserted_count", 0)
             
             return result
             
         except Exception as e:
-            logger.error(f"Error adding image text: {str(e)}")
+            logger.error(f"Error adding image texts: {str(e)}")
             return {
                 "success": False,
                 "error": str(e),
                 "added_count": 0
             }
     
+    @staticmethod
+    def collapse_by_image(results: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+        """
+        Keep the best-scoring chunk of each image
+        
+        Args:
+            results: Chunk-level results sorted by similarity
+            limit: Maximum number of images to return
+            
+        Returns:
+            One result per image, best first, with a matched_chunks count
+        """
+        collapsed: Dict[str, Dict[str, Any]] = {}
+        for result in results:
+            image_id = (result.get("metadata") or {}).get("image_id", result["id"])
+            if image_id in collapsed:
+                collapsed[image_id]["matched_chunks"] += 1
+            else:
+                collapsed[image_id] = {**result, "matched_chunks": 1}
+        
+        images = list(collapsed.values())[:limit]
+        for rank, result in enumerate(images):
+            result["rank"] = rank + 1
+        return images
+    
     async def search_similar_images(self, query_embedding: np.ndarray, n_results: int = 10, 
-                                   similarity_threshold: float = 0.7) -> Dict[str, Any]:
+                                   similarity_threshold: float = 0.7, over_fetch: int = 3,
+                                   tenant: Optional[str] = None) -> Dict[str, Any]:
         """
         Search for similar images based on text content
         
         Args:
             query_embedding: Query embedding
-            n_results: Number of results to return
+            n_results: Number of images to return
             similarity_threshold: Minimum similarity threshold
+            over_fetch: Chunks fetched per requested image, so long images cannot crowd out others
+            tenant: Tenant partition to search (default collection if None)
             
         Returns:
-            Dictionary with search results
+            Dictionary with search results, one per image
         """
         try:
-            # Search vectors
-            search_result = await self.search_vectors(query_embedding, n_results)
+            # Search chunk vectors
+            search_result = await self.search_vectors(query_embedding, n_results * max(1, over_fetch), tenant=tenant)
             
             if not search_result["success"]:
                 return search_result
@@ -413,6 +1218,8 @@ class VectorDBService:
                 if result["similarity"] >= similarity_threshold:
                     filtered_results.append(result)
             
+            filtered_results = self.collapse_by_image(filtered_results, n_results)
+            
             return {
                 "success": True,
                 "results": filtered_results,
@@ -429,42 +1236,105 @@ class VectorDBService:
                 "total_results": 0
             }
     
-    async def health_check(self) -> Dict[str, Any]:
-        """Perform health check on vector database service"""
+    async def search_similar_images_batch(self, query_embeddings: np.ndarray, n_results: Sequence[int],
+                                          similarity_thresholds: Sequence[float],
+                                          over_fetch: int = 3, tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Search for similar images for several queries at once
+        
+        Args:
+            query_embeddings: 2-D matrix, one query embedding per row
+            n_results: Number of images to return for each query
+            similarity_thresholds: Minimum similarity for each query
+            over_fetch: Chunks fetched per requested image
+            tenant: Tenant partition to search (default collection if None)
+            
+        Returns:
+            Dictionary with one result list (one entry per image) per query
+        """
         try:
-            start_time = time.time()
+            limits = [max(1, int(n)) for n in n_results]
+            search_result = await self.search_vectors_batch(
+                query_embeddings, max(limits) * max(1, over_fetch), tenant=tenant
+            )
             
-            # Test basic operations
-            info = await self.get_collection_info()
+            if not search_result["success"]:
+                return search_result
             
-            # Test vector addition and search
-            test_text = "This is a test document"
-            test_embedding = np.random.rand(384)  # Common embedding dimension
-            test_metadata = {"test": True}
+            # Apply every query's threshold to its row of the similarity matrix at once
+            thresholds = np.asarray(similarity_thresholds, dtype=np.float32)[:, None]
+            keep = search_result["similarities"] >= thresholds
             
-            # Add test vector
-            add_result = await self.add_vectors(
-                texts=[test_text],
-                embeddings=[test_embedding],
-                metadatas=[test_metadata],
-                ids=["test_vector"]
-            )
+            results = []
+            for row, (chunk_results, limit) in enumerate(zip(search_result["results"], limits)):
+                filtered = [result for result, kept in zip(chunk_results, keep[row]) if kept]
+                results.append(self.collapse_by_image(filtered, limit))
             
-            # Search test vector
-            search_result = await self.search_vectors(test_embedding, n_results=1)
+            return {
+                "success": True,
+                "results": results,
+                "total_queries": len(results)
+            }
+            
+        except Exception as e:
+            logger.error(f"Error in batch image search: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "results": [],
+                "total_queries": 0
+            }
+    
+    def _probe_sync(self) -> Dict[str, Any]:
+        """
+        Read-only probe of the default collection
+        
+        Searches the index with a stored vector, so the query path is
+        exercised without writing to the live index.
+        
+        Returns:
+            Dictionary with the vector count and whether the search succeeded
+        """
+        collection = self.default_handle.collection
+        total = collection.count()
+        if not total:
+            return {"total_vectors": 0, "search_test_passed": True}
+        
+        sample = collection.get(include=['embeddings'], limit=1)
+        results = collection.query(
+            query_embeddings=[np.asarray(sample['embeddings'][0], dtype=np.float32).tolist()],
+            n_results=1,
+            include=['distances']
+        )
+        return {"total_vectors": total, "search_test_passed": bool(results.get('ids') and results['ids'][0])}
+    
+    async def health_check(self) -> Dict[str, Any]:
+        """Perform a read-only health check on vector database service"""
+        try:
+            start_time = time.time()
             
-            # Clean up test vector
-            await self.delete_vectors(["test_vector"])
+            loop = asyncio.get_event_loop()
+            probe = await loop.run_in_executor(self.executor, self._probe_sync)
             
             test_time = time.time() - start_time
             
             return {
-                "status": "healthy",
+                "status": "healthy" if probe["search_test_passed"] else "unhealthy",
                 "test_time": test_time,
                 "collection_name": self.collection_name,
-                "total_vectors": info.get("total_vectors", 0),
-                "add_test_passed": add_result["success"],
-                "search_test_passed": search_result["success"],
+                "total_vectors": probe["total_vectors"],
+                "search_test_passed": probe["search_test_passed"],
+                "snapshot": {
+                    "enabled": self.default_handle.snapshot is not None,
+                    "vectors": self.default_handle.snapshot.count if self.default_handle.snapshot else 0,
+                    "max_vectors": self.snapshot_max_vectors,
+                    "serving_queries": self._use_snapshot(self.default_handle, None)
+                },
+                "tenant_collections": {
+                    "open": len(self.handles),
+                    "max_open": self.max_open_collections,
+                    **self.handle_stats
+                },
                 "db_path": self.db_path
             }
             
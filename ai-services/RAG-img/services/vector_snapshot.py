@@ -0,0 +1,262 @@
+import numpy as np
+from typing import List, Dict, Any, Optional
+import logging
+import threading
+import json
+import os
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class VectorSnapshot:
+    """
+    Memory-mapped float32 copy of a vector collection for exact search
+
+    Rows live in a raw little-endian float32 file that is opened with
+    np.memmap, so loading costs nothing until pages are touched. IDs,
+    documents and metadata live in a JSON sidecar. Rows are L2-normalized
+    on write, so a dot product equals the cosine similarity Chroma reports.
+
+    Updates are incremental and copy-on-write: new and replaced rows are
+    appended, the rows they replace and deleted rows are tombstoned until
+    more than half the file is dead, and the row lists are rebuilt and
+    swapped in under the lock. A search that started earlier keeps using
+    the lists and mapping it took, whose rows are never written again.
+    The sidecar is rewritten on each update, which is intended for
+    collections of a few thousand vectors with a single writer process.
+    """
+
+    def __init__(self, snapshot_dir: str):
+        """
+        Initialize snapshot
+
+        Args:
+            snapshot_dir: Directory holding the matrix and sidecar files
+        """
+        self.snapshot_dir = snapshot_dir
+        self.matrix_path = os.path.join(snapshot_dir, "embeddings.f32")
+        self.sidecar_path = os.path.join(snapshot_dir, "sidecar.json")
+        self.lock = threading.RLock()
+        self.dim = 0
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.valid = np.zeros(0, dtype=bool)
+        self.index: Dict[str, int] = {}
+        self.matrix: Optional[np.memmap] = None
+
+    @property
+    def count(self) -> int:
+        """Number of live vectors"""
+        return len(self.index)
+
+    @staticmethod
+    def _normalize(embeddings: np.ndarray) -> np.ndarray:
+        matrix = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.clip(norms, 1e-12, None)
+
+    def _open_matrix(self):
+        """(Re)map the matrix file after its size changed"""
+        rows = len(self.ids)
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else None
+
+    def _save_sidecar(self):
+        """Atomically rewrite the sidecar"""
+        tmp_path = self.sidecar_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "dim": self.dim,
+                "ids": self.ids,
+                "documents": self.documents,
+                "metadatas": self.metadatas,
+                "valid": self.valid.tolist()
+            }, f)
+        os.replace(tmp_path, self.sidecar_path)
+
+    def load(self) -> bool:
+        """
+        Map an existing snapshot
+
+        Returns:
+            True if a consistent snapshot was found
+        """
+        with self.lock:
+            try:
+                if not (os.path.exists(self.sidecar_path) and os.path.exists(self.matrix_path)):
+                    return False
+                with open(self.sidecar_path, "r", encoding="utf-8") as f:
+                    sidecar = json.load(f)
+
+                rows = len(sidecar["ids"])
+                if os.path.getsize(self.matrix_path) != rows * sidecar["dim"] * 4:
+                    logger.warning("Vector snapshot matrix does not match its sidecar; ignoring it")
+                    return False
+
+                self.dim = sidecar["dim"]
+                self.ids = sidecar["ids"]
+                self.documents = sidecar["documents"]
+                self.metadatas = sidecar["metadatas"]
+                self.valid = np.asarray(sidecar["valid"], dtype=bool)
+                self.index = {vector_id: row for row, vector_id in enumerate(self.ids) if self.valid[row]}
+                self._open_matrix()
+                return True
+            except Exception as e:
+                logger.error(f"Error loading vector snapshot: {str(e)}")
+                return False
+
+    def write(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]],
+              embeddings: np.ndarray):
+        """
+        Replace the snapshot with the given vectors
+
+        Args:
+            ids: Vector IDs
+            documents: Documents aligned with ids
+            metadatas: Metadata aligned with ids
+            embeddings: 2-D matrix, one row per ID
+        """
+        matrix = self._normalize(embeddings) if len(ids) else np.zeros((0, self.dim), dtype=np.float32)
+        with self.lock:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            # Drop the old mapping before the file underneath it is replaced
+            self.matrix = None
+            tmp_path = self.matrix_path + ".tmp"
+            matrix.tofile(tmp_path)
+            os.replace(tmp_path, self.matrix_path)
+
+            self.dim = matrix.shape[1] if len(ids) else self.dim
+            self.ids = list(ids)
+            self.documents = list(documents)
+            self.metadatas = list(metadatas)
+            self.valid = np.ones(len(ids), dtype=bool)
+            self.index = {vector_id: row for row, vector_id in enumerate(self.ids)}
+            self._save_sidecar()
+            self._open_matrix()
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]],
+               embeddings: np.ndarray):
+        """Append rows, tombstoning the rows of IDs that already exist"""
+        if not ids:
+            return
+        matrix = self._normalize(embeddings)
+        # The last occurrence of a repeated ID wins, as in Chroma
+        latest = list({vector_id: i for i, vector_id in enumerate(ids)}.values())
+        with self.lock:
+            if self.dim == 0:
+                self.dim = matrix.shape[1]
+            if matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match snapshot dimension {self.dim}")
+
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            # Rows already mapped are never rewritten; searches may still be reading them
+            with open(self.matrix_path, "ab") as f:
+                f.write(matrix[latest].tobytes())
+
+            replaced = [self.index[ids[i]] for i in latest if ids[i] in self.index]
+            valid = np.concatenate([self.valid, np.ones(len(latest), dtype=bool)])
+            valid[replaced] = False
+            for offset, i in enumerate(latest):
+                self.index[ids[i]] = len(self.ids) + offset
+
+            self.ids = self.ids + [ids[i] for i in latest]
+            self.documents = self.documents + [documents[i] for i in latest]
+            self.metadatas = self.metadatas + [metadatas[i] for i in latest]
+            self.valid = valid
+            self._open_matrix()
+            if not self._compact():
+                self._save_sidecar()
+
+    def delete(self, ids: List[str]) -> int:
+        """Tombstone rows, compacting once most of the file is dead"""
+        with self.lock:
+            rows = [self.index.pop(vector_id) for vector_id in ids if vector_id in self.index]
+            if not rows:
+                return 0
+            valid = self.valid.copy()
+            valid[rows] = False
+            self.valid = valid
+            if not self._compact():
+                self._save_sidecar()
+            return len(rows)
+
+    def _compact(self) -> bool:
+        """Rewrite the live rows into a new file once most rows are dead"""
+        if self.count >= len(self.ids) / 2:
+            return False
+        live = np.flatnonzero(self.valid)
+        matrix = np.array(self.matrix[live]) if self.matrix is not None else np.zeros((0, self.dim), dtype=np.float32)
+        self.write(
+            [self.ids[row] for row in live],
+            [self.documents[row] for row in live],
+            [self.metadatas[row] for row in live],
+            matrix
+        )
+        return True
+
+    def remove(self):
+        """Forget the snapshot and delete its files"""
+        with self.lock:
+            self.matrix = None
+            self.ids, self.documents, self.metadatas = [], [], []
+            self.valid = np.zeros(0, dtype=bool)
+            self.index = {}
+            for path in (self.sidecar_path, self.matrix_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def search(self, query_embeddings: np.ndarray, n_results: int,
+               where: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Exact top-k by dot product over the whole matrix
+
+        Args:
+            query_embeddings: 2-D matrix, one query per row
+            n_results: Results per query
+            where: Optional flat equality filter on metadata
+
+        Returns:
+            One list of {"id", "document", "metadata", "similarity"} per query, best first
+        """
+        with self.lock:
+            matrix, valid = self.matrix, self.valid
+            ids, documents, metadatas = self.ids, self.documents, self.metadatas
+
+        queries = self._normalize(query_embeddings)
+        if matrix is None:
+            return [[] for _ in range(len(queries))]
+
+        mask = valid
+        if where:
+            mask = valid & np.fromiter(
+                (all(metadata.get(key) == value for key, value in where.items()) for metadata in metadatas),
+                dtype=bool, count=len(metadatas)
+            )
+
+        candidates = int(mask.sum())
+        k = min(n_results, candidates)
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        # One BLAS matrix product scores every row for every query
+        scores = queries @ matrix.T
+        scores[:, ~mask] = -np.inf
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return [
+            [
+                {
+                    "id": ids[row],
+                    "document": documents[row],
+                    "metadata": metadatas[row],
+                    "similarity": float(score)
+                }
+                for row, score in zip(rows, row_scores)
+            ]
+            for rows, row_scores in zip(top, top_scores)
+        ]
@@ -0,0 +1,78 @@
+"""
+Lease-based recovery of ingestion jobs
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.job_queue_service import JobQueueService
+
+
+def make_queue(tmp_path, **kwargs):
+    return JobQueueService(
+        db_path=str(tmp_path / "jobs.db"),
+        spool_dir=str(tmp_path / "spool"),
+        poll_interval=0.05,
+        **kwargs
+    )
+
+
+def test_expired_lease_is_requeued_by_a_live_worker(tmp_path):
+    async def scenario():
+        # A worker that claimed the job and then died without renewing its lease
+        dead = make_queue(tmp_path, lease_timeout=1)
+        submitted = await dead.enqueue("slide.png", b"bytes")
+        claimed = await dead._run(dead._claim_sync)
+        assert claimed["job_id"] == submitted["job_id"]
+
+        live = make_queue(tmp_path, lease_timeout=1)
+        await live.start(lambda job: asyncio.sleep(0, {"success": True, "result": {"attempt": job["attempts"]}}))
+        try:
+            deadline = time.time() + 5
+            while time.time() < deadline:
+                job = await live.get(submitted["job_id"])
+                if job["status"] == "completed":
+                    break
+                await asyncio.sleep(0.1)
+        finally:
+            await live.stop()
+        return job, await dead._run(dead._finish_sync, claimed["job_id"], claimed["attempts"],
+                                    "failed", {}, None, "late")
+
+    job, late_finish = asyncio.run(scenario())
+    assert job["status"] == "completed"
+    assert job["result"] == {"attempt": 2}
+    # The dead claim can no longer overwrite the outcome
+    assert not late_finish
+
+
+def test_running_job_keeps_its_lease(tmp_path):
+    async def scenario():
+        queue = make_queue(tmp_path, lease_timeout=1)
+        submitted = await queue.enqueue("slide.png", b"bytes")
+
+        async def slow(job):
+            await asyncio.sleep(2)
+            return {"success": True, "result": {"attempt": job["attempts"]}}
+
+        await queue.start(slow)
+        try:
+            deadline = time.time() + 5
+            while time.time() < deadline:
+                # Another worker's sweep must not take the job while its lease is renewed
+                await queue._run(queue._recover_sync)
+                job = await queue.get(submitted["job_id"])
+                if job["status"] == "completed":
+                    break
+                await asyncio.sleep(0.1)
+        finally:
+            await queue.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job["status"] == "completed"
+    assert job["attempts"] == 1
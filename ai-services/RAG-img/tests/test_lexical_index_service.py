@@ -0,0 +1,46 @@
+"""
+Tenant partitioning of the BM25 keyword index
+"""
+
+import asyncio
+import os
+import sys
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.lexical_index_service import LexicalIndexService
+from utils.utils import ValidationUtils
+
+
+def test_tenant_names_are_lower_case():
+    assert ValidationUtils.validate_tenant("cs101")["is_valid"]
+    assert not ValidationUtils.validate_tenant("CS101")["is_valid"]
+    with pytest.raises(ValueError):
+        LexicalIndexService.fts_table("CS101")
+
+
+def test_tenants_differing_only_in_case_do_not_share_a_table(tmp_path):
+    db_path = str(tmp_path / "lexical_index.db")
+
+    async def index():
+        service = LexicalIndexService(db_path)
+        lower = await service.add_chunks(["a_0"], ["a"], ["binary search trees"], tenant="cs101")
+        upper = await service.add_chunks(["b_0"], ["b"], ["binary search trees"], tenant="CS101")
+        return lower, upper
+
+    lower, upper = asyncio.run(index())
+    assert lower["success"]
+    assert not upper["success"]
+
+    async def search():
+        # A fresh service (restart or another worker) must find the tenant's table
+        service = LexicalIndexService(db_path)
+        return (
+            await service.search("binary", tenant="cs101"),
+            await service.search("binary", tenant="CS101")
+        )
+
+    lower_results, upper_results = asyncio.run(search())
+    assert [result["image_id"] for result in lower_results["results"]] == ["a"]
+    assert not upper_results["success"]
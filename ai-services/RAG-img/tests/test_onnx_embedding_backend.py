@@ -0,0 +1,48 @@
+"""
+Recall parity of the ONNX embedding backend against sentence-transformers
+"""
+
+import os
+import sys
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("sentence_transformers")
+
+import numpy as np
+
+from benchmark_embeddings import build_default_corpus, recall_at_k
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+TOP_K = 5
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return build_default_corpus()
+
+
+@pytest.fixture(scope="module")
+def reference(corpus):
+    from sentence_transformers import SentenceTransformer
+
+    try:
+        model = SentenceTransformer(MODEL_NAME, device="cpu")
+    except Exception as e:
+        pytest.skip(f"{MODEL_NAME} unavailable: {e}")
+    return np.asarray(model.encode(corpus, normalize_embeddings=True), dtype=np.float32)
+
+
+@pytest.mark.parametrize("quantize", [False, True], ids=["onnx", "onnx-int8"])
+def test_onnx_backend_matches_pytorch(corpus, reference, quantize, tmp_path_factory):
+    from services.onnx_embedding_backend import OnnxEmbeddingBackend
+
+    cache_dir = str(tmp_path_factory.getbasetemp() / "onnx")
+    backend = OnnxEmbeddingBackend(MODEL_NAME, cache_dir=cache_dir, quantize=quantize)
+    candidate = backend.encode(corpus, normalize_embeddings=True)
+
+    assert candidate.shape == reference.shape
+    assert float(np.mean(np.sum(reference * candidate, axis=1))) >= 0.99
+    assert recall_at_k(reference, candidate, np.arange(len(corpus)), TOP_K) >= 0.95
@@ -1,14 +1,19 @@
 import os
+import io
 import uuid
 import hashlib
+import re
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Union
 from PIL import Image
 import cv2
 import numpy as np
 from datetime import datetime
 import json
 import logging
+import threading
+import time
+from collections import OrderedDict
 import aiofiles
 from fastapi import UploadFile
 
@@ -38,27 +43,46 @@ class FileUtils:
         return hash_md5.hexdigest()
     
     @staticmethod
-    async def save_upload_file(upload_file: UploadFile, save_path: str) -> Dict[str, Any]:
-        """Save uploaded file and return metadata"""
+    async def read_upload_file(upload_file: UploadFile, chunk_size: int = 1024 * 1024) -> Dict[str, Any]:
+        """Read uploaded file into memory, hashing it while streaming"""
+        try:
+            hash_md5 = hashlib.md5()
+            buffer = bytearray()
+            while True:
+                chunk = await upload_file.read(chunk_size)
+                if not chunk:
+                    break
+                hash_md5.update(chunk)
+                buffer += chunk
+            
+            return {
+                "success": True,
+                "content": bytes(buffer),
+                "file_size": len(buffer),
+                "file_hash": hash_md5.hexdigest(),
+                "content_type": upload_file.content_type
+            }
+        except Exception as e:
+            logger.error(f"Error reading upload: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    @staticmethod
+    async def write_file(save_path: str, content: bytes) -> Dict[str, Any]:
+        """Write bytes to disk"""
         try:
             # Create directory if it doesn't exist
             os.makedirs(os.path.dirname(save_path), exist_ok=True)
             
-            # Save file
             async with aiofiles.open(save_path, 'wb') as f:
-                content = await upload_file.read()
                 await f.write(content)
             
-            # Get file info
-            file_size = os.path.getsize(save_path)
-            file_hash = FileUtils.get_file_hash(save_path)
-            
             return {
                 "success": True,
                 "file_path": save_path,
-                "file_size": file_size,
-                "file_hash": file_hash,
-                "content_type": upload_file.content_type
+                "file_size": len(content)
             }
         except Exception as e:
             logger.error(f"Error saving file: {str(e)}")
@@ -67,6 +91,25 @@ class FileUtils:
                 "error": str(e)
             }
     
+    @staticmethod
+    async def save_upload_file(upload_file: UploadFile, save_path: str) -> Dict[str, Any]:
+        """Save uploaded file and return metadata"""
+        read_result = await FileUtils.read_upload_file(upload_file)
+        if not read_result["success"]:
+            return read_result
+        
+        write_result = await FileUtils.write_file(save_path, read_result["content"])
+        if not write_result["success"]:
+            return write_result
+        
+        return {
+            "success": True,
+            "file_path": save_path,
+            "file_size": read_result["file_size"],
+            "file_hash": read_result["file_hash"],
+            "content_type": read_result["content_type"]
+        }
+    
     @staticmethod
     def delete_file(file_path: str) -> bool:
         """Delete file safely"""
@@ -84,10 +127,11 @@ class ImageUtils:
     """Utility class for image processing"""
     
     @staticmethod
-    def get_image_dimensions(image_path: str) -> Tuple[int, int]:
-        """Get image dimensions (width, height)"""
+    def get_image_dimensions(image_path: Union[str, bytes]) -> Tuple[int, int]:
+        """Get image dimensions (width, height) from a path or encoded bytes"""
         try:
-            with Image.open(image_path) as img:
+            source = io.BytesIO(image_path) if isinstance(image_path, bytes) else image_path
+            with Image.open(source) as img:
                 return img.size
         except Exception as e:
             logger.error(f"Error getting image dimensions: {str(e)}")
@@ -105,16 +149,32 @@ class ImageUtils:
             return False
     
     @staticmethod
-    def preprocess_image_for_ocr(image_path: str) -> np.ndarray:
-        """Preprocess image for better OCR results"""
+    def decode_image(content: bytes) -> Optional[np.ndarray]:
+        """Decode encoded image bytes into a BGR array without copying the input"""
+        try:
+            buffer = np.frombuffer(memoryview(content), dtype=np.uint8)
+            image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+            if image is not None:
+                return image
+            
+            # OpenCV cannot decode some formats (e.g. GIF); fall back to PIL
+            with Image.open(io.BytesIO(content)) as img:
+                return cv2.cvtColor(np.asarray(img.convert("RGB")), cv2.COLOR_RGB2BGR)
+        except Exception as e:
+            logger.error(f"Error decoding image: {str(e)}")
+            return None
+    
+    @staticmethod
+    def preprocess_image_for_ocr(image_path: Union[str, np.ndarray]) -> np.ndarray:
+        """Preprocess image (path or decoded BGR array) for better OCR results"""
         try:
             # Read image
-            image = cv2.imread(image_path)
+            image = cv2.imread(image_path) if isinstance(image_path, str) else image_path
             if image is None:
                 raise ValueError(f"Could not read image: {image_path}")
             
             # Convert to grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
             
             # Apply Gaussian blur to reduce noise
             blurred = cv2.GaussianBlur(gray, (5, 5), 0)
@@ -133,7 +193,72 @@ class ImageUtils:
         except Exception as e:
             logger.error(f"Error preprocessing image: {str(e)}")
             # Return original image if preprocessing fails
-            return cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+            if isinstance(image_path, str):
+                return cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+            return image_path
+    
+    @staticmethod
+    def dhash(gray: np.ndarray, hash_size: int = 8) -> int:
+        """Difference hash: one bit per horizontally adjacent pixel pair of a (hash_size+1) x hash_size thumbnail"""
+        small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+        bits = np.packbits((small[:, 1:] > small[:, :-1]).flatten())
+        return int.from_bytes(bits.tobytes(), "big")
+    
+    @staticmethod
+    def compute_perceptual_hashes(content: bytes) -> Optional[Dict[str, Any]]:
+        """
+        Perceptual hashes of encoded image bytes
+        
+        Returns a 64-bit dHash for indexing, a 256-bit dHash for verifying
+        candidates, and the aspect ratio. JPEGs are decoded at reduced size,
+        which is far cheaper than a full decode and does not change the hashes.
+        """
+        try:
+            buffer = np.frombuffer(memoryview(content), dtype=np.uint8)
+            gray = cv2.imdecode(buffer, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+            if gray is None or min(gray.shape[:2]) < 17:
+                gray = cv2.imdecode(buffer, cv2.IMREAD_GRAYSCALE)
+            if gray is None:
+                with Image.open(io.BytesIO(content)) as img:
+                    gray = np.asarray(img.convert("L"))
+            
+            height, width = gray.shape[:2]
+            return {
+                "phash": ImageUtils.dhash(gray, 8),
+                "phash_fine": ImageUtils.dhash(gray, 16).to_bytes(32, "big"),
+                "aspect": width / height if height else 0.0
+            }
+        except Exception as e:
+            logger.error(f"Error computing perceptual hash: {str(e)}")
+            return None
+    
+    @staticmethod
+    def compute_tiles(width: int, height: int, tile_size: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+        """Split an image into overlapping tiles, returned as (x, y, width, height)"""
+        def axis_starts(length: int) -> List[int]:
+            if length <= tile_size:
+                return [0]
+            stride = max(1, tile_size - overlap)
+            starts = list(range(0, length - tile_size, stride))
+            # Last tile is flush with the image edge
+            starts.append(length - tile_size)
+            return starts
+        
+        return [
+            (x, y, min(tile_size, width), min(tile_size, height))
+            for y in axis_starts(height)
+            for x in axis_starts(width)
+        ]
+    
+    @staticmethod
+    def resize_array_if_needed(image: np.ndarray, max_size: int = 2048) -> np.ndarray:
+        """Downscale a decoded image so its longer side is at most max_size"""
+        height, width = image.shape[:2]
+        if max(width, height) <= max_size:
+            return image
+        
+        scale = max_size / max(width, height)
+        return cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
     
     @staticmethod
     def resize_image_if_needed(image_path: str, max_size: int = 2048) -> str:
@@ -229,6 +354,66 @@ class TextUtils:
         return [word for word, count in word_freq.most_common(top_k)]
 
 
+class LRUCache:
+    """Thread-safe bounded LRU cache with optional TTL and hit/miss counters"""
+    
+    def __init__(self, max_size: int = 1024, ttl: float = 0):
+        """
+        Initialize cache
+        
+        Args:
+            max_size: Maximum number of entries
+            ttl: Entry lifetime in seconds; 0 keeps entries until evicted
+        """
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self.entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Get a value, refreshing its recency"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and (not self.ttl or time.monotonic() - entry[0] < self.ttl):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return default
+    
+    def put(self, key: Any, value: Any):
+        """Store a value, evicting the least recently used entry if full"""
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+    
+    def clear(self):
+        """Remove all entries"""
+        with self.lock:
+            self.entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get size and hit-rate statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
 class ConfigUtils:
     """Utility class for configuration management"""
     
@@ -255,10 +440,54 @@ class ConfigUtils:
             "ocr_languages": ["vi", "en"],
             "embedding_model": "sentence-transformers/all-MiniLM-L6-v2",
             "vector_db_path": "vector_db",
-            "chunk_size": 500,
-            "chunk_overlap": 50,
+            "chunk_size": 150,
+            "chunk_overlap": 30,
             "similarity_threshold": 0.7,
-            "max_results": 10
+            "max_results": 10,
+            "ingest_batch_size": 16,
+            "ingest_queue_size": 32,
+            "ingest_ocr_concurrency": 2,
+            "hash_cache_path": "cache/content_hashes.db",
+            "ocr_worker_processes": 0,
+            "ocr_max_queue_depth": 32,
+            "ocr_tile_size": 1600,
+            "ocr_tile_overlap": 200,
+            "ocr_tile_threshold": 2400,
+            "ocr_cascade": True,
+            "ocr_cascade_fast_size": 1280,
+            "ocr_cascade_min_confidence": 0.6,
+            "ocr_cascade_min_density": 20.0,
+            "embedding_batch_wait_ms": 5,
+            "embedding_max_batch_size": 32,
+            "embedding_cache_size": 2048,
+            "embedding_cache_ttl": 0,
+            "embedding_backend": "pytorch",
+            "onnx_cache_dir": "cache/onnx",
+            "metadata_db_path": "cache/image_metadata.db",
+            "lexical_index_path": "cache/lexical_index.db",
+            "hybrid_search": True,
+            "job_db_path": "cache/jobs.db",
+            "job_spool_dir": "cache/job_spool",
+            "job_concurrency": 2,
+            "job_max_attempts": 3,
+            "job_retention": 604800,
+            "job_lease_timeout": 120,
+            "vector_snapshot_max_vectors": 5000,
+            "near_duplicate_max_distance": 4,
+            "document_page_concurrency": 2,
+            "document_dpi": 200,
+            "document_max_pages": 500,
+            "result_cache_size": 1024,
+            "result_cache_ttl": 0,
+            "region_index": True,
+            "region_db_path": "cache/regions.db",
+            "reconcile_interval": 3600,
+            "reconcile_min_age": 3600,
+            "reconcile_page_size": 1000,
+            "vector_max_open_collections": 64,
+            "health_check_interval": 30,
+            "health_check_timeout": 10,
+            "workers": 1
         }
     
     @staticmethod
@@ -276,6 +505,10 @@ class ConfigUtils:
 class ValidationUtils:
     """Utility class for validation"""
     
+    # Tenant names become part of a Chroma collection name, which allows 3-63 characters,
+    # and of an SQLite table name, which ignores case; lower case keeps both keys distinct
+    TENANT_PATTERN = re.compile(r"^[a-z0-9](?:[a-z0-9_-]{0,46}[a-z0-9])?$")
+    
     @staticmethod
     def validate_file_size(file_size: int, max_size: int = 10 * 1024 * 1024) -> bool:
         """Validate file size"""
@@ -299,4 +532,40 @@ class ValidationUtils:
         return {
             "is_valid": len(errors) == 0,
             "errors": errors
-        } 
\ No newline at end of file
+        }
+    
+    @classmethod
+    def validate_tenant(cls, tenant: Optional[str]) -> Dict[str, Any]:
+        """Validate a tenant (course) name; None selects the shared default partition"""
+        errors = []
+        if tenant is not None and not cls.TENANT_PATTERN.match(tenant):
+            errors.append(
+                "Tenant must be 1-48 lower-case letters, digits, '-' or '_', "
+                "starting and ending with a letter or digit"
+            )
+        
+        return {
+            "is_valid": len(errors) == 0,
+            "errors": errors
+        }
+    
+    @staticmethod
+    def validate_document_file(file: UploadFile) -> Dict[str, Any]:
+        """Validate uploaded multi-page document (PDF or TIFF)"""
+        errors = []
+        
+        # Check content type
+        supported_types = {'application/pdf', 'image/tiff', 'application/octet-stream'}
+        if file.content_type and file.content_type not in supported_types:
+            errors.append(f"Unsupported content type: {file.content_type}")
+        
+        # Check file extension
+        file_ext = Path(file.filename or "").suffix.lower()
+        supported_formats = {'.pdf', '.tif', '.tiff'}
+        if file_ext not in supported_formats:
+            errors.append(f"Unsupported document format: {file_ext}")
+        
+        return {
+            "is_valid": len(errors) == 0,
+            "errors": errors
+        }
@@ -0,0 +1,193 @@
+import numpy as np
+from typing import List, Dict, Any, Union
+import logging
+import json
+import os
+import re
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class OnnxEmbeddingBackend:
+    """
+    ONNX Runtime replacement for SentenceTransformer.encode
+
+    The transformer is exported to ONNX once (optionally with dynamic int8
+    weight quantization) and cached on disk together with its tokenizer and
+    pooling settings. Later starts load only the ONNX graph, so PyTorch
+    weights never have to be resident.
+
+    RAG-img and RAG-vid are built as separate images from their own
+    directories, so each keeps an identical copy of this module; change
+    both together.
+    """
+
+    def __init__(self, model_name: str, cache_dir: str = "cache/onnx", quantize: bool = True,
+                 num_threads: int = 0):
+        """
+        Initialize ONNX embedding backend
+
+        Args:
+            model_name: sentence-transformers model to export
+            cache_dir: Directory holding exported models
+            quantize: Whether to use the dynamically int8-quantized graph
+            num_threads: ONNX Runtime intra-op threads; 0 lets the runtime decide
+        """
+        self.model_name = model_name
+        self.quantize = quantize
+        self.num_threads = num_threads
+        self.model_dir = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        self.session = None
+        self.tokenizer = None
+        self.input_names: List[str] = []
+        self.settings: Dict[str, Any] = {}
+
+        self._initialize_model()
+
+    @property
+    def model_path(self) -> str:
+        """Path of the ONNX graph in use"""
+        return os.path.join(self.model_dir, "model.int8.onnx" if self.quantize else "model.onnx")
+
+    @property
+    def max_seq_length(self) -> int:
+        return self.settings.get("max_seq_length", 256)
+
+    def _initialize_model(self):
+        """Export the model if needed and open an ONNX Runtime session"""
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        try:
+            if not os.path.exists(self.model_path):
+                self._export()
+
+            with open(os.path.join(self.model_dir, "settings.json"), "r") as f:
+                self.settings = json.load(f)
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if self.num_threads > 0:
+                options.intra_op_num_threads = self.num_threads
+
+            self.session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+            self.input_names = [node.name for node in self.session.get_inputs()]
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+            logger.info(f"ONNX embedding backend loaded from {self.model_path}")
+        except Exception as e:
+            logger.error(f"Failed to initialize ONNX embedding backend: {str(e)}")
+            raise
+
+    def _export(self):
+        """Export the sentence-transformers model to ONNX and quantize it"""
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        logger.info(f"Exporting {self.model_name} to ONNX at {self.model_dir}")
+        os.makedirs(self.model_dir, exist_ok=True)
+
+        model = SentenceTransformer(self.model_name, device="cpu")
+        transformer = model[0]
+        pooling = model[1] if len(model) > 1 else None
+        tokenizer = transformer.tokenizer
+
+        dummy = tokenizer(["export sample"], return_tensors="pt", padding=True)
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        fp32_path = os.path.join(self.model_dir, "model.onnx")
+        transformer.auto_model.eval()
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer.auto_model,
+                tuple(dummy[name] for name in input_names),
+                fp32_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+                do_constant_folding=True
+            )
+
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(fp32_path, os.path.join(self.model_dir, "model.int8.onnx"), weight_type=QuantType.QInt8)
+
+        if pooling is not None and getattr(pooling, "pooling_mode_cls_token", False):
+            pooling_mode = "cls"
+        elif pooling is not None and getattr(pooling, "pooling_mode_max_tokens", False):
+            pooling_mode = "max"
+        else:
+            pooling_mode = "mean"
+
+        tokenizer.save_pretrained(self.model_dir)
+        with open(os.path.join(self.model_dir, "settings.json"), "w") as f:
+            json.dump({
+                "model_name": self.model_name,
+                "max_seq_length": model.max_seq_length,
+                "pooling": pooling_mode,
+                # Models ending in a Normalize module always return unit vectors
+                "normalize": any(type(module).__name__ == "Normalize" for module in model)
+            }, f, indent=2)
+
+        logger.info("ONNX export and quantization finished")
+
+    def _pool(self, token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """Reduce token embeddings to one vector per text"""
+        mode = self.settings.get("pooling", "mean")
+        if mode == "cls":
+            return token_embeddings[:, 0]
+
+        mask = attention_mask[..., None].astype(np.float32)
+        if mode == "max":
+            return np.where(mask > 0, token_embeddings, -1e9).max(axis=1)
+
+        summed = (token_embeddings * mask).sum(axis=1)
+        return summed / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               normalize_embeddings: bool = False, show_progress_bar: bool = False,
+               **kwargs) -> np.ndarray:
+        """
+        Encode texts, mirroring SentenceTransformer.encode
+
+        Args:
+            sentences: Single text or list of texts
+            batch_size: Texts per ONNX Runtime call
+            normalize_embeddings: Whether to L2-normalize embeddings
+            show_progress_bar: Accepted for API compatibility
+
+        Returns:
+            float32 array; 1-D for a single string, 2-D for a list
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        # Length-sorted batches keep padding small
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        chunks = []
+        for start in range(0, len(texts), batch_size):
+            batch = [texts[i] for i in order[start:start + batch_size]]
+            encoded = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names if name in encoded}
+            token_embeddings = self.session.run(None, feeds)[0]
+            chunks.append(self._pool(token_embeddings, encoded["attention_mask"]))
+
+        sorted_embeddings = np.concatenate(chunks).astype(np.float32)
+        embeddings = np.empty_like(sorted_embeddings)
+        embeddings[order] = sorted_embeddings
+
+        if normalize_embeddings or self.settings.get("normalize", False):
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+
+        return embeddings[0] if single else embeddings
@@ -13,6 +13,8 @@ from transformers import pipeline
 import re
 from pathlib import Path
 
+from services.onnx_embedding_backend import OnnxEmbeddingBackend
+
 logger = logging.getLogger(__name__)
 
 class RAGService:
@@ -38,8 +40,16 @@ class RAGService:
             logger.info("Initializing RAG service...")
             
             # Initialize embedding model
-            logger.info("Loading embedding model...")
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+            embedding_backend = os.getenv("EMBEDDING_BACKEND", "pytorch")
+            logger.info(f"Loading embedding model ({embedding_backend})...")
+            if embedding_backend in ("onnx", "onnx-int8"):
+                self.embedding_model = OnnxEmbeddingBackend(
+                    'all-MiniLM-L6-v2',
+                    cache_dir=os.getenv("ONNX_CACHE_DIR", str(self.data_dir / "onnx")),
+                    quantize=embedding_backend == "onnx-int8"
+                )
+            else:
+                self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
             
             # Initialize QA pipeline
             logger.info("Loading QA pipeline...")